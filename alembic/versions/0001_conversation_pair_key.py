@@ -0,0 +1,103 @@
+"""conversation private_pair_key: deduplicate direct chats and add unique index
+
+The base schema is created by `Base.metadata.create_all` (CREATE_DB_ON_STARTUP),
+so this is the first revision in the chain.
+
+For every direct conversation with exactly two distinct members we compute
+"direct:<min>:<max>". When a pair has several conversations (created by the
+old POST /conversations), the oldest one is kept, the duplicates' messages are
+moved onto it and the duplicates are deleted. Then the key is stored and a
+unique index is created.
+
+Revision ID: 0001_conversation_pair_key
+Revises:
+Create Date: 2026-10-19
+"""
+
+from collections import defaultdict
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0001_conversation_pair_key"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+_CHUNK = 500
+
+
+def _chunks(seq):
+    seq = list(seq)
+    for i in range(0, len(seq), _CHUNK):
+        yield seq[i : i + _CHUNK]
+
+
+def upgrade():
+    op.add_column(
+        "conversations", sa.Column("private_pair_key", sa.Text(), nullable=True)
+    )
+
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.text(
+            "SELECT cm.conversation_id, cm.user_id FROM conversation_members cm "
+            "JOIN conversations c ON c.id = cm.conversation_id "
+            "WHERE c.type = 'direct' ORDER BY cm.conversation_id"
+        )
+    ).fetchall()
+
+    members = defaultdict(set)
+    for conv_id, user_id in rows:
+        members[int(conv_id)].add(int(user_id))
+
+    by_pair = defaultdict(list)
+    for conv_id, user_ids in members.items():
+        if len(user_ids) != 2:
+            continue
+        a, b = sorted(user_ids)
+        by_pair[f"direct:{a}:{b}"].append(conv_id)
+
+    keep = {}
+    duplicates = {}
+    for pair_key, conv_ids in by_pair.items():
+        conv_ids.sort()
+        keep[conv_ids[0]] = pair_key
+        for dup in conv_ids[1:]:
+            duplicates[dup] = conv_ids[0]
+
+    # fold duplicate conversations into the oldest one for the same pair
+    for dup, keeper in duplicates.items():
+        bind.execute(
+            sa.text(
+                "UPDATE messages SET conversation_id = :keeper WHERE conversation_id = :dup"
+            ),
+            {"keeper": keeper, "dup": dup},
+        )
+    for chunk in _chunks(duplicates):
+        ids = ", ".join(str(int(i)) for i in chunk)
+        bind.execute(
+            sa.text(
+                f"DELETE FROM conversation_members WHERE conversation_id IN ({ids})"
+            )
+        )
+        bind.execute(sa.text(f"DELETE FROM conversations WHERE id IN ({ids})"))
+
+    if keep:
+        bind.execute(
+            sa.text("UPDATE conversations SET private_pair_key = :key WHERE id = :id"),
+            [{"key": key, "id": conv_id} for conv_id, key in keep.items()],
+        )
+
+    op.create_index(
+        "ix_conversations_private_pair_key",
+        "conversations",
+        ["private_pair_key"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_conversations_private_pair_key", table_name="conversations")
+    with op.batch_alter_table("conversations") as batch_op:
+        batch_op.drop_column("private_pair_key")
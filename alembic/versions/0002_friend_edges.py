@@ -0,0 +1,63 @@
+"""friend_edges: symmetric friendship table backfilled from accepted friendships
+
+One row per direction lets friend lists and presence fan-out use the primary
+key (user_id, friend_id) as a covering index instead of scanning every
+accepted Friendship with an OR on requester/receiver.
+
+Revision ID: 0002_friend_edges
+Revises: 0001_conversation_pair_key
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002_friend_edges"
+down_revision = "0001_conversation_pair_key"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "friend_edges",
+        sa.Column(
+            "user_id",
+            sa.Integer(),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "friend_id",
+            sa.Integer(),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now()
+        ),
+        sa.CheckConstraint("user_id <> friend_id", name="chk_friend_edge_no_self"),
+    )
+    op.create_index(
+        "idx_friend_edges_friend_user", "friend_edges", ["friend_id", "user_id"]
+    )
+
+    # both directions; GROUP BY collapses pairs that have a Friendship row each way
+    op.execute(
+        """
+        INSERT INTO friend_edges (user_id, friend_id, created_at)
+        SELECT user_id, friend_id, MIN(created_at) FROM (
+            SELECT requester_id AS user_id, receiver_id AS friend_id, created_at
+            FROM friendships WHERE status = 'accepted'
+            UNION ALL
+            SELECT receiver_id AS user_id, requester_id AS friend_id, created_at
+            FROM friendships WHERE status = 'accepted'
+        ) edges
+        GROUP BY user_id, friend_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("idx_friend_edges_friend_user", table_name="friend_edges")
+    op.drop_table("friend_edges")
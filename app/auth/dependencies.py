@@ -1,3 +1,4 @@
+import os
 from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
@@ -5,11 +6,18 @@ from jose import JWTError
 from sqlalchemy.orm import Session
 
 from app.auth.jwt_handler import decode_access_token
+from app.auth.principal import Principal, principal_cache
 from app.database.connection import get_db
-from app.database.models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+# user ids allowed on operator endpoints (/admin/*, detailed /health/*); empty
+# means nobody.
+# Ids, not usernames: a username can be registered or renamed into.
+ADMIN_USER_IDS = frozenset(
+    int(uid) for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip()
+)
+
 
 def get_current_user_token(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
     """
@@ -74,10 +82,11 @@ def get_current_user_from_request(request: Request) -> Optional[Dict[str, Any]]:
 
 def get_current_user(
     token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> User:
+) -> Principal:
     """
     Dependency to get current user from JWT token.
-    Returns User object from database.
+    Returns a read-only Principal snapshot (cached briefly, see app/auth/principal.py);
+    load the User row when the route needs to modify it.
     """
     try:
         payload = decode_access_token(token)
@@ -96,7 +105,7 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = principal_cache.get(user_id, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -105,3 +114,13 @@ def get_current_user(
         )
 
     return user
+
+
+def get_admin_user(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """Dependency for operator endpoints: the current user, if listed in ADMIN_USER_IDS."""
+    if current_user.id not in ADMIN_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return current_user
@@ -0,0 +1,166 @@
+"""
+Async password hashing backed by a bounded process pool.
+
+Argon2 at the default 64 MiB memory cost burns tens of milliseconds of CPU and
+allocates 64 MiB per call. Running it in worker processes caps both CPU and
+RSS at HASH_WORKERS concurrent hashes, keeps the event loop and threadpool
+free, and turns overload into a fast 503 instead of a pile-up:
+
+    password_hash = await hasher.hash(password)
+    ok = await hasher.verify(password, user.password_hash)
+
+At most HASH_MAX_IN_FLIGHT calls are handed to the pool; up to
+HASH_QUEUE_LIMIT more wait for a slot and anything beyond that raises
+`HashingOverloaded`. HASH_WORKERS=0 runs hashes on the `crypto` thread budget
+instead (tests, single-core dev boxes).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import anyio
+
+from app.auth.hashing import hash_password, verify_password
+from app.utils.metrics import registry
+from app.utils.workload import crypto
+
+T = TypeVar("T")
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_MAX_IN_FLIGHT = int(os.getenv("HASH_MAX_IN_FLIGHT", str(max(HASH_WORKERS, 1))))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "64"))
+
+
+class HashingOverloaded(Exception):
+    """The admission queue is full; the caller should retry later."""
+
+
+class HashingService:
+    def __init__(
+        self,
+        workers: int = HASH_WORKERS,
+        max_in_flight: int = HASH_MAX_IN_FLIGHT,
+        queue_limit: int = HASH_QUEUE_LIMIT,
+    ):
+        self.workers = workers
+        self.max_in_flight = max(1, max_in_flight)
+        self.queue_limit = queue_limit
+        self._limiter = anyio.CapacityLimiter(self.max_in_flight)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    @property
+    def mode(self) -> str:
+        return "process" if self.workers > 0 else "thread"
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self.run(verify_password, password, password_hash)
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Run a picklable module-level callable in the pool once admitted.
+        Raises HashingOverloaded when HASH_QUEUE_LIMIT callers already wait.
+        """
+        start = time.perf_counter()
+        try:
+            self._limiter.acquire_nowait()
+        except anyio.WouldBlock:
+            if self.waiting >= self.queue_limit:
+                self.rejected += 1
+                raise HashingOverloaded("password hashing queue is full")
+            self.waiting += 1
+            try:
+                await self._limiter.acquire()
+            finally:
+                self.waiting -= 1
+        waited = time.perf_counter() - start
+        self.wait_seconds_total += waited
+        if waited > self.wait_seconds_max:
+            self.wait_seconds_max = waited
+
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return await crypto.run(fn, *args)
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._pool(), fn, *args)
+            except BrokenProcessPool:
+                # a worker died (OOM kill); start a fresh pool for the next call
+                self.shutdown(wait=False)
+                raise
+        finally:
+            self.run_seconds_total += time.perf_counter() - start
+            self.in_flight -= 1
+            self.completed += 1
+            self._limiter.release()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: never fork a process that already runs the event loop and threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def shutdown(self, wait: bool = True) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_in_flight": self.max_in_flight,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "run_seconds_avg": (
+                round(self.run_seconds_total / self.completed, 6)
+                if self.completed
+                else 0.0
+            ),
+        }
+
+
+hasher = HashingService()
+
+
+def _hashing_samples():
+    stats = hasher.stats()
+    return [(("running",), stats["in_flight"]), (("queued",), stats["queue_depth"])]
+
+
+registry.callback_gauge(
+    "hashing_in_flight",
+    "Password hashes running or queued",
+    _hashing_samples,
+    ("state",),
+)
+registry.callback_gauge(
+    "hashing_rejected_total",
+    "Password hashes shed with 503 because the queue was full",
+    lambda: [((), hasher.stats()["rejected"])],
+    kind="counter",
+)
@@ -9,15 +9,28 @@ ARGON_TIME_COST = int(os.getenv("ARGON_TIME_COST", "2"))
 ARGON_MEMORY_COST = int(os.getenv("ARGON_MEMORY_COST", "65536"))  # KiB (64 MiB)
 ARGON_PARALLELISM = int(os.getenv("ARGON_PARALLELISM", "1"))
 
-# Use Argon2 as primary scheme. Keep bcrypt_sha256 as fallback if you had older hashes.
-pwd_context = CryptContext(
-    schemes=["argon2", "bcrypt_sha256"],
-    deprecated="auto",
-    argon2__time_cost=ARGON_TIME_COST,
-    argon2__memory_cost=ARGON_MEMORY_COST,
-    argon2__parallelism=ARGON_PARALLELISM,
-    bcrypt__rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
-)
+
+def build_context(
+    time_cost: int = ARGON_TIME_COST,
+    memory_cost: int = ARGON_MEMORY_COST,
+    parallelism: int = ARGON_PARALLELISM,
+) -> CryptContext:
+    """
+    Password policy for the given Argon2 parameters. Hashes made with other
+    Argon2 costs (or with bcrypt) are flagged by `needs_rehash`.
+    """
+    # Use Argon2 as primary scheme. Keep bcrypt_sha256 as fallback if you had older hashes.
+    return CryptContext(
+        schemes=["argon2", "bcrypt_sha256"],
+        deprecated="auto",
+        argon2__time_cost=time_cost,
+        argon2__memory_cost=memory_cost,
+        argon2__parallelism=parallelism,
+        bcrypt__rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+    )
+
+
+pwd_context = build_context()
 
 
 def _normalize_password(pw: Optional[str]) -> Optional[str]:
@@ -49,11 +62,12 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         return False
 
 
-def needs_rehash(hashed_password: str) -> bool:
+def needs_rehash(hashed_password: str, context: Optional[CryptContext] = None) -> bool:
     """
-    Return True when an existing hash should be re-hashed according to current policy.
+    Return True when an existing hash should be re-hashed according to current policy
+    (or according to `context`, e.g. a candidate policy from build_context).
     """
     try:
-        return pwd_context.needs_update(hashed_password)
+        return (context or pwd_context).needs_update(hashed_password)
     except Exception:
         return True
@@ -1,13 +1,21 @@
+import hashlib
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
 from jose import jwt, JWTError
 
+from app.utils.cache import LRUCache
+
 # load secret from env (.env)
 SECRET_KEY = os.getenv("SECRET_KEY", "skibidy_sigma_king")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+# verified claims keyed by sha256(token), each kept until the token's own exp
+JWT_CLAIMS_CACHE_SIZE = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", "10000"))
+
+claims_cache = LRUCache(maxsize=JWT_CLAIMS_CACHE_SIZE)
 
 
 def create_access_token(
@@ -32,6 +40,18 @@ def create_access_token(
 def decode_access_token(token: str) -> Dict[str, Any]:
     """
     Decode and verify token; raise JWTError on failure.
+    A token seen before is answered from the claims cache until it expires,
+    skipping the HMAC check and JSON parse. Returns a fresh dict either way.
     """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = claims_cache.get(key)
+    if payload is not None:
+        return dict(payload)
+
     payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        remaining = exp - time.time()
+        if remaining > 0:
+            claims_cache.set(key, dict(payload), ttl=remaining)
     return payload
@@ -0,0 +1,80 @@
+"""
+Short-lived snapshots of the authenticated user.
+
+`get_current_user` runs on nearly every HTTP request; with this cache it
+returns a `Principal` (id, username, email, created_at) without a `User`
+query. Routes that change the user row load it themselves and must call
+`principal_cache.invalidate(user_id)` after committing, which also tells the
+other workers over the Redis pub/sub channel. The TTL bounds staleness for
+anything that slips past that (admin edits, Redis outages).
+"""
+
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.chat.manager import manager
+from app.database import queries
+from app.utils.cache import LRUCache
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+
+_INVALIDATE = "principal.invalidate"
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    id: int
+    username: str
+    email: Optional[str]
+    created_at: Optional[datetime]
+
+
+class PrincipalCache:
+    def __init__(
+        self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL
+    ):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id: int, db: Session) -> Optional[Principal]:
+        """Cached snapshot, or load it with `db`. None if the user does not exist."""
+        user_id = int(user_id)
+        principal = self._cache.get(user_id)
+        if principal is not None:
+            return principal
+        user = queries.user_by_id(db, user_id)
+        if user is None:
+            return None
+        principal = Principal(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            created_at=user.created_at,
+        )
+        self._cache.set(user_id, principal)
+        return principal
+
+    def invalidate(self, user_id: int, broadcast: bool = True):
+        """Drop the snapshot locally and, unless told otherwise, on every other worker."""
+        self._cache.pop(int(user_id))
+        if broadcast:
+            manager.publish_control_nowait(_INVALIDATE, {"user_id": int(user_id)})
+
+    def clear(self):
+        self._cache.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+def _on_remote_invalidate(data: dict):
+    user_id = data.get("user_id")
+    if user_id is not None:
+        principal_cache.invalidate(user_id, broadcast=False)
+
+
+manager.on_control(_INVALIDATE, _on_remote_invalidate)
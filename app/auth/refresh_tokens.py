@@ -0,0 +1,116 @@
+"""
+Rotating refresh tokens.
+
+Access tokens stay short-lived JWTs; a refresh token is an opaque random
+string that buys a new access token (and a new refresh token) from
+`/auth/refresh` without the password, so an expiring session costs a couple
+of indexed row updates instead of an Argon2 verify.
+
+Only the sha256 digest is stored (`refresh_tokens` table: SQLite in dev and
+tests, Postgres in production). Each token is single-use: rotation revokes it
+and records its successor. A token presented again after rotation means it
+leaked, so the whole family (every token descended from the same login) is
+revoked and the user has to sign in again.
+"""
+
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.database.models import RefreshToken
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+
+class RefreshTokenError(Exception):
+    """The refresh token is unknown, expired, or revoked."""
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _new_row(user_id: int, family_id: str) -> Tuple[str, RefreshToken]:
+    token = secrets.token_urlsafe(32)
+    row = RefreshToken(
+        token_hash=_digest(token),
+        user_id=int(user_id),
+        family_id=family_id,
+        expires_at=_now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    return token, row
+
+
+def issue_refresh_token(db: Session, user_id: int) -> str:
+    """Start a new token family (one per login) and return its first token."""
+    token, row = _new_row(user_id, secrets.token_hex(16))
+    db.add(row)
+    db.commit()
+    return token
+
+
+def rotate_refresh_token(db: Session, token: str) -> Tuple[int, str]:
+    """
+    Exchange a refresh token for its successor; returns (user_id, new_token).
+    The old row is revoked with a conditional UPDATE, so two concurrent
+    refreshes with the same token cannot both succeed.
+    """
+    token_hash = _digest(token)
+    row = db.get(RefreshToken, token_hash)
+    if row is None:
+        raise RefreshTokenError("Invalid refresh token")
+
+    now = _now()
+    new_token, successor = _new_row(row.user_id, row.family_id)
+    claimed = db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.revoked_at.is_(None),
+            RefreshToken.expires_at > now,
+        )
+        .values(revoked_at=now, replaced_by=successor.token_hash)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if claimed != 1:
+        db.rollback()  # expires `row`, so revoked_at below is re-read
+        if row.revoked_at is not None:
+            # reuse of a rotated token: assume it was stolen
+            _revoke_where(db, RefreshToken.family_id == row.family_id)
+            db.commit()
+        raise RefreshTokenError("Invalid refresh token")
+
+    db.add(successor)
+    db.commit()
+    return successor.user_id, new_token
+
+
+def revoke_refresh_token(db: Session, token: str) -> None:
+    """Log out one session: revoke the presented token's family."""
+    row = db.get(RefreshToken, _digest(token))
+    if row is not None:
+        _revoke_where(db, RefreshToken.family_id == row.family_id)
+        db.commit()
+
+
+def revoke_user_refresh_tokens(db: Session, user_id: int) -> None:
+    """Revoke every session of a user (password change). Does not commit."""
+    _revoke_where(db, RefreshToken.user_id == int(user_id))
+
+
+def _revoke_where(db: Session, condition) -> None:
+    db.execute(
+        update(RefreshToken)
+        .where(condition, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=_now())
+        .execution_options(synchronize_session=False)
+    )
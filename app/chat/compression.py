@@ -0,0 +1,138 @@
+"""
+Negotiated WebSocket compression (permessage-deflate, RFC 7692) for /ws.
+
+uvicorn's websockets server offers permessage-deflate with zlib's defaults:
+15-bit windows and memLevel 8, about 300 KB of zlib state per socket, and
+every frame compressed however small. `negotiate()` replaces that offer,
+per connection and before the handshake answer, with one built from:
+
+- WS_COMPRESSION: offer compression at all (clients may still decline).
+- WS_COMPRESS_WINDOW_BITS / WS_COMPRESS_MEM_LEVEL: the LZ77 window (both
+  directions) and zlib memLevel. Compressor state is 2^(bits+2) +
+  2^(memLevel+9) bytes and the decompressor's about 2^bits + 7 KB, so the
+  defaults (12, 5) hold 44 KB per socket instead of ~300 KB.
+- WS_COMPRESS_CONTEXT_TAKEOVER: keep the compressor between messages, or
+  build one per message: idle sockets hold only the decompressor, but each
+  message compresses alone.
+- WS_COMPRESS_MIN_BYTES: messages smaller than this go out uncompressed; RFC
+  7692 lets each message choose. Presence updates and pongs are tens of
+  bytes: skipping them costs a few percent of the saving and spares a
+  compressor call on half the frames.
+
+benchmarks/bench_ws_compression.py measures CPU per message, bytes saved and
+resident memory per socket for a grid of these settings. On its event mix
+the defaults save ~77% of the bytes at ~20 us per message, against ~83% and
+~25 us for uvicorn's own offer; context takeover is what compresses
+new_message events (a few hundred bytes, much alike), so a threshold above
+them, or per-message mode, drops the saving to 50-60% (for ~7 KB resident
+per socket instead of ~45 KB).
+"""
+
+import os
+
+from websockets.extensions.base import Extension
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+from websockets.frames import CTRL_OPCODES, OP_CONT
+
+from app.utils.metrics import registry
+
+WS_COMPRESSION = os.getenv("WS_COMPRESSION", "true").lower() in ("1", "true", "yes")
+WS_COMPRESS_MIN_BYTES = int(os.getenv("WS_COMPRESS_MIN_BYTES", "128"))
+WS_COMPRESS_WINDOW_BITS = int(os.getenv("WS_COMPRESS_WINDOW_BITS", "12"))
+WS_COMPRESS_MEM_LEVEL = int(os.getenv("WS_COMPRESS_MEM_LEVEL", "5"))
+WS_COMPRESS_CONTEXT_TAKEOVER = os.getenv(
+    "WS_COMPRESS_CONTEXT_TAKEOVER", "true"
+).lower() in ("1", "true", "yes")
+
+# outcome: compressed | skipped (under WS_COMPRESS_MIN_BYTES)
+compression_messages = registry.counter(
+    "ws_compression_messages_total",
+    "Outbound messages on compressed sockets by outcome",
+    ("outcome",),
+    max_series=2,
+)
+# stage: raw (before deflate) | wire (after), compressed messages only
+compression_bytes = registry.counter(
+    "ws_compression_bytes_total",
+    "Payload bytes of compressed outbound messages before and after deflate",
+    ("stage",),
+    max_series=2,
+)
+
+
+class ThresholdDeflate(Extension):
+    """
+    A negotiated permessage-deflate that leaves small messages uncompressed.
+    Wraps the extension the factory built, so its zlib state is not doubled.
+    """
+
+    def __init__(self, deflate: Extension, min_size: int):
+        self.name = deflate.name
+        self.deflate = deflate
+        self.min_size = min_size
+        self._skipping = False  # inside a fragmented message sent as is
+
+    def decode(self, frame, *, max_size=None):
+        return self.deflate.decode(frame, max_size=max_size)
+
+    def encode(self, frame):
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+        if frame.opcode is OP_CONT:
+            if self._skipping:
+                self._skipping = not frame.fin
+                return frame
+        elif len(frame.data) < self.min_size:
+            self._skipping = not frame.fin
+            compression_messages.inc(outcome="skipped")
+            return frame
+        else:
+            compression_messages.inc(outcome="compressed")
+        encoded = self.deflate.encode(frame)
+        compression_bytes.inc(len(frame.data), stage="raw")
+        compression_bytes.inc(len(encoded.data), stage="wire")
+        return encoded
+
+
+class ThresholdDeflateFactory(ServerPerMessageDeflateFactory):
+    def __init__(self, min_size: int, **kwargs):
+        super().__init__(**kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response, deflate = super().process_request_params(params, accepted_extensions)
+        return response, ThresholdDeflate(deflate, self.min_size)
+
+
+def deflate_factory(
+    min_size: int = WS_COMPRESS_MIN_BYTES,
+    window_bits: int = WS_COMPRESS_WINDOW_BITS,
+    mem_level: int = WS_COMPRESS_MEM_LEVEL,
+    context_takeover: bool = WS_COMPRESS_CONTEXT_TAKEOVER,
+) -> ThresholdDeflateFactory:
+    return ThresholdDeflateFactory(
+        min_size,
+        server_no_context_takeover=not context_takeover,
+        server_max_window_bits=window_bits,
+        client_max_window_bits=window_bits,
+        compress_settings={"memLevel": mem_level},
+    )
+
+
+_factory = deflate_factory() if WS_COMPRESSION else None
+
+
+def negotiate(protocol) -> None:
+    """
+    Swap the server's permessage-deflate offer for ours (or drop it). Runs
+    while the handshake waits for the app to accept: the server negotiates
+    from this same list afterwards.
+    """
+    extensions = getattr(protocol, "available_extensions", None)
+    if not isinstance(extensions, list):
+        return  # not uvicorn's websockets implementation
+    extensions[:] = [
+        ext for ext in extensions if ext.name != ServerPerMessageDeflateFactory.name
+    ]
+    if _factory is not None:
+        extensions.append(_factory)
@@ -0,0 +1,207 @@
+"""
+Server-driven WebSocket liveness.
+
+Every `Connection` record carries `last_seen`, bumped on each inbound frame
+and each pong. One task per worker turns a hashed timer wheel of
+HEARTBEAT_TICK-second slots; a socket sits in the slot of the next moment it
+needs a look:
+
+- silent for HEARTBEAT_INTERVAL seconds: send a protocol-level ping (browsers
+  answer those themselves, no client code involved) and look again at
+  HEARTBEAT_TIMEOUT;
+- silent for HEARTBEAT_TIMEOUT seconds: the peer is gone, abort the transport
+  and drop the socket from the registries so fan-out stops paying for it.
+
+Activity never touches the wheel: an entry that comes due after the socket
+spoke is simply re-filed at `last_seen + interval`, so a tick costs
+O(expired entries) and a frame costs one attribute store.
+
+Pings need the server protocol (see app.chat.ws_protocol). Under servers
+without a ping method (uvicorn's wsproto implementation, the test client)
+sockets are still reaped after HEARTBEAT_TIMEOUT without inbound frames; the
+web client's own `ping` frames keep them alive. HEARTBEAT_INTERVAL=0 turns
+all of this off.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import List, Optional
+
+from app.chat.registry import Connection
+from app.chat.ws_protocol import server_protocol
+from app.utils.metrics import registry
+
+logger = logging.getLogger("chat.heartbeat")
+
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "25"))
+HEARTBEAT_TIMEOUT = float(os.getenv("HEARTBEAT_TIMEOUT", "60"))
+HEARTBEAT_TICK = float(os.getenv("HEARTBEAT_TICK", "1"))
+
+CLOSE_TIMEOUT = 1001
+
+pings_sent = registry.counter(
+    "ws_heartbeat_pings_total", "Protocol pings sent to sockets that went quiet"
+)
+sockets_reaped = registry.counter(
+    "ws_heartbeat_reaped_total", "Sockets dropped for HEARTBEAT_TIMEOUT of silence"
+)
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel: `slots` lists of items, one per `tick` seconds.
+    Deadlines further out than the wheel spans land in the last slot and come
+    back early; callers re-file them.
+    """
+
+    def __init__(self, tick: float, slots: int, now: float):
+        self.tick = tick
+        self._slots: List[list] = [[] for _ in range(slots)]
+        self._cursor = 0
+        self._time = now  # start of the current slot
+        self.size = 0
+
+    def schedule(self, item, deadline: float) -> None:
+        ahead = math.ceil((deadline - self._time) / self.tick)
+        ahead = min(max(ahead, 1), len(self._slots) - 1)
+        self._slots[(self._cursor + ahead) % len(self._slots)].append(item)
+        self.size += 1
+
+    def advance(self, now: float) -> list:
+        """Items of every slot that has come due by `now`."""
+        due = []
+        # after a long stall every slot is due once, not once per missed tick
+        steps = min(int((now - self._time) / self.tick), len(self._slots))
+        for _ in range(steps):
+            self._cursor = (self._cursor + 1) % len(self._slots)
+            slot = self._slots[self._cursor]
+            if slot:
+                due.extend(slot)
+                self._slots[self._cursor] = []
+        if steps:
+            self._time = max(self._time + steps * self.tick, now - self.tick)
+        self.size -= len(due)
+        return due
+
+
+class Heartbeat:
+    def __init__(
+        self,
+        manager,
+        interval: float = HEARTBEAT_INTERVAL,
+        timeout: float = HEARTBEAT_TIMEOUT,
+        tick: float = HEARTBEAT_TICK,
+    ):
+        self.manager = manager
+        self.interval = interval
+        self.timeout = max(timeout, interval)
+        self.tick = tick
+        self._wheel: Optional[TimerWheel] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def start(self) -> None:
+        if self._task is not None or not self.enabled:
+            return
+        slots = math.ceil(self.timeout / self.tick) + 2
+        self._wheel = TimerWheel(self.tick, slots, time.monotonic())
+        self._task = asyncio.get_running_loop().create_task(
+            self._run(), name="ws-heartbeat"
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._wheel = None
+
+    def watch(self, connection: Connection) -> None:
+        """Start tracking a newly registered socket (no-op when stopped)."""
+        if self._wheel is not None:
+            self._wheel.schedule(connection, connection.last_seen + self.interval)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            self.check(time.monotonic())
+
+    def check(self, now: float) -> None:
+        """One tick: ping, reap or re-file every entry that has come due."""
+        wheel = self._wheel
+        for connection in wheel.advance(now):
+            if connection not in self.manager.connections.connections(
+                connection.user_id
+            ):
+                continue  # closed since it was filed
+            idle = now - connection.last_seen
+            if idle >= self.timeout:
+                self._reap(connection, idle)
+            elif idle >= self.interval:
+                self._ping(connection)
+                wheel.schedule(connection, connection.last_seen + self.timeout)
+            else:
+                wheel.schedule(connection, connection.last_seen + self.interval)
+
+    def _ping(self, connection: Connection) -> None:
+        protocol = server_protocol(connection.websocket)
+        if not hasattr(protocol, "ping"):
+            return
+        pings_sent.inc()
+        task = asyncio.ensure_future(protocol.ping())
+        task.add_done_callback(lambda t: _on_ping_sent(t, connection))
+
+    def _reap(self, connection: Connection, idle: float) -> None:
+        sockets_reaped.inc()
+        logger.info(
+            "ws heartbeat timeout; dropping connection",
+            extra={"user_id": connection.user_id, "idle_seconds": round(idle, 1)},
+        )
+        protocol = server_protocol(connection.websocket)
+        transport = getattr(protocol, "transport", None)
+        if transport is not None:
+            # a dead peer never answers a close handshake; the endpoint sees
+            # the disconnect and unregisters the socket itself
+            transport.abort()
+        else:
+            asyncio.ensure_future(self._close(connection))
+
+    async def _close(self, connection: Connection) -> None:
+        try:
+            await connection.websocket.close(code=CLOSE_TIMEOUT)
+        except Exception:
+            pass
+        await self.manager.disconnect(connection.user_id, connection.websocket)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None,
+            "interval": self.interval,
+            "timeout": self.timeout,
+            "tick": self.tick,
+            "scheduled": self._wheel.size if self._wheel is not None else 0,
+            "pings": int(pings_sent.value()),
+            "reaped": int(sockets_reaped.value()),
+        }
+
+
+def _on_ping_sent(task: asyncio.Future, connection: Connection) -> None:
+    if task.cancelled() or task.exception() is not None:
+        return  # closed meanwhile; the endpoint cleans up
+    task.result().add_done_callback(lambda pong: _on_pong(pong, connection))
+
+
+def _on_pong(pong: asyncio.Future, connection: Connection) -> None:
+    if not pong.cancelled() and pong.exception() is None:
+        connection.last_seen = time.monotonic()
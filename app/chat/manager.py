@@ -1,10 +1,15 @@
 import asyncio
 import json
 import logging
-from typing import Dict, Set, Optional
+import uuid
+from typing import Callable, Dict, List, Set, Optional
 from collections import defaultdict
 import os
 
+from app.chat.registry import ConnectionRegistry, RoomRegistry
+from app.utils.metrics import registry
+from app.utils.tracing import KIND_CONSUMER, KIND_PRODUCER, NOOP_SPAN, tracer
+
 try:
     import redis.asyncio as redis_async
 except Exception:
@@ -12,67 +17,70 @@ except Exception:
 
 logger = logging.getLogger("chat.manager")
 
+# direction: published | received | dropped; kind: event | control | malformed
+pubsub_messages = registry.counter(
+    "pubsub_messages_total",
+    "Redis pub/sub messages by direction and kind",
+    ("direction", "kind"),
+    max_series=20,
+)
+pubsub_errors = registry.counter(
+    "pubsub_publish_errors_total", "Failed Redis publishes", ("kind",), max_series=4
+)
+
 
 class ConnectionManager:
     def __init__(self):
-        self._connections: Dict[int, Set] = defaultdict(set)
-        self._conversation_members: Dict[int, Set[int]] = defaultdict(
-            set
-        )  # conversation_id -> user_ids
-        self._user_conversations: Dict[int, Set[int]] = defaultdict(
-            set
-        )  # user_id -> conversation_ids
+        self._connections = ConnectionRegistry()
+        # conversation_id <-> user_ids
+        self._rooms = RoomRegistry()
         self._pub_channel = os.getenv("REDIS_PUBSUB_CHANNEL", "chat_events")
         self._redis_url = os.getenv("REDIS_URL")
         self._redis: Optional[object] = None  # redis.asyncio.Redis
         self._sub_task: Optional[asyncio.Task] = None
         self._shutdown = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # control messages (cache invalidation etc.) shared between workers
+        self._worker_id = uuid.uuid4().hex
+        self._control_handlers: Dict[str, List[Callable[[dict], None]]] = defaultdict(
+            list
+        )
 
     async def connect(self, user_id: int, websocket):
-        self._connections[int(user_id)].add(websocket)
+        self._connections.add(int(user_id), websocket)
 
     async def disconnect(self, user_id: int, websocket):
-        conns = self._connections.get(int(user_id))
-        if not conns:
-            return
-        conns.discard(websocket)
-        if not conns:
-            self._connections.pop(int(user_id), None)
+        if self._connections.remove(int(user_id), websocket):
             # Clean up conversation memberships for disconnected user
-            for conv_id in list(self._user_conversations.get(int(user_id), set())):
-                await self.leave_conversation(user_id, conv_id)
+            self._rooms.leave_all(int(user_id))
 
     async def join_conversation(self, user_id: int, conversation_id: int):
         """Add user to a conversation room"""
         user_id = int(user_id)
         conversation_id = int(conversation_id)
-        self._conversation_members[conversation_id].add(user_id)
-        self._user_conversations[user_id].add(conversation_id)
+        self._rooms.join(conversation_id, user_id)
 
     async def leave_conversation(self, user_id: int, conversation_id: int):
         """Remove user from a conversation room"""
         user_id = int(user_id)
         conversation_id = int(conversation_id)
-        self._conversation_members[conversation_id].discard(user_id)
-        self._user_conversations[user_id].discard(conversation_id)
-
-        # Clean up empty conversation rooms
-        if not self._conversation_members[conversation_id]:
-            self._conversation_members.pop(conversation_id, None)
+        # empty rooms are dropped by the registry
+        self._rooms.leave(conversation_id, user_id)
 
     async def send_to_conversation(self, conversation_id: int, message: dict):
         """Send message to all users in a conversation"""
         conversation_id = int(conversation_id)
-        user_ids = self._conversation_members.get(conversation_id, set())
+        user_ids = self._rooms.members(conversation_id)
         for user_id in user_ids:
             await self.send_to_user(user_id, message)
 
     async def send_to_user(self, user_id: int, message: dict):
-        conns = list(self._connections.get(int(user_id), set()))
+        conns = self._connections.connections(int(user_id))
         if not conns:
             return
         payload = json.dumps(message)
-        for ws in conns:
+        for conn in conns:
+            ws = conn.websocket
             try:
                 await ws.send_text(payload)
             except Exception:
@@ -83,18 +91,79 @@ class ConnectionManager:
                 await self.disconnect(user_id, ws)
 
     async def publish_event(self, event: dict, target_user_ids: Set[int]):
-        for uid in set(target_user_ids):
-            await self.send_to_user(uid, event)
+        with tracer.span("ws.fanout", targets=len(target_user_ids)):
+            for uid in set(target_user_ids):
+                await self.send_to_user(uid, event)
+        if not self._redis:
+            return
+        with tracer.span("pubsub.publish", KIND_PRODUCER) as span:
+            try:
+                payload = json.dumps(
+                    {
+                        "event": event,
+                        "targets": list(target_user_ids),
+                        "origin": self._worker_id,
+                        # the receiving worker continues this trace
+                        "trace": span.traceparent,
+                    }
+                )
+                await self._redis.publish(self._pub_channel, payload)
+                pubsub_messages.inc(direction="published", kind="event")
+            except Exception as exc:
+                span.set_error(exc)
+                pubsub_errors.inc(kind="event")
+                logger.exception("failed to publish to redis")
+
+    def on_control(self, kind: str, handler: Callable[[dict], None]):
+        """Register a sync handler for control messages published by other workers."""
+        self._control_handlers[kind].append(handler)
+
+    async def publish_control(self, kind: str, data: dict):
+        """Send a control message to every other worker (no-op without Redis)."""
         if not self._redis:
             return
         try:
-            payload = json.dumps({"event": event, "targets": list(target_user_ids)})
+            payload = json.dumps(
+                {"control": {"kind": kind, "data": data}, "origin": self._worker_id}
+            )
             await self._redis.publish(self._pub_channel, payload)
+            pubsub_messages.inc(direction="published", kind="control")
         except Exception:
-            logger.exception("failed to publish to redis")
+            pubsub_errors.inc(kind="control")
+            logger.exception("failed to publish control message")
+
+    def publish_control_nowait(self, kind: str, data: dict):
+        """
+        Fire-and-forget publish_control that is safe from sync routers running
+        in the threadpool as well as from coroutines on the event loop.
+        """
+        if not self._redis or self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._loop.create_task(self.publish_control(kind, data))
+        else:
+            asyncio.run_coroutine_threadsafe(
+                self.publish_control(kind, data), self._loop
+            )
+
+    def _dispatch_control(self, parsed: dict):
+        if parsed.get("origin") == self._worker_id:
+            return
+        control = parsed.get("control") or {}
+        for handler in self._control_handlers.get(control.get("kind"), []):
+            try:
+                handler(control.get("data") or {})
+            except Exception:
+                logger.exception("control handler failed for %s", control.get("kind"))
 
     async def start(self):
         # start redis subscriber task if redis is configured
+        self._loop = asyncio.get_running_loop()
+        self._shutdown = False
         if not self._redis_url or redis_async is None:
             logger.warning(
                 "Redis not configured or redis.asyncio not installed; start() is no-op"
@@ -128,6 +197,28 @@ class ConnectionManager:
                 logger.exception("error closing redis")
             self._redis = None
 
+    async def _deliver_event(self, parsed: dict):
+        event = parsed.get("event")
+        targets = parsed.get("targets", [])
+        if not event or not targets:
+            pubsub_messages.inc(direction="dropped", kind="event")
+            return
+        pubsub_messages.inc(direction="received", kind="event")
+        if parsed.get("origin") == self._worker_id:
+            # publish_event already delivered to this worker's sockets
+            return
+        trace = parsed.get("trace")
+        span = (
+            tracer.start_trace(
+                "pubsub.deliver", trace, KIND_CONSUMER, {"targets": len(targets)}
+            )
+            if trace
+            else NOOP_SPAN
+        )
+        with span:
+            for uid in set(targets):
+                await self.send_to_user(uid, event)
+
     async def _subscriber_loop(self):
         if not self._redis:
             return
@@ -145,13 +236,13 @@ class ConnectionManager:
                 try:
                     parsed = json.loads(data)
                 except Exception:
+                    pubsub_messages.inc(direction="dropped", kind="malformed")
                     continue
-                event = parsed.get("event")
-                targets = parsed.get("targets", [])
-                if not event or not targets:
+                if "control" in parsed:
+                    pubsub_messages.inc(direction="received", kind="control")
+                    self._dispatch_control(parsed)
                     continue
-                for uid in set(targets):
-                    await self.send_to_user(uid, event)
+                await self._deliver_event(parsed)
                 if self._shutdown:
                     break
         except asyncio.CancelledError:
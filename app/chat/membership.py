@@ -0,0 +1,148 @@
+"""
+Per-conversation membership cache shared by every send path.
+
+Maps conversation_id -> {user_id: role}. Authorization on the hot paths
+(HTTP send, history reads, group WebSocket frames) becomes a dict probe; the
+database is only hit on a miss. Every write to conversation_members must call
+`membership_cache.invalidate(conversation_id)`, which also tells the other
+workers over the Redis pub/sub channel. The TTL bounds staleness when Redis
+is not available.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.chat.manager import manager
+from app.database import queries
+from app.utils.cache import LRUCache
+from app.utils.workload import db_read
+
+logger = logging.getLogger("chat.membership")
+
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "50000"))
+MEMBERSHIP_CACHE_TTL = float(os.getenv("MEMBERSHIP_CACHE_TTL", "300"))
+
+_INVALIDATE = "membership.invalidate"
+
+
+class MembershipCache:
+    def __init__(
+        self, maxsize: int = MEMBERSHIP_CACHE_SIZE, ttl: float = MEMBERSHIP_CACHE_TTL
+    ):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        # conversation_id -> [version, loads in flight], only while a load runs;
+        # invalidate() bumps the version so an older load does not cache its rows
+        self._loads: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def roles(
+        self, conversation_id: int, db: Optional[Session] = None
+    ) -> Dict[int, str]:
+        """
+        Return {user_id: role} for a conversation. On a miss the rows are loaded
+        with `db`, or a short-lived session when none is given.
+        Callers must treat the returned dict as read-only.
+        """
+        conversation_id = int(conversation_id)
+        roles = self._cache.get(conversation_id)
+        if roles is not None:
+            return roles
+        with self._lock:
+            load = self._loads.setdefault(conversation_id, [0, 0])
+            load[1] += 1
+            version = load[0]
+        roles = None
+        try:
+            roles = self._load(conversation_id, db)
+        finally:
+            with self._lock:
+                load[1] -= 1
+                if not load[1]:
+                    del self._loads[conversation_id]
+                # empty results are not cached: a conversation created a moment
+                # later would otherwise look memberless until the entry expired
+                if roles and load[0] == version:
+                    self._cache.set(conversation_id, roles)
+        return roles
+
+    def peek(self, conversation_id: int) -> Optional[Dict[int, str]]:
+        """Cached roles or None; never touches the database (safe on the event loop)."""
+        return self._cache.get(int(conversation_id))
+
+    async def roles_async(
+        self, conversation_id: int, db: Optional[Session] = None
+    ) -> Dict[int, str]:
+        """
+        Event-loop friendly `roles`: a cache hit is answered inline, a miss is
+        loaded on the db_read workload pool.
+        """
+        roles = self.peek(conversation_id)
+        if roles is None:
+            roles = await db_read.run(self.roles, conversation_id, db)
+        return roles
+
+    async def is_member_async(
+        self, conversation_id: int, user_id: int, db: Optional[Session] = None
+    ) -> bool:
+        return int(user_id) in await self.roles_async(conversation_id, db)
+
+    def member_ids(
+        self, conversation_id: int, db: Optional[Session] = None
+    ) -> Set[int]:
+        return set(self.roles(conversation_id, db))
+
+    def is_member(
+        self, conversation_id: int, user_id: int, db: Optional[Session] = None
+    ) -> bool:
+        return int(user_id) in self.roles(conversation_id, db)
+
+    def role_of(
+        self, conversation_id: int, user_id: int, db: Optional[Session] = None
+    ) -> Optional[str]:
+        return self.roles(conversation_id, db).get(int(user_id))
+
+    def invalidate(self, conversation_id: int, broadcast: bool = True):
+        """Drop the entry locally and, unless told otherwise, on every other worker."""
+        with self._lock:
+            load = self._loads.get(int(conversation_id))
+            if load is not None:
+                load[0] += 1
+            self._cache.pop(int(conversation_id))
+        if broadcast:
+            manager.publish_control_nowait(
+                _INVALIDATE, {"conversation_id": int(conversation_id)}
+            )
+
+    def clear(self):
+        with self._lock:
+            for load in self._loads.values():
+                load[0] += 1
+            self._cache.clear()
+
+    @staticmethod
+    def _load(conversation_id: int, db: Optional[Session]) -> Dict[int, str]:
+        if db is not None:
+            return queries.member_roles(db, conversation_id)
+        from app.database.connection import SessionLocal
+
+        session = SessionLocal()
+        try:
+            return queries.member_roles(session, conversation_id)
+        finally:
+            session.close()
+
+
+membership_cache = MembershipCache()
+
+
+def _on_remote_invalidate(data: dict):
+    conversation_id = data.get("conversation_id")
+    if conversation_id is not None:
+        membership_cache.invalidate(conversation_id, broadcast=False)
+
+
+manager.on_control(_INVALIDATE, _on_remote_invalidate)
@@ -0,0 +1,359 @@
+"""
+Compact in-process registries of open sockets and joined rooms.
+
+`ConnectionRegistry` maps user id -> that user's sockets. Almost every user
+has exactly one, so the value is the `Connection` record itself and becomes a
+tuple only for the second socket; a record is a `__slots__` object (no
+per-instance dict). `RoomRegistry` maps conversation id -> joined user ids and
+user id -> joined conversation ids as sorted `array("q")`s: 8 bytes per
+member instead of a set slot plus a boxed int, and leaving every room on the
+last disconnect is a lookup, not a scan.
+
+Memory budget, measured with benchmarks/bench_ws_load.py on CPython 3.11,
+uvicorn 0.30 and websockets 12 (2,000 idle sockets, one per user, ~6 rooms
+each), per socket and extrapolated to 100k idle sockets on one worker:
+
+    registries (record, dict slot, boxed id)          ~120 B    ~12 MB
+    room memberships (both directions)                ~370 B    ~37 MB
+    RSS, compression off                               ~48 KB   ~4.8 GB
+    RSS, WS_COMPRESS_* defaults                        ~83 KB   ~8.3 GB
+    RSS, WS_COMPRESS_CONTEXT_TAKEOVER=false            ~57 KB   ~5.7 GB
+    RSS, uvicorn's own offer (15-bit, memLevel 8)     ~150 KB    ~15 GB
+
+With compression on, each socket holds a zlib window pair (see
+app.chat.compression) that the kernel backs page by page as it is used, so
+RSS grows towards the allocation under traffic; 100k sockets per worker fit
+in ~6 GB with compression off or per-message. `memory_report()` gives the
+live figures, see `/admin/memory`.
+
+Callers get copies (`connections()`, `members()`), so a fan-out that awaits
+between sends never sees the registry change under it.
+"""
+
+import asyncio
+import bisect
+import gc
+import heapq
+import itertools
+import sys
+import time
+import types
+from array import array
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+
+class Connection:
+    __slots__ = ("websocket", "user_id", "opened_at", "last_seen")
+
+    def __init__(self, websocket, user_id: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.opened_at = self.last_seen = time.monotonic()
+
+    def touch(self) -> None:
+        """Record inbound traffic; see app.chat.heartbeat."""
+        self.last_seen = time.monotonic()
+
+
+_Entry = Union[Connection, Tuple[Connection, ...]]
+
+
+class ConnectionRegistry:
+    def __init__(self):
+        self._users: Dict[int, _Entry] = {}
+        self.sockets = 0
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._users
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._users)
+
+    def user_ids(self) -> List[int]:
+        return list(self._users)
+
+    def add(self, user_id: int, websocket) -> Connection:
+        record = Connection(websocket, user_id)
+        entry = self._users.get(user_id)
+        if entry is None:
+            self._users[user_id] = record
+        elif type(entry) is Connection:
+            self._users[user_id] = (entry, record)
+        else:
+            self._users[user_id] = entry + (record,)
+        self.sockets += 1
+        return record
+
+    def remove(self, user_id: int, websocket) -> bool:
+        """Forget one socket; True if that was the user's last one."""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return False
+        if type(entry) is Connection:
+            if entry.websocket is not websocket:
+                return False
+            del self._users[user_id]
+            self.sockets -= 1
+            return True
+        rest = tuple(c for c in entry if c.websocket is not websocket)
+        if len(rest) == len(entry):
+            return False
+        self._users[user_id] = rest[0] if len(rest) == 1 else rest
+        self.sockets -= 1
+        return False
+
+    def connections(self, user_id: int) -> Tuple[Connection, ...]:
+        entry = self._users.get(user_id)
+        if entry is None:
+            return ()
+        return (entry,) if type(entry) is Connection else entry
+
+    def all(self) -> Iterator[Connection]:
+        for entry in self._users.values():
+            if type(entry) is Connection:
+                yield entry
+            else:
+                yield from entry
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the registry itself (not the sockets)."""
+        size = sys.getsizeof(self._users)
+        for user_id, entry in self._users.items():
+            size += _int_size(user_id)
+            if type(entry) is Connection:
+                size += sys.getsizeof(entry)
+            else:
+                size += sys.getsizeof(entry) + sum(sys.getsizeof(c) for c in entry)
+        return size
+
+
+class RoomRegistry:
+    def __init__(self):
+        self._members: Dict[int, array] = {}
+        self._rooms_of: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def join(self, conversation_id: int, user_id: int) -> bool:
+        """Add a member; False if already joined."""
+        if not _insert(self._members, conversation_id, user_id):
+            return False
+        _insert(self._rooms_of, user_id, conversation_id)
+        return True
+
+    def leave(self, conversation_id: int, user_id: int) -> None:
+        _discard(self._members, conversation_id, user_id)
+        _discard(self._rooms_of, user_id, conversation_id)
+
+    def leave_all(self, user_id: int) -> int:
+        """Drop the user from every room; returns how many."""
+        rooms = self._rooms_of.pop(user_id, None)
+        if rooms is None:
+            return 0
+        for conversation_id in rooms:
+            _discard(self._members, conversation_id, user_id)
+        return len(rooms)
+
+    def members(self, conversation_id: int) -> array:
+        """A copy of the joined user ids (an empty array if none)."""
+        members = self._members.get(conversation_id)
+        return members[:] if members is not None else array("q")
+
+    def rooms_of(self, user_id: int) -> array:
+        rooms = self._rooms_of.get(user_id)
+        return rooms[:] if rooms is not None else array("q")
+
+    def room_nbytes(self, conversation_id: int) -> int:
+        members = self._members.get(conversation_id)
+        if members is None:
+            return 0
+        # the member array, its key, and the user -> rooms entries it implies
+        return sys.getsizeof(members) + _int_size(conversation_id) + 8 * len(members)
+
+    def room_sizes(self) -> Iterator[Tuple[int, int]]:
+        for conversation_id, members in self._members.items():
+            yield conversation_id, len(members)
+
+    def nbytes(self) -> int:
+        size = sys.getsizeof(self._members) + sys.getsizeof(self._rooms_of)
+        for index in (self._members, self._rooms_of):
+            for key, values in index.items():
+                size += _int_size(key) + sys.getsizeof(values)
+        return size
+
+
+def _insert(index: Dict[int, array], key: int, value: int) -> bool:
+    values = index.get(key)
+    if values is None:
+        index[key] = array("q", (value,))
+        return True
+    i = bisect.bisect_left(values, value)
+    if i < len(values) and values[i] == value:
+        return False
+    values.insert(i, value)
+    return True
+
+
+def _discard(index: Dict[int, array], key: int, value: int) -> None:
+    values = index.get(key)
+    if values is None:
+        return
+    i = bisect.bisect_left(values, value)
+    if i < len(values) and values[i] == value:
+        del values[i]
+        if not values:
+            del index[key]
+
+
+def _int_size(value: int) -> int:
+    # small ints are cached singletons: a dict slot holds no extra object
+    return 0 if -5 <= value <= 256 else sys.getsizeof(value)
+
+
+# ---- socket object sizes ----
+# shared by every socket, or not owned by it: never charged to one socket
+_SKIP_TYPES = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.CodeType,
+    asyncio.AbstractEventLoop,
+)
+# attributes / scope keys that point at server-wide state
+_SKIP_KEYS = frozenset(
+    (
+        "app",
+        "router",
+        "route",
+        "endpoint",
+        "state",
+        "fastapi_astack",
+        "config",
+        "server_state",
+        "app_state",
+        "logger",
+        "loop",
+        "_loop",
+    )
+)
+_MAX_DEPTH = 8
+_MAX_OBJECTS = 20_000
+
+
+def _reachable(websocket) -> Tuple[Dict[int, int], int]:
+    """id -> size of the objects reachable from one WebSocket, and zlib bytes."""
+    sizes: Dict[int, int] = {}
+    compression = 0
+    stack: List[Tuple[Any, int]] = [(websocket, 0)]
+    while stack and len(sizes) < _MAX_OBJECTS:
+        obj, depth = stack.pop()
+        if id(obj) in sizes or isinstance(obj, _SKIP_TYPES):
+            continue
+        sizes[id(obj)] = sys.getsizeof(obj)
+        compression += _zlib_nbytes(obj)
+        if depth >= _MAX_DEPTH or isinstance(obj, (str, bytes, int, float)):
+            continue
+        depth += 1
+        if isinstance(obj, dict):
+            for key, value in obj.items():
+                if key not in _SKIP_KEYS:
+                    stack.append((key, depth))
+                    stack.append((value, depth))
+        elif isinstance(obj, types.MethodType):
+            stack.append((obj.__self__, depth))
+        else:
+            stack.extend((ref, depth) for ref in gc.get_referents(obj))
+    return sizes, compression
+
+
+def _zlib_nbytes(obj) -> int:
+    """
+    zlib state behind a negotiated permessage-deflate extension, which
+    getsizeof cannot see: zlib's documented allocation for a deflate and an
+    inflate stream of the negotiated window sizes. The kernel only backs the
+    pages zlib has touched, so RSS grows towards this as traffic compresses.
+    """
+    settings = getattr(obj, "compress_settings", None)
+    if not isinstance(settings, dict) or not hasattr(obj, "local_max_window_bits"):
+        return 0
+    size = 0
+    if getattr(obj, "encoder", None) is not None:
+        mem_level = settings.get("memLevel", 8)
+        size += (1 << (obj.local_max_window_bits + 2)) + (1 << (mem_level + 9))
+    if getattr(obj, "decoder", None) is not None:
+        size += (1 << obj.remote_max_window_bits) + 7168
+    return size
+
+
+def socket_nbytes(websockets: List[Any]) -> List[Tuple[int, int]]:
+    """
+    Approximate (object bytes, zlib bytes) owned by each of `websockets`: the
+    Starlette object, its scope, and the server protocol behind its
+    send/receive callables with its transport, buffers, queues and
+    compression state. Objects reachable from more than one of them (server
+    state, shared config) are left out, so pass a sample of several.
+    """
+    walks = [_reachable(ws) for ws in websockets]
+    seen_by: Dict[int, int] = {}
+    for sizes, _ in walks:
+        for obj_id in sizes:
+            seen_by[obj_id] = seen_by.get(obj_id, 0) + 1
+    owners = len(walks) if len(walks) == 1 else 1
+    return [
+        (sum(n for obj_id, n in sizes.items() if seen_by[obj_id] <= owners), zlib)
+        for sizes, zlib in walks
+    ]
+
+
+def memory_report(
+    connections: ConnectionRegistry,
+    rooms: RoomRegistry,
+    sample: int = 100,
+    largest: int = 10,
+) -> Dict[str, Any]:
+    """
+    Approximate memory held for connected users: the registries exactly (by
+    `sys.getsizeof`), the sockets by walking a sample of them. Per-socket and
+    total figures add both; rooms are charged by their member arrays. Socket
+    figures are a floor: the walk does not see allocator overhead, and the
+    measured RSS of an idle socket is about twice the object bytes.
+    """
+    sockets = connections.sockets
+    sampled = [c.websocket for c in itertools.islice(connections.all(), sample)]
+    sizes = socket_nbytes(sampled) if sampled else []
+    totals = [objects + zlib for objects, zlib in sizes]
+    socket_bytes = sum(totals) // len(totals) if totals else 0
+    compression = sum(zlib for _, zlib in sizes) // len(sizes) if sizes else 0
+    connection_bytes = connections.nbytes()
+    room_bytes = rooms.nbytes()
+    registry_per_socket = (connection_bytes + room_bytes) // sockets if sockets else 0
+    room_sizes = heapq.nlargest(largest, rooms.room_sizes(), key=lambda r: r[1])
+    return {
+        "sockets": sockets,
+        "users": len(connections),
+        "rooms": len(rooms),
+        "registry_bytes": {"connections": connection_bytes, "rooms": room_bytes},
+        "socket_bytes": {
+            "sampled": len(sizes),
+            "mean": socket_bytes,
+            "max": max(totals, default=0),
+            # included in mean/max: zlib windows of permessage-deflate
+            "compression": compression,
+        },
+        "per_socket_bytes": registry_per_socket + socket_bytes,
+        "per_room_bytes": room_bytes // len(rooms) if len(rooms) else 0,
+        "largest_rooms": [
+            {
+                "conversation_id": conversation_id,
+                "members": members,
+                "bytes": rooms.room_nbytes(conversation_id),
+            }
+            for conversation_id, members in room_sizes
+        ],
+        "total_bytes": connection_bytes + room_bytes + socket_bytes * sockets,
+    }
@@ -1,12 +1,19 @@
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Union
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.database.models import Conversation, ConversationMember, Message, User
+from app.utils.cache import LRUCache
+from app.chat.membership import membership_cache
 
+# pair_key -> conversation id. Direct conversations are never re-keyed or
+# deleted, so entries stay valid across workers and need no invalidation.
+direct_conversation_cache = LRUCache(maxsize=100000)
 
-def _pair_key_for_users(a: int, b: int) -> str:
+
+def pair_key_for_users(a: int, b: int) -> str:
     a, b = sorted([int(a), int(b)])
     return f"direct:{a}:{b}"
 
@@ -14,23 +21,37 @@ def _pair_key_for_users(a: int, b: int) -> str:
 def get_direct_conversation_between(
     db: Session, user_a: int, user_b: int
 ) -> Optional[Conversation]:
-    pair_key = _pair_key_for_users(user_a, user_b)
-    stmt = select(Conversation).where(
-        Conversation.private_pair_key == pair_key, Conversation.type == "direct"
-    )
-    return db.execute(stmt).scalars().first()
+    pair_key = pair_key_for_users(user_a, user_b)
+    stmt = select(Conversation).where(Conversation.private_pair_key == pair_key)
+    conv = db.execute(stmt).scalars().first()
+    if conv is not None:
+        direct_conversation_cache.set(pair_key, conv.id)
+    return conv
 
 
 def create_direct_conversation(db: Session, user_a: int, user_b: int) -> Conversation:
-    pair_key = _pair_key_for_users(user_a, user_b)
+    """
+    Create the direct conversation for a pair. If another request won the race
+    the unique pair key rejects our insert and we return the existing row.
+    """
+    pair_key = pair_key_for_users(user_a, user_b)
     conv = Conversation(name=None, type="direct", private_pair_key=pair_key)
-    db.add(conv)
-    db.flush()  # populate conv.id
+    try:
+        # a savepoint, so losing the race leaves the caller's session intact
+        with db.begin_nested():
+            db.add(conv)
+            db.flush()  # populate conv.id
+    except IntegrityError:
+        existing = get_direct_conversation_between(db, user_a, user_b)
+        if existing is None:
+            raise
+        return existing
     m1 = ConversationMember(conversation_id=conv.id, user_id=int(user_a), role="member")
     m2 = ConversationMember(conversation_id=conv.id, user_id=int(user_b), role="member")
     db.add_all([m1, m2])
     db.commit()
     db.refresh(conv)
+    direct_conversation_cache.set(pair_key, conv.id)
     return conv
 
 
@@ -43,6 +64,17 @@ def get_or_create_direct_conversation(
     return create_direct_conversation(db, user_a, user_b)
 
 
+def get_or_create_direct_conversation_id(db: Session, user_a: int, user_b: int) -> int:
+    """
+    Id-only variant of get_or_create_direct_conversation: answered from the
+    pair cache without touching the database when the pair has been seen.
+    """
+    conv_id = direct_conversation_cache.get(pair_key_for_users(user_a, user_b))
+    if conv_id is not None:
+        return conv_id
+    return get_or_create_direct_conversation(db, user_a, user_b).id
+
+
 def create_message(
     db: Session,
     conversation_id: int,
@@ -72,11 +104,7 @@ def create_message(
 
 
 def get_conversation_member_ids(db: Session, conversation_id: int) -> List[int]:
-    stmt = select(ConversationMember.user_id).where(
-        ConversationMember.conversation_id == conversation_id
-    )
-    rows = db.execute(stmt).scalars().all()
-    return [int(x) for x in rows]
+    return sorted(membership_cache.member_ids(conversation_id, db))
 
 
 # -----------------------
@@ -152,6 +180,7 @@ def add_member_to_group(
     db.add(member)
     db.commit()
     db.refresh(member)
+    membership_cache.invalidate(conversation_id)
     return member
 
 
@@ -171,6 +200,7 @@ def remove_member_from_group(db: Session, conversation_id: int, user_id: int) ->
         return False
     db.delete(member)
     db.commit()
+    membership_cache.invalidate(conversation_id)
     return True
 
 
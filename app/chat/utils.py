@@ -7,6 +7,24 @@ def build_message_event(message: dict) -> dict:
     return {"type": "message.new", "message": message}
 
 
+def build_new_message_event(message: dict, sender_username: str) -> dict:
+    """
+    Build the "new_message" event the /ws endpoint delivers to conversation
+    members from a create_message() dict (created_at already an ISO string).
+    """
+    return {
+        "type": "new_message",
+        "message": {
+            "id": message["id"],
+            "conversation_id": message["conversation_id"],
+            "sender_id": message["sender_id"],
+            "sender_username": sender_username,
+            "content": message["content"],
+            "created_at": message["created_at"],
+        },
+    }
+
+
 def build_error_event(msg: str) -> dict:
     """
     Build a simple error event payload for sending to clients.
@@ -4,17 +4,17 @@ import logging
 from typing import Optional
 
 from fastapi import WebSocket, Query, status
-from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from app.auth.dependencies import get_current_user_optional
-from app.database.connection import SessionLocal
-from app.chat.services import (
-    get_conversation_member_ids,
-    create_message,
+from app.auth.dependencies import (
+    get_current_user_optional_token as get_current_user_optional,
 )
+from app.database.connection import SessionLocal
+from app.chat.services import create_message
 from app.chat.manager import manager
+from app.chat.membership import membership_cache
 from app.chat.utils import build_message_event, build_error_event
+from app.utils.workload import db_write
 
 logger = logging.getLogger("chat.websocket")
 
@@ -33,15 +33,10 @@ async def ws_group_handler(
         return
     user_id = int(user_payload.get("id"))
 
-    # verify membership before accepting
-    db: Session = SessionLocal()
-    try:
-        member_ids = await run_in_threadpool(get_conversation_member_ids, db, group_id)
-        if user_id not in member_ids:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-    finally:
-        db.close()
+    # verify membership before accepting (DB only on a cache miss)
+    if not await membership_cache.is_member_async(group_id, user_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
 
     await websocket.accept()
     await manager.connect(user_id, websocket)
@@ -67,25 +62,24 @@ async def ws_group_handler(
                     await websocket.send_json(build_error_event("content required"))
                     continue
 
+                # membership is re-checked per frame so kicks take effect at once;
+                # a warm cache answers without leaving the event loop
+                roles = await membership_cache.roles_async(group_id)
+                if user_id not in roles:
+                    await websocket.send_json(build_error_event("not a group member"))
+                    continue
+
                 # persist message
                 db: Session = SessionLocal()
                 try:
-                    member_ids = await run_in_threadpool(
-                        get_conversation_member_ids, db, group_id
-                    )
-                    if user_id not in member_ids:
-                        await websocket.send_json(
-                            build_error_event("not a group member")
-                        )
-                        continue
-                    msg = await run_in_threadpool(
+                    msg = await db_write.run(
                         create_message, db, group_id, user_id, content
                     )
                 finally:
                     db.close()
 
                 event = build_message_event(msg)
-                await manager.publish_event(event, set(member_ids))
+                await manager.publish_event(event, set(roles))
                 continue
 
             await websocket.send_json(build_error_event("unknown type"))
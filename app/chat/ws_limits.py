@@ -0,0 +1,121 @@
+"""
+Per-user limits on inbound WebSocket frames.
+
+Every text frame is checked for size and against a frames/second bucket
+before it is parsed; every application message (anything but a ping) is then
+checked against a messages/second bucket. Buckets are keyed by user, so
+opening more sockets does not buy more throughput. A violation closes the
+socket: 1009 (message too big) for oversized frames, 1008 (policy violation)
+for floods.
+
+Uvicorn still buffers a whole frame before the app sees it; cap that with
+`--ws-max-size` at or slightly above WS_MAX_FRAME_BYTES.
+"""
+
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.cache import LRUCache
+from app.utils.metrics import registry
+from app.utils.rate_limit import take_token
+
+WS_MAX_FRAME_BYTES = int(os.getenv("WS_MAX_FRAME_BYTES", "16384"))
+WS_FRAMES_PER_SECOND = float(os.getenv("WS_FRAMES_PER_SECOND", "20"))
+WS_FRAME_BURST = int(os.getenv("WS_FRAME_BURST", "40"))
+WS_MESSAGES_PER_SECOND = float(os.getenv("WS_MESSAGES_PER_SECOND", "5"))
+WS_MESSAGE_BURST = int(os.getenv("WS_MESSAGE_BURST", "10"))
+
+CLOSE_TOO_BIG = 1009
+CLOSE_POLICY = 1008
+
+Violation = Tuple[int, str]
+
+
+class WebSocketLimits:
+    def __init__(
+        self,
+        max_frame_bytes: int = WS_MAX_FRAME_BYTES,
+        frames_per_second: float = WS_FRAMES_PER_SECOND,
+        frame_burst: int = WS_FRAME_BURST,
+        messages_per_second: float = WS_MESSAGES_PER_SECOND,
+        message_burst: int = WS_MESSAGE_BURST,
+        max_users: int = 100000,
+    ):
+        self.max_frame_bytes = max_frame_bytes
+        self.frames_per_second = frames_per_second
+        self.frame_burst = frame_burst
+        self.messages_per_second = messages_per_second
+        self.message_burst = message_burst
+        # user_id -> (tokens, updated); idle buckets refill, so LRU eviction is safe
+        self._frames = LRUCache(maxsize=max_users)
+        self._messages = LRUCache(maxsize=max_users)
+        self.counters = {
+            "frames_accepted": 0,
+            "messages_accepted": 0,
+            "rejected_frame_size": 0,
+            "rejected_frame_rate": 0,
+            "rejected_message_rate": 0,
+        }
+
+    def check_frame(self, user_id: int, data) -> Optional[Violation]:
+        """Size and frames/second check on the raw frame (before json.loads)."""
+        # len() of a str counts characters; encoded it is at least that many bytes
+        size = len(data)
+        if size > self.max_frame_bytes or (
+            isinstance(data, str)
+            and size * 4 > self.max_frame_bytes
+            and len(data.encode()) > self.max_frame_bytes
+        ):
+            self.counters["rejected_frame_size"] += 1
+            return CLOSE_TOO_BIG, "Frame too large"
+        if not self._take(
+            self._frames, user_id, self.frame_burst, self.frames_per_second
+        ):
+            self.counters["rejected_frame_rate"] += 1
+            return CLOSE_POLICY, "Too many frames"
+        self.counters["frames_accepted"] += 1
+        return None
+
+    def check_message(self, user_id: int) -> Optional[Violation]:
+        """Messages/second check for an application message."""
+        if not self._take(
+            self._messages, user_id, self.message_burst, self.messages_per_second
+        ):
+            self.counters["rejected_message_rate"] += 1
+            return CLOSE_POLICY, "Too many messages"
+        self.counters["messages_accepted"] += 1
+        return None
+
+    @staticmethod
+    def _take(buckets: LRUCache, user_id: int, burst: int, rate: float) -> bool:
+        now = time.monotonic()
+        tokens, updated = buckets.get(user_id, (float(burst), now))
+        tokens, allowed, _ = take_token(tokens, updated, now, burst, rate)
+        buckets.set(user_id, (tokens, now), ttl=burst / rate)
+        return allowed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_frame_bytes": self.max_frame_bytes,
+            "frames_per_second": self.frames_per_second,
+            "messages_per_second": self.messages_per_second,
+            **self.counters,
+        }
+
+    def reset(self):
+        self._frames.clear()
+        self._messages.clear()
+        for name in self.counters:
+            self.counters[name] = 0
+
+
+ws_limits = WebSocketLimits()
+
+registry.callback_gauge(
+    "ws_inbound_total",
+    "Inbound WebSocket frames/messages by limit check outcome",
+    lambda: [((name,), value) for name, value in ws_limits.counters.items()],
+    ("outcome",),
+    kind="counter",
+)
@@ -0,0 +1,36 @@
+"""
+Access to the server's WebSocket protocol object from the ASGI app.
+
+Starlette's WebSocket only speaks ASGI messages, but liveness pings, aborting
+a dead socket and choosing the compression offer need the server protocol
+(uvicorn's, a websockets protocol). The outermost `ProtocolMiddleware` finds
+it behind the server's own `send` and keeps it in the scope.
+"""
+
+from app.chat import compression
+
+PROTOCOL_SCOPE_KEY = "chat.ws_protocol"
+
+
+def server_protocol(websocket):
+    """The server protocol behind a Starlette WebSocket, or None."""
+    return websocket.scope.get(PROTOCOL_SCOPE_KEY)
+
+
+class ProtocolMiddleware:
+    """
+    Must be the outermost user middleware: inner layers only see Starlette's
+    wrapped `send`. Under servers without a websockets protocol (wsproto,
+    the test client) the scope entry is None and callers fall back.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            protocol = getattr(send, "__self__", None)
+            scope[PROTOCOL_SCOPE_KEY] = protocol
+            if protocol is not None:
+                compression.negotiate(protocol)
+        await self.app(scope, receive, send)
@@ -1,6 +1,62 @@
+from typing import List
+
+from sqlalchemy import delete, or_, and_
 from sqlalchemy.orm import Session
 
+from app.database import queries
+from app.database.models import FriendEdge, Friendship
+
 
 def send_friend_request(db: Session, **kwargs):
     # placeholder implementation
     raise NotImplementedError()
+
+
+def add_friend_edges(db: Session, user_a: int, user_b: int) -> None:
+    """
+    Record an accepted friendship in both directions. Does not commit so the
+    caller can keep it in the same transaction as the Friendship update.
+    """
+    for u, f in ((int(user_a), int(user_b)), (int(user_b), int(user_a))):
+        if db.get(FriendEdge, (u, f)) is None:
+            db.add(FriendEdge(user_id=u, friend_id=f))
+
+
+def remove_friend_edges(db: Session, user_a: int, user_b: int) -> None:
+    """Drop both directions of a friendship edge. Does not commit."""
+    a, b = int(user_a), int(user_b)
+    db.execute(
+        delete(FriendEdge).where(
+            or_(
+                and_(FriendEdge.user_id == a, FriendEdge.friend_id == b),
+                and_(FriendEdge.user_id == b, FriendEdge.friend_id == a),
+            )
+        )
+    )
+
+
+def get_friend_ids(db: Session, user_id: int) -> List[int]:
+    """Friend ids of a user: one index range scan on friend_edges' primary key."""
+    return queries.friend_ids(db, user_id)
+
+
+def delete_friendship(db: Session, user_a: int, user_b: int) -> bool:
+    """
+    Unfriend: remove accepted Friendship rows between the pair and their edges.
+    Returns False when the two users were not friends.
+    """
+    a, b = int(user_a), int(user_b)
+    result = db.execute(
+        delete(Friendship).where(
+            Friendship.status == "accepted",
+            or_(
+                and_(Friendship.requester_id == a, Friendship.receiver_id == b),
+                and_(Friendship.requester_id == b, Friendship.receiver_id == a),
+            ),
+        )
+    )
+    if not result.rowcount:
+        return False
+    remove_friend_edges(db, a, b)
+    db.commit()
+    return True
@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select, and_, func
 
 from app.database.models import Conversation, ConversationMember, Message, User
+from app.chat.services import pair_key_for_users
 
 
 def get_direct_conversation_between(
@@ -15,11 +16,8 @@ def get_direct_conversation_between(
     We'll use deterministic private_pair_key for direct chats to find existing conversation.
     """
     # create deterministic pair key ordered by id to find same conversation
-    a, b = sorted([int(user_a), int(user_b)])
-    pair_key = f"direct:{a}:{b}"
-    stmt = select(Conversation).where(
-        Conversation.private_pair_key == pair_key, Conversation.type == "direct"
-    )
+    pair_key = pair_key_for_users(user_a, user_b)
+    stmt = select(Conversation).where(Conversation.private_pair_key == pair_key)
     return db.execute(stmt).scalars().first()
 
 
@@ -30,7 +28,7 @@ def create_direct_conversation(
     Create new direct Conversation with deterministic private_pair_key and add both members.
     """
     a, b = sorted([int(user_a), int(user_b)])
-    pair_key = f"direct:{a}:{b}"
+    pair_key = pair_key_for_users(a, b)
     conv = Conversation(name=name, type="direct", private_pair_key=pair_key)
     db.add(conv)
     db.flush()  # populate conv.id
@@ -0,0 +1,637 @@
+"""
+Bulk loading helpers for legacy chat data.
+
+`BulkWriter` pushes row batches into a table with Postgres `COPY ... FROM STDIN`
+and falls back to chunked `executemany` inserts on other backends (SQLite);
+`deferred_indexes` drops secondary indexes for the duration of a large load
+and rebuilds them once at the end.
+`NDJSONImporter` streams NDJSON records into `conversations`,
+`conversation_members` and `messages`, checking foreign keys batch by batch
+instead of row by row.
+
+Record format (one JSON object per line, `kind` selects the table):
+    {"kind": "conversation", "id": 1, "name": null, "type": "direct", "members": [7, 9]}
+    {"kind": "member", "conversation_id": 1, "user_id": 7, "role": "member"}
+    {"kind": "message", "id": 10, "conversation_id": 1, "sender_id": 7, "content": "hi"}
+
+Direct conversations name their two users in `members`, which sets the
+unique `private_pair_key` that `get_or_create_direct_conversation_id` looks
+up; their member records must be for those two users.
+"""
+
+import contextlib
+import io
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    TextIO,
+    Tuple,
+)
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.chat.services import pair_key_for_users
+
+from .connection import Base
+from . import models  # noqa: F401  (populate Base.metadata)
+
+logger = logging.getLogger("chat.import")
+
+CONVERSATION_COLUMNS = ("id", "name", "type", "private_pair_key", "created_at")
+MEMBER_COLUMNS = ("conversation_id", "user_id", "role", "joined_at")
+MESSAGE_COLUMNS = ("id", "conversation_id", "sender_id", "content", "created_at")
+
+# foreign key lookups are chunked to stay under SQLite's bound-parameter limit
+_LOOKUP_CHUNK = 900
+
+
+class _Rejected(ValueError):
+    """A record that parses but breaks a rule; `reason` is its reject count key."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _pair_users(pair_key: str) -> Tuple[int, int]:
+    """The two user ids in a key built by `pair_key_for_users`."""
+    _, low, high = pair_key.split(":")
+    return int(low), int(high)
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+class BulkWriter:
+    """
+    Write row tuples into a table as fast as the backend allows.
+    Postgres uses COPY (psycopg2 `copy_expert` or psycopg 3 `cursor.copy`);
+    every other dialect gets executemany inserts in `chunk_size` slices. On
+    qmark drivers (sqlite3) the row tuples go to the driver as they are, with
+    only the columns that need it (DateTime) run through their bind processor,
+    which is roughly twice as fast as SQLAlchemy's per-row dict handling.
+    Each call to `write` is committed on its own so progress survives a crash.
+    """
+
+    def __init__(self, engine: Engine, chunk_size: int = 5000):
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.use_copy = engine.dialect.name == "postgresql"
+        self._positional = engine.dialect.paramstyle == "qmark"
+        self._prepared: Dict[Tuple[str, Tuple[str, ...]], Optional[tuple]] = {}
+
+    def write(
+        self, table_name: str, columns: Sequence[str], rows: Sequence[Tuple]
+    ) -> int:
+        if not rows:
+            return 0
+        if self.use_copy:
+            self._copy(table_name, columns, rows)
+        else:
+            self._executemany(table_name, columns, rows)
+        return len(rows)
+
+    def _copy(self, table_name: str, columns: Sequence[str], rows: Sequence[Tuple]):
+        sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv)".format(
+            table_name, ", ".join(columns)
+        )
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            if hasattr(cursor, "copy_expert"):
+                # psycopg2: stream a CSV buffer (see _csv_line for NULL vs "")
+                buf = io.StringIO()
+                buf.writelines(_csv_line(row) for row in rows)
+                buf.seek(0)
+                cursor.copy_expert(sql, buf)
+            else:
+                # psycopg 3
+                with cursor.copy(sql) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+
+    def _executemany(
+        self, table_name: str, columns: Sequence[str], rows: Sequence[Tuple]
+    ):
+        table = Base.metadata.tables[table_name]
+        prepared = self._prepare(table_name, tuple(columns))
+        if prepared is not None:
+            sql, processors = prepared
+            with self.engine.begin() as conn:
+                for start in range(0, len(rows), self.chunk_size):
+                    chunk = rows[start : start + self.chunk_size]
+                    if processors:
+                        chunk = [_process(row, processors) for row in chunk]
+                    conn.exec_driver_sql(sql, chunk)
+            return
+        with self.engine.begin() as conn:
+            for start in range(0, len(rows), self.chunk_size):
+                chunk = rows[start : start + self.chunk_size]
+                conn.execute(table.insert(), [dict(zip(columns, r)) for r in chunk])
+
+    def _prepare(
+        self, table_name: str, columns: Tuple[str, ...]
+    ) -> Optional[Tuple[str, List[Tuple[int, Callable[[Any], Any]]]]]:
+        """Raw positional INSERT for `columns`, or None to use Core inserts."""
+        if not self._positional:
+            return None
+        key = (table_name, columns)
+        if key not in self._prepared:
+            dialect = self.engine.dialect
+            table = Base.metadata.tables[table_name]
+            if any(
+                c.default is not None and c.name not in columns for c in table.columns
+            ):
+                # omitted columns with Python-side defaults need Core to fill them
+                self._prepared[key] = None
+                return None
+            processors = []
+            for i, name in enumerate(columns):
+                impl = table.c[name].type.dialect_impl(dialect)
+                process = impl.bind_processor(dialect)
+                if process is not None:
+                    processors.append((i, _fast_processor(impl, process)))
+            sql = "INSERT INTO {} ({}) VALUES ({})".format(
+                table_name, ", ".join(columns), ", ".join("?" * len(columns))
+            )
+            self._prepared[key] = (sql, processors)
+        return self._prepared[key]
+
+    @contextlib.contextmanager
+    def deferred_indexes(self, table_names: Iterable[str]) -> Iterator[None]:
+        """
+        Drop the non-unique indexes of `table_names` and recreate them on exit:
+        one sorted index build is much cheaper than maintaining every index
+        row by row during a bulk load. Unique indexes stay, they are constraints.
+        """
+        dropped = [
+            index
+            for name in table_names
+            for index in Base.metadata.tables[name].indexes
+            if not index.unique
+        ]
+        for index in dropped:
+            index.drop(self.engine, checkfirst=True)
+        try:
+            yield
+        finally:
+            for index in dropped:
+                index.create(self.engine, checkfirst=True)
+
+    def reset_sequences(self, table_names: Iterable[str]):
+        """After loading explicit ids, move Postgres serial sequences past them."""
+        if not self.use_copy:
+            return
+        with self.engine.begin() as conn:
+            for name in table_names:
+                conn.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                        f"COALESCE((SELECT MAX(id) FROM {name}), 1))"
+                    )
+                )
+
+
+def _process(row: Tuple, processors: List[Tuple[int, Callable[[Any], Any]]]) -> Tuple:
+    values = list(row)
+    for i, process in processors:
+        values[i] = process(values[i])
+    return tuple(values)
+
+
+def _fast_processor(impl, process: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """
+    SQLite's DATETIME processor builds its string through a %-format dict per
+    value; isoformat() produces the same default storage format in C.
+    """
+    default_format = getattr(type(impl), "_storage_format", None)
+    if (
+        type(impl).__name__ != "DATETIME"
+        or getattr(impl, "_storage_format", None) != default_format
+        or "%(microsecond)06d" not in (default_format or "")
+    ):
+        return process
+
+    def iso(value):
+        if type(value) is datetime:
+            if value.tzinfo is not None:
+                value = value.replace(
+                    tzinfo=None
+                )  # stored as wall time, as SQLAlchemy does
+            return value.isoformat(" ", "microseconds")
+        return process(value)
+
+    return iso
+
+
+def _csv_value(value: Any) -> str:
+    # COPY's CSV format reads an unquoted empty field as NULL and a quoted one
+    # as an empty string, so strings are always quoted ("" content stays "")
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_line(row: Tuple) -> str:
+    return ",".join(_csv_value(v) for v in row) + "\n"
+
+
+@dataclass
+class ImportStats:
+    started: float = field(default_factory=time.monotonic)
+    read: int = 0
+    written: Dict[str, int] = field(
+        default_factory=lambda: {
+            "conversations": 0,
+            "conversation_members": 0,
+            "messages": 0,
+        }
+    )
+    rejected: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def elapsed(self) -> float:
+        return max(time.monotonic() - self.started, 1e-9)
+
+    @property
+    def total_written(self) -> int:
+        return sum(self.written.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.total_written / self.elapsed
+
+    def reject(self, reason: str):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "read": self.read,
+            "written": dict(self.written),
+            "rejected": dict(self.rejected),
+            "elapsed_s": round(self.elapsed, 3),
+            "rows_per_s": round(self.rows_per_second, 1),
+        }
+
+
+class NDJSONImporter:
+    """
+    Stream NDJSON records into the chat tables.
+
+    Rows are buffered per table and flushed every `batch_size` records.
+    Before a member/message batch is written, pending conversations are flushed
+    and every referenced conversation/user id is resolved with one `IN (...)`
+    query per chunk of unknown ids. Rows that fail a check are skipped, counted
+    by reason and optionally copied verbatim to `reject_file`.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int = 10000,
+        progress_every: int = 100000,
+        reject_file: Optional[TextIO] = None,
+    ):
+        self.writer = BulkWriter(engine)
+        self.engine = engine
+        self.batch_size = batch_size
+        self.progress_every = progress_every
+        self.reject_file = reject_file
+        self.stats = ImportStats()
+        self._known_users: Set[int] = set()
+        self._known_conversations: Set[int] = set()
+        self._missing_users: Set[int] = set()
+        self._missing_conversations: Set[int] = set()
+        self._pending: Dict[str, List[Tuple[Tuple, str]]] = {
+            "conversations": [],
+            "conversation_members": [],
+            "messages": [],
+        }
+        self._next_progress = progress_every
+
+    # ---------- public API ----------
+    def run(self, lines: Iterable[str]) -> ImportStats:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            self.stats.read += 1
+            self._ingest(line)
+            if self.stats.read >= self._next_progress:
+                self._report_progress()
+                self._next_progress += self.progress_every
+        self.flush()
+        self.writer.reset_sequences(["conversations", "messages"])
+        self._report_progress()
+        return self.stats
+
+    def flush(self):
+        self._flush_conversations()
+        self._flush_dependent("conversation_members", MEMBER_COLUMNS)
+        self._flush_dependent("messages", MESSAGE_COLUMNS)
+
+    # ---------- parsing ----------
+    def _ingest(self, line: str):
+        try:
+            record = json.loads(line)
+            kind = record.get("kind")
+            if kind == "conversation":
+                table, row = "conversations", self._conversation_row(record)
+            elif kind == "member":
+                table, row = "conversation_members", self._member_row(record)
+            elif kind == "message":
+                table, row = "messages", self._message_row(record)
+            else:
+                self._reject(line, "unknown_kind")
+                return
+        except _Rejected as exc:
+            self._reject(line, exc.reason)
+            return
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self._reject(line, "malformed")
+            return
+
+        pending = self._pending[table]
+        pending.append((row, line))
+        if len(pending) >= self.batch_size:
+            if table == "conversations":
+                self._flush_conversations()
+            else:
+                columns = MEMBER_COLUMNS if table != "messages" else MESSAGE_COLUMNS
+                self._flush_dependent(table, columns)
+
+    @staticmethod
+    def _conversation_row(record: Dict[str, Any]) -> Tuple:
+        conv_type = record.get("type") or "direct"
+        if conv_type not in ("direct", "group"):
+            raise ValueError("bad conversation type")
+        pair_key = None
+        if conv_type == "direct":
+            members = {int(uid) for uid in record.get("members") or ()}
+            if len(members) != 2:
+                raise _Rejected("direct_not_two_members")
+            pair_key = pair_key_for_users(*members)
+        return (
+            int(record["id"]),
+            record.get("name"),
+            conv_type,
+            pair_key,
+            _parse_timestamp(record.get("created_at")) or datetime.utcnow(),
+        )
+
+    @staticmethod
+    def _member_row(record: Dict[str, Any]) -> Tuple:
+        role = record.get("role") or "member"
+        if role not in ("admin", "member"):
+            raise ValueError("bad member role")
+        return (
+            int(record["conversation_id"]),
+            int(record["user_id"]),
+            role,
+            _parse_timestamp(record.get("joined_at")) or datetime.utcnow(),
+        )
+
+    @staticmethod
+    def _message_row(record: Dict[str, Any]) -> Tuple:
+        sender = record.get("sender_id")
+        content = record["content"]
+        if not isinstance(content, str):
+            raise ValueError("content must be a string")
+        return (
+            int(record["id"]),
+            int(record["conversation_id"]),
+            int(sender) if sender is not None else None,
+            content,
+            _parse_timestamp(record.get("created_at")) or datetime.utcnow(),
+        )
+
+    # ---------- flushing ----------
+    def _flush_conversations(self):
+        pending = self._pending["conversations"]
+        if not pending:
+            return
+        self._pending["conversations"] = []
+        # re-running an import must not trip over ids that are already loaded
+        self._resolve("conversations", {row[0] for row, _ in pending})
+        pair_keys = {row[3] for row, _ in pending if row[3] is not None}
+        self._resolve("users", {uid for key in pair_keys for uid in _pair_users(key)})
+        taken_pairs = self._existing_pair_keys(pair_keys)
+        rows = []
+        for row, line in pending:
+            if row[0] in self._known_conversations:
+                self._reject(line, "duplicate_conversation")
+                continue
+            pair_key = row[3]
+            if pair_key is not None:
+                if not self._known_users.issuperset(_pair_users(pair_key)):
+                    self._reject(line, "unknown_user")
+                    continue
+                if pair_key in taken_pairs:
+                    self._reject(line, "duplicate_pair")
+                    continue
+                taken_pairs.add(pair_key)
+            self._known_conversations.add(row[0])
+            self._missing_conversations.discard(row[0])
+            rows.append(row)
+        self.stats.written["conversations"] += self.writer.write(
+            "conversations", CONVERSATION_COLUMNS, rows
+        )
+
+    def _flush_dependent(self, table: str, columns: Sequence[str]):
+        pending = self._pending[table]
+        if not pending:
+            return
+        # dependents may point at conversations still sitting in the buffer
+        self._flush_conversations()
+        self._pending[table] = []
+
+        if table == "messages":
+            conv_ids = {row[1] for row, _ in pending}
+            user_ids = {row[2] for row, _ in pending if row[2] is not None}
+        else:
+            conv_ids = {row[0] for row, _ in pending}
+            user_ids = {row[1] for row, _ in pending}
+        self._resolve("conversations", conv_ids)
+        self._resolve("users", user_ids)
+        # message ids and member pairs are not cached (there are too many);
+        # probe each batch instead. Earlier batches are committed, so the probe
+        # also catches duplicates across batches of this run.
+        existing_messages: Set[int] = set()
+        existing_members: Set[Tuple[int, int]] = set()
+        if table == "messages":
+            existing_messages = self._existing_ids(
+                "messages", {row[0] for row, _ in pending}
+            )
+        else:
+            pairs = self._direct_pairs(conv_ids)
+            existing_members = self._existing_members({row[:2] for row, _ in pending})
+
+        rows = []
+        for row, line in pending:
+            if table == "messages":
+                conv_id, user_id = row[1], row[2]
+            else:
+                conv_id, user_id = row[0], row[1]
+            if conv_id not in self._known_conversations:
+                self._reject(line, "unknown_conversation")
+                continue
+            if user_id is not None and user_id not in self._known_users:
+                self._reject(line, "unknown_user")
+                continue
+            if table == "messages":
+                if row[0] in existing_messages:
+                    self._reject(line, "duplicate_message")
+                    continue
+                existing_messages.add(row[0])
+            if table == "conversation_members":
+                if conv_id in pairs and user_id not in pairs[conv_id]:
+                    self._reject(line, "not_in_pair")
+                    continue
+                if (conv_id, user_id) in existing_members:
+                    self._reject(line, "duplicate_member")
+                    continue
+                existing_members.add((conv_id, user_id))
+            rows.append(row)
+        self.stats.written[table] += self.writer.write(table, columns, rows)
+
+    def _resolve(self, table: str, ids: Set[int]):
+        """Classify ids we have not seen yet as known or missing."""
+        if table == "users":
+            known, missing = self._known_users, self._missing_users
+        else:
+            known, missing = self._known_conversations, self._missing_conversations
+        unknown = [i for i in ids if i not in known and i not in missing]
+        if not unknown:
+            return
+        found = self._existing_ids(table, unknown)
+        known.update(found)
+        missing.update(set(unknown) - found)
+
+    def _existing_ids(self, table: str, ids: Iterable[int]) -> Set[int]:
+        """Return the subset of `ids` present in `table`, one IN query per chunk."""
+        ids = sorted(ids)
+        found: Set[int] = set()
+        with self.engine.connect() as conn:
+            for start in range(0, len(ids), _LOOKUP_CHUNK):
+                chunk = ids[start : start + _LOOKUP_CHUNK]
+                params = {f"p{i}": v for i, v in enumerate(chunk)}
+                placeholders = ", ".join(f":{k}" for k in params)
+                rows = conn.execute(
+                    text(f"SELECT id FROM {table} WHERE id IN ({placeholders})"),
+                    params,
+                ).scalars()
+                found.update(int(x) for x in rows)
+        return found
+
+    def _existing_pair_keys(self, pair_keys: Set[str]) -> Set[str]:
+        """Return the subset of `pair_keys` already used by a conversation."""
+        keys = sorted(pair_keys)
+        found: Set[str] = set()
+        with self.engine.connect() as conn:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start : start + _LOOKUP_CHUNK]
+                params = {f"p{i}": v for i, v in enumerate(chunk)}
+                placeholders = ", ".join(f":{k}" for k in params)
+                rows = conn.execute(
+                    text(
+                        "SELECT private_pair_key FROM conversations"
+                        f" WHERE private_pair_key IN ({placeholders})"
+                    ),
+                    params,
+                ).scalars()
+                found.update(rows)
+        return found
+
+    def _direct_pairs(self, conv_ids: Set[int]) -> Dict[int, Tuple[int, int]]:
+        """conversation_id -> its two user ids, for the direct ones in `conv_ids`."""
+        ids = sorted(conv_ids)
+        pairs: Dict[int, Tuple[int, int]] = {}
+        with self.engine.connect() as conn:
+            for start in range(0, len(ids), _LOOKUP_CHUNK):
+                chunk = ids[start : start + _LOOKUP_CHUNK]
+                params = {f"p{i}": v for i, v in enumerate(chunk)}
+                placeholders = ", ".join(f":{k}" for k in params)
+                rows = conn.execute(
+                    text(
+                        "SELECT id, private_pair_key FROM conversations"
+                        f" WHERE id IN ({placeholders})"
+                        " AND private_pair_key IS NOT NULL"
+                    ),
+                    params,
+                )
+                pairs.update((int(cid), _pair_users(key)) for cid, key in rows)
+        return pairs
+
+    def _existing_members(self, pairs: Set[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+        """Return the (conversation_id, user_id) pairs already in the table."""
+        ordered = sorted(pairs)
+        found: Set[Tuple[int, int]] = set()
+        step = _LOOKUP_CHUNK // 2  # two IN lists per query
+        with self.engine.connect() as conn:
+            for start in range(0, len(ordered), step):
+                chunk = ordered[start : start + step]
+                conv_ids = sorted({c for c, _ in chunk})
+                user_ids = sorted({u for _, u in chunk})
+                params = {f"c{i}": v for i, v in enumerate(conv_ids)}
+                params.update({f"u{i}": v for i, v in enumerate(user_ids)})
+                rows = conn.execute(
+                    text(
+                        "SELECT conversation_id, user_id FROM conversation_members"
+                        " WHERE conversation_id IN ({}) AND user_id IN ({})".format(
+                            ", ".join(f":c{i}" for i in range(len(conv_ids))),
+                            ", ".join(f":u{i}" for i in range(len(user_ids))),
+                        )
+                    ),
+                    params,
+                )
+                # the IN lists cross-match; keep only the pairs asked about
+                found.update(p for p in map(tuple, rows) if p in pairs)
+        return found
+
+    def _reject(self, line: str, reason: str):
+        self.stats.reject(reason)
+        if self.reject_file is not None:
+            self.reject_file.write(line + "\n")
+
+    def _report_progress(self):
+        s = self.stats
+        logger.info(
+            "import progress: read=%d written=%d (conv=%d members=%d messages=%d) "
+            "rejected=%d elapsed=%.1fs rate=%.0f rows/s",
+            s.read,
+            s.total_written,
+            s.written["conversations"],
+            s.written["conversation_members"],
+            s.written["messages"],
+            sum(s.rejected.values()),
+            s.elapsed,
+            s.rows_per_second,
+        )
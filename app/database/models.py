@@ -72,12 +72,56 @@ class Friendship(Base):
     )
 
 
+class FriendEdge(Base):
+    """
+    Materialized accepted friendships, one row per direction, so
+    "friends of X" is a primary-key range scan instead of an OR over Friendship.
+    Maintained by app.crud.friendship_crud on accept/unfriend.
+    """
+
+    __tablename__ = "friend_edges"
+
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    friend_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    created_at = Column(DateTime(timezone=True), default=func.now())
+
+    __table_args__ = (
+        CheckConstraint("user_id <> friend_id", name="chk_friend_edge_no_self"),
+    )
+
+
+class RefreshToken(Base):
+    """
+    Issued refresh tokens, stored by sha256 digest (the token itself is never
+    kept). Rotation revokes a row and points it at its successor; presenting
+    a revoked token again revokes its whole family. See app/auth/refresh_tokens.py.
+    """
+
+    __tablename__ = "refresh_tokens"
+
+    token_hash = Column(String(64), primary_key=True)
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    family_id = Column(String(32), nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    replaced_by = Column(String(64), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=func.now())
+
+
 class Conversation(Base):
     __tablename__ = "conversations"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(Text, nullable=True)  # tên nhóm (để null nếu là 1-1)
     type = Column(Text, nullable=False, default="direct")  # direct = 1-1, group = nhóm
+    # "direct:<min_id>:<max_id>" cho chat 1-1, null cho nhóm
+    private_pair_key = Column(Text, nullable=True, unique=True, index=True)
     created_at = Column(DateTime(timezone=True), default=func.now())
 
     __table_args__ = (
@@ -121,7 +165,10 @@ class ConversationMember(Base):
 class Message(Base):
     __tablename__ = "messages"
 
-    id = Column(BigInteger, primary_key=True, index=True)
+    # SQLite only autoincrements INTEGER PRIMARY KEY, so use it there
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True, index=True
+    )
     conversation_id = Column(
         Integer,
         ForeignKey("conversations.id", ondelete="CASCADE"),
@@ -142,6 +189,7 @@ class Message(Base):
 # INDEXES (tối ưu hóa)
 # =========================
 Index("idx_friendship_status", Friendship.status)
+Index("idx_friend_edges_friend_user", FriendEdge.friend_id, FriendEdge.user_id)
 Index("idx_conversation_type", Conversation.type)
 Index("idx_message_conversation_id", Message.conversation_id)
 Index("idx_message_created_at", Message.created_at)
@@ -0,0 +1,94 @@
+"""
+Pre-built statements for the hot read paths.
+
+Each statement is constructed once at import time with bound parameters, so a
+request only supplies parameter values: SQLAlchemy reuses the memoized cache
+key and the compiled SQL from the engine's compiled cache instead of building
+and compiling a new `Query` every time. Pass parameters by name:
+
+    db.execute(queries.USER_BY_ID, {"user_id": 1}).scalars().first()
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from .models import ConversationMember, FriendEdge, Message, User
+
+USER_BY_ID = select(User).where(User.id == bindparam("user_id"))
+
+MEMBER_ROLES = select(ConversationMember.user_id, ConversationMember.role).where(
+    ConversationMember.conversation_id == bindparam("conversation_id")
+)
+
+# newest first; sender username comes from the same round trip (no per-row lookup)
+HISTORY_PAGE = (
+    select(Message, User.username)
+    .outerjoin(User, User.id == Message.sender_id)
+    .where(Message.conversation_id == bindparam("conversation_id"))
+    .order_by(Message.created_at.desc(), Message.id.desc())
+    .offset(bindparam("skip"))
+    .limit(bindparam("limit"))
+)
+
+# "expanding" renders IN (...) per call while the statement stays cached
+MEMBER_IDS_IN = (
+    select(ConversationMember.conversation_id, ConversationMember.user_id)
+    .where(
+        ConversationMember.conversation_id.in_(
+            bindparam("conversation_ids", expanding=True)
+        )
+    )
+    .order_by(ConversationMember.conversation_id, ConversationMember.user_id)
+)
+
+FRIEND_IDS = select(FriendEdge.friend_id).where(
+    FriendEdge.user_id == bindparam("user_id")
+)
+
+FRIENDS = (
+    select(User)
+    .join(FriendEdge, FriendEdge.friend_id == User.id)
+    .where(FriendEdge.user_id == bindparam("user_id"))
+)
+
+
+def user_by_id(db: Session, user_id: int) -> Optional[User]:
+    return db.execute(USER_BY_ID, {"user_id": int(user_id)}).scalars().first()
+
+
+def member_roles(db: Session, conversation_id: int) -> Dict[int, str]:
+    rows = db.execute(MEMBER_ROLES, {"conversation_id": int(conversation_id)})
+    return {int(user_id): role for user_id, role in rows}
+
+
+def history_page(
+    db: Session, conversation_id: int, skip: int, limit: int
+) -> List[Tuple[Message, Optional[str]]]:
+    params = {"conversation_id": int(conversation_id), "skip": skip, "limit": limit}
+    return db.execute(HISTORY_PAGE, params).all()
+
+
+def member_ids_by_conversation(
+    db: Session, conversation_ids: List[int]
+) -> Dict[int, List[int]]:
+    """Sorted member ids for several conversations in one query."""
+    if not conversation_ids:
+        return {}
+    rows = db.execute(
+        MEMBER_IDS_IN,
+        {"conversation_ids": [int(cid) for cid in conversation_ids]},
+    )
+    members: Dict[int, List[int]] = {}
+    for conversation_id, user_id in rows:
+        members.setdefault(int(conversation_id), []).append(int(user_id))
+    return members
+
+
+def friend_ids(db: Session, user_id: int) -> List[int]:
+    return [int(x) for x in db.execute(FRIEND_IDS, {"user_id": int(user_id)}).scalars()]
+
+
+def friends(db: Session, user_id: int) -> List[User]:
+    return list(db.execute(FRIENDS, {"user_id": int(user_id)}).scalars())
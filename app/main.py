@@ -13,16 +13,32 @@ import json
 from typing import Dict, Set
 from collections import defaultdict
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 
 from app.config import settings
 
 # Ensure models are imported so SQLAlchemy metadata is populated
 from app.database import models  # noqa: F401
 from app.websocket_manager import websocket_manager
+from app.chat.manager import manager as pubsub_manager
+from app.utils.workload import configure_default_threadpool, workload_stats
+from app.auth.hash_service import HashingOverloaded, hasher
+from app.utils.rate_limit import rate_limit_stats
+from app.chat.ws_limits import ws_limits
+from app.chat.ws_protocol import ProtocolMiddleware
+from app.utils.logging_config import configure_logging
+from app.utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry
+from app.utils.request_timing import RequestTimingMiddleware, TimedJSONResponse
+from app.utils.traffic_journal import traffic_journal
+from app.utils.loop_monitor import loop_monitor
+from app.utils.profiler import ProfilerBusy, profiler
+from app.utils.tracing import TracingMiddleware, tracer
+from app.auth.dependencies import get_admin_user
+
+configure_logging()
 
 # Routers (adjust imports if your package layout differs)
 from app.routers import auth_router
@@ -51,15 +67,14 @@ try:
     # from app.websocket.chat_ws import router as ws_router
     ws_router = None
     ws_manager = None  # Simplified for now
-    print("Old WebSocket router DISABLED - using new endpoint in main.py")
-except Exception as e:
-    print(f"Failed to import WebSocket router: {e}")
+except Exception:
+    logging.getLogger("app.main").exception("Failed to import WebSocket router")
     ws_router = None
     ws_manager = None
 
 logger = logging.getLogger("app.main")
 
-app = FastAPI(title="chat_real_time")
+app = FastAPI(title="chat_real_time", default_response_class=TimedJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -73,6 +88,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# added last so it wraps CORS; unhandled errors are recorded as 5xx.
+# Also emits Server-Timing and enforces @query_budget in development/test.
+app.add_middleware(RequestTimingMiddleware)
+if tracer.configured:
+    app.add_middleware(TracingMiddleware)
+# outermost: needs the server's own `send` to reach the WebSocket protocol
+# (heartbeat pings, compression offer)
+app.add_middleware(ProtocolMiddleware)
+
+
+@app.exception_handler(HashingOverloaded)
+async def hashing_overloaded_handler(request, exc):
+    # shed load before queueing more 64 MiB Argon2 jobs
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
 
 # Include registered routers if present
 app.include_router(auth_router.router)
@@ -125,11 +159,9 @@ async def serve_manual_ws_test():
     return FileResponse("manual_ws_test.html")
 
 
-# Simple WebSocket endpoint for chat with enhanced logging - UPDATED
+# Simple WebSocket endpoint for chat
 @app.websocket("/ws/{token}")
 async def websocket_endpoint(websocket: WebSocket, token: str):
-    print(f"🔌 WebSocket connection attempt with token: {token[:20]}...")
-
     # Simple token verification - extract user_id
     user_id = None
     try:
@@ -137,22 +169,22 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 
         payload = decode_access_token(token)
         user_id = payload.get("id") or payload.get("user_id")
-        print(f"✅ Token verified for user_id: {user_id}")
     except Exception as e:
-        print(f"❌ Token verification failed: {e}")
+        logger.info("ws auth failed", extra={"error": str(e)})
         await websocket.close(code=4001, reason="Authentication failed")
         return
 
     if not user_id:
-        print("❌ No user_id found in token")
+        logger.info("ws auth failed", extra={"error": "token has no user id"})
         await websocket.close(code=4001, reason="Invalid token")
         return
 
+    conn_id = None
     try:
         await websocket.accept()
-        print(f"✅ WebSocket accepted for user {user_id}")
-        await websocket_manager.connect(user_id, websocket)
-        print(f"✅ User {user_id} registered in WebSocket manager")
+        connection = await websocket_manager.connect(user_id, websocket)
+        conn_id = traffic_journal.ws_open(user_id)
+        logger.info("ws connected", extra={"user_id": user_id})
 
         # Send welcome message
         await websocket.send_text(
@@ -163,28 +195,35 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 
         while True:
             data = await websocket.receive_text()
-            print(f"📩 Received WebSocket data from user {user_id}: {data}")
+            connection.touch()
+            # size and rate are checked on the raw frame, before any parsing
+            violation = ws_limits.check_frame(user_id, data)
+            if violation:
+                await _close_for_violation(websocket, user_id, violation)
+                return
 
             try:
                 message_data = json.loads(data)
                 message_type = message_data.get("type")
 
+                if message_type != "ping":
+                    violation = ws_limits.check_message(user_id)
+                    if violation:
+                        await _close_for_violation(websocket, user_id, violation)
+                        return
+                # only frames within every limit: the journal queue is bounded by
+                # record count, not bytes
+                traffic_journal.ws_frame(conn_id, data)
+
                 if message_type == "ping":
                     await websocket.send_text(json.dumps({"type": "pong"}))
-                    print("📤 Sent pong response")
                 elif message_type == "join_conversation":
                     conversation_id = message_data.get("conversation_id")
                     if conversation_id:
                         try:
-                            print(
-                                f"🔧 Processing join_conversation for user {user_id}, conversation {conversation_id}"
-                            )
                             await websocket_manager.join_conversation(
                                 user_id, conversation_id
                             )
-                            print(
-                                f"✅ User {user_id} joined conversation {conversation_id}"
-                            )
                             # Send confirmation
                             await websocket.send_text(
                                 json.dumps(
@@ -194,31 +233,52 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                                     }
                                 )
                             )
-                            print(f"📤 Sent joined_conversation confirmation")
-                        except Exception as e:
-                            print(f"❌ Error joining conversation: {e}")
-                            import traceback
-
-                            traceback.print_exc()
+                        except Exception:
+                            logger.exception(
+                                "join_conversation failed",
+                                extra={
+                                    "user_id": user_id,
+                                    "conversation_id": conversation_id,
+                                },
+                            )
                     else:
-                        print(f"❌ No conversation_id in join_conversation message")
+                        logger.debug(
+                            "join_conversation without conversation_id",
+                            extra={"user_id": user_id},
+                        )
 
             except json.JSONDecodeError:
-                print("❌ Invalid JSON received")
+                logger.debug("ws invalid json", extra={"user_id": user_id})
 
     except WebSocketDisconnect:
-        print(f"🔌 WebSocket disconnected for user {user_id}")
+        logger.info("ws disconnected", extra={"user_id": user_id})
         await websocket_manager.disconnect(user_id, websocket)
-    except Exception as e:
-        print(f"❌ WebSocket error for user {user_id}: {e}")
-        import traceback
-
-        traceback.print_exc()
+    except Exception:
+        logger.exception("ws error", extra={"user_id": user_id})
         await websocket_manager.disconnect(user_id, websocket)
+    finally:
+        if conn_id is not None:
+            traffic_journal.ws_close(conn_id)
+
+
+async def _close_for_violation(websocket: WebSocket, user_id, violation):
+    code, reason = violation
+    logger.warning(
+        "ws limit exceeded; closing",
+        extra={"user_id": user_id, "close_code": code, "reason": reason},
+    )
+    await websocket.close(code=code, reason=reason)
+    await websocket_manager.disconnect(user_id, websocket)
 
 
 @app.on_event("startup")
 async def on_startup():
+    configure_default_threadpool()
+    traffic_journal.start()
+    loop_monitor.start()
+    websocket_manager.heartbeat.start()
+    tracer.start()
+
     # Optionally create DB tables in development (use Alembic in production)
     try:
         if str(settings.CREATE_DB_ON_STARTUP).lower() in ("1", "true", "yes"):
@@ -241,6 +301,12 @@ async def on_startup():
     else:
         logger.debug("ws_manager not available; skipping start")
 
+    # Redis pub/sub broker: cross-worker fan-out and cache invalidation
+    try:
+        await pubsub_manager.start()
+    except Exception:
+        logger.exception("Failed to start pub/sub manager; continuing without it")
+
 
 @app.on_event("shutdown")
 async def on_shutdown():
@@ -254,7 +320,84 @@ async def on_shutdown():
     else:
         logger.debug("ws_manager not available; skipping stop")
 
+    try:
+        await pubsub_manager.stop()
+    except Exception:
+        logger.exception("Error while stopping pub/sub manager")
+
+    hasher.shutdown()
+    traffic_journal.stop()
+    await loop_monitor.stop()
+    await websocket_manager.heartbeat.stop()
+    tracer.stop()
+
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "message": "chat_real_time running"}
+
+
+# /health stays public for load balancer probes. The detailed views below
+# expose internals (pool sizes, limiter state, stack traces in LOOP_DEBUG
+# mode), so they are for operators only, like /admin/*.
+@app.get("/health/workloads", dependencies=[Depends(get_admin_user)])
+async def workload_health():
+    """Queue depth, in-flight count and wait times per thread budget"""
+    stats = workload_stats()
+    stats["hashing"] = hasher.stats()
+    return stats
+
+
+@app.get("/health/ws-limits", dependencies=[Depends(get_admin_user)])
+async def ws_limit_health():
+    """Accepted vs rejected inbound WebSocket frames and messages"""
+    return ws_limits.stats()
+
+
+@app.get("/health/loop", dependencies=[Depends(get_admin_user)])
+async def loop_health():
+    """Event loop lag and, in LOOP_DEBUG mode, stacks of recent blocking calls"""
+    return loop_monitor.stats()
+
+
+@app.get("/health/heartbeat", dependencies=[Depends(get_admin_user)])
+async def heartbeat_health():
+    """WebSocket heartbeat settings, sockets on the timer wheel, pings and reaps"""
+    return websocket_manager.heartbeat.stats()
+
+
+@app.get("/health/rate-limits", dependencies=[Depends(get_admin_user)])
+async def rate_limit_health():
+    """Admitted vs rejected attempts per credential rate limiter"""
+    return rate_limit_stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition for this worker process"""
+    return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/admin/memory", dependencies=[Depends(get_admin_user)])
+async def memory(sample: int = Query(100, ge=1, le=1000)):
+    """Approximate bytes held per socket, per room and in total on this worker"""
+    return websocket_manager.memory_report(sample)
+
+
+@app.get("/admin/profile", dependencies=[Depends(get_admin_user)])
+async def profile(
+    seconds: float = Query(10, gt=0, le=60),
+    hz: float = Query(100, gt=0, le=1000),
+):
+    """Sample this worker for `seconds`; collapsed stacks for a flame graph"""
+    try:
+        result = await profiler.run(seconds, hz)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return PlainTextResponse(
+        result.collapsed(),
+        headers={
+            "X-Profile-Samples": str(result.samples),
+            "X-Profile-Seconds": f"{result.seconds:.2f}",
+        },
+    )
@@ -1,85 +1,78 @@
-from typing import Any, Dict
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, Dict, Optional
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 
 from app.database.connection import get_db
 from app.database.models import User
-from app.auth.hashing import hash_password, verify_password, needs_rehash
-from app.auth.jwt_handler import create_access_token
+from app.auth.hashing import needs_rehash
+from app.auth.hash_service import hasher
+from app.auth.jwt_handler import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token
+from app.auth.refresh_tokens import (
+    RefreshTokenError,
+    issue_refresh_token,
+    revoke_refresh_token,
+    rotate_refresh_token,
+)
 from app.auth.dependencies import get_current_user
-from app.schemas.auth_schema import UserCreate, UserLogin, UserOut, Token
+from app.auth.principal import Principal, principal_cache
+from app.schemas.auth_schema import (
+    RefreshRequest,
+    Token,
+    UserCreate,
+    UserLogin,
+    UserOut,
+)
+from app.utils.rate_limit import (
+    RateLimiter,
+    client_ip,
+    login_ip,
+    login_user,
+    register_ip,
+)
+from app.utils.workload import db_read, db_write
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/register", response_model=UserOut)
-def register(user_in: UserCreate, db: Session = Depends(get_db)) -> Any:
+async def register(
+    user_in: UserCreate, request: Request, db: Session = Depends(get_db)
+) -> Any:
     """
     Register a new user. Hash password then store.
     """
+    await _enforce(register_ip, client_ip(request))
     # check username/email uniqueness
-    existing = db.query(User).filter(User.username == user_in.username).first()
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken"
-        )
-
-    if user_in.email:
-        existing_email = db.query(User).filter(User.email == user_in.email).first()
-        if existing_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered",
-            )
+    conflict = await db_read.run(_registration_conflict, db, user_in)
+    if conflict:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=conflict)
 
+    password_hash = await hasher.hash(user_in.password)
     user = User(
         username=user_in.username,
         email=user_in.email,
-        password_hash=hash_password(user_in.password),
+        password_hash=password_hash,
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db_write.run(_save_user, db, user)
     return UserOut(id=user.id, username=user.username, email=user.email)
 
 
 @router.post("/token", response_model=Token)
-def login_token(user_login: UserLogin, db: Session = Depends(get_db)) -> Any:
+async def login_token(
+    user_login: UserLogin, request: Request, db: Session = Depends(get_db)
+) -> Any:
     """
     Login endpoint for token. Accepts JSON body:
       { "username": "<username_or_email>", "password": "<password>" }
     Returns JWT access token on success.
     """
-    username = user_login.username
-    password = user_login.password
-
-    user = (
-        db.query(User)
-        .filter((User.username == username) | (User.email == username))
-        .first()
-    )
-    if not user or not verify_password(password, user.password_hash):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
-        )
-
-    # If hash policy changed, re-hash and update DB transparently
-    try:
-        if needs_rehash(user.password_hash):
-            user.password_hash = hash_password(password)
-            db.add(user)
-            db.commit()
-    except Exception:
-        # best-effort: don't prevent login if rehash fails
-        pass
-
-    token_payload: Dict[str, Any] = {"id": user.id, "username": user.username}
-    access_token = create_access_token(token_payload)
-    return Token(access_token=access_token)
+    return await _authenticate(user_login, db, request)
 
 
 @router.get("/me", response_model=UserOut)
-def get_current_user_info(current_user: User = Depends(get_current_user)) -> Any:
+def get_current_user_info(current_user: Principal = Depends(get_current_user)) -> Any:
     """
     Get current user information.
     """
@@ -89,22 +82,32 @@ def get_current_user_info(current_user: User = Depends(get_current_user)) -> Any
 
 
 @router.post("/login", response_model=Token)
-def login(user_login: UserLogin, db: Session = Depends(get_db)) -> Any:
+async def login(
+    user_login: UserLogin, request: Request, db: Session = Depends(get_db)
+) -> Any:
     """
     Login endpoint. Accepts JSON body:
       { "username": "<username_or_email>", "password": "<password>" }
     Returns JWT access token on success.
     """
-    print(f"Received login request: username={user_login.username}")
+    return await _authenticate(user_login, db, request)
+
+
+async def _authenticate(user_login: UserLogin, db: Session, request: Request) -> Token:
+    """
+    Shared login flow. DB work runs on its own thread budgets and Argon2 in the
+    hashing process pool, so a burst of logins queues there instead of pinning
+    the shared threadpool.
+    """
     username = user_login.username
     password = user_login.password
 
-    user = (
-        db.query(User)
-        .filter((User.username == username) | (User.email == username))
-        .first()
-    )
-    if not user or not verify_password(password, user.password_hash):
+    # throttle before any lookup or hashing: per client, then per account
+    await _enforce(login_ip, client_ip(request))
+    await _enforce(login_user, username.strip().lower())
+
+    user = await db_read.run(_find_login_user, db, username)
+    if not user or not await hasher.verify(password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
@@ -112,13 +115,84 @@ def login(user_login: UserLogin, db: Session = Depends(get_db)) -> Any:
     # If hash policy changed, re-hash and update DB transparently
     try:
         if needs_rehash(user.password_hash):
-            user.password_hash = hash_password(password)
-            db.add(user)
-            db.commit()
+            user.password_hash = await hasher.hash(password)
+            await db_write.run(_save_user, db, user)
     except Exception:
         # best-effort: don't prevent login if rehash fails
         pass
 
-    token_payload: Dict[str, Any] = {"id": user.id, "username": user.username}
-    access_token = create_access_token(token_payload)
-    return Token(access_token=access_token)
+    refresh_token = await db_write.run(issue_refresh_token, db, user.id)
+    return _token_pair(user.id, user.username, refresh_token)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh(body: RefreshRequest, db: Session = Depends(get_db)) -> Any:
+    """
+    Exchange a refresh token for a new access token and a new refresh token.
+    No password and no Argon2: the presented token is single-use.
+    """
+    try:
+        user_id, refresh_token = await db_write.run(
+            rotate_refresh_token, db, body.refresh_token
+        )
+    except RefreshTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
+        )
+    principal = await db_read.run(principal_cache.get, user_id, db)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
+        )
+    return _token_pair(principal.id, principal.username, refresh_token)
+
+
+@router.post("/logout")
+async def logout(body: RefreshRequest, db: Session = Depends(get_db)) -> Any:
+    """
+    Revoke the session the refresh token belongs to. The access token stays
+    valid until it expires.
+    """
+    await db_write.run(revoke_refresh_token, db, body.refresh_token)
+    return {"status": "success"}
+
+
+async def _enforce(limiter: RateLimiter, key: str) -> None:
+    allowed, retry_after = await limiter.hit(key)
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, please try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+def _token_pair(user_id: int, username: str, refresh_token: str) -> Token:
+    token_payload: Dict[str, Any] = {"id": user_id, "username": username}
+    return Token(
+        access_token=create_access_token(token_payload),
+        refresh_token=refresh_token,
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    )
+
+
+def _find_login_user(db: Session, username: str) -> Optional[User]:
+    return (
+        db.query(User)
+        .filter((User.username == username) | (User.email == username))
+        .first()
+    )
+
+
+def _registration_conflict(db: Session, user_in: UserCreate) -> Optional[str]:
+    if db.query(User).filter(User.username == user_in.username).first():
+        return "Username already taken"
+    if user_in.email and db.query(User).filter(User.email == user_in.email).first():
+        return "Email already registered"
+    return None
+
+
+def _save_user(db: Session, user: User) -> None:
+    db.add(user)
+    db.commit()
+    db.refresh(user)
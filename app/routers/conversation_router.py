@@ -1,11 +1,14 @@
 from typing import Any, Dict, List
 import asyncio
+import logging
 
 from fastapi import APIRouter, Depends, HTTPException, status, Body, Path
+from sqlalchemy import case
 from sqlalchemy.orm import Session
 
 from app.database.connection import get_db
 from app.auth.dependencies import get_current_user
+from app.auth.principal import Principal
 from app.database.models import User, Conversation, ConversationMember, Message
 from app.schemas.conversation_schema import ConversationCreate, ConversationOut
 from app.chat.services import (
@@ -14,15 +17,22 @@ from app.chat.services import (
     remove_member_from_group,
     get_group_info,
     get_conversation_member_ids,
+    get_or_create_direct_conversation_id,
+    pair_key_for_users,
 )
 from app.chat.manager import manager
+from app.chat.membership import membership_cache
+from app.database import queries
+from app.utils.request_timing import query_budget
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
+logger = logging.getLogger("chat.conversations")
 
 
 @router.get("", response_model=List[ConversationOut])
+@query_budget(3)  # current user + conversations + all their members
 def get_conversations(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)
 ) -> Any:
     """
     Get all conversations for current user
@@ -34,10 +44,14 @@ def get_conversations(
         .all()
     )
 
+    # one round trip for every conversation's members instead of one per row
+    members = queries.member_ids_by_conversation(
+        db, [conv.id for conv in conversations]
+    )
+
     result = []
     for conv in conversations:
-        # Get member IDs for each conversation
-        member_ids = get_conversation_member_ids(db, conv.id)
+        member_ids = members.get(conv.id, [])
 
         result.append(
             ConversationOut(
@@ -57,23 +71,17 @@ def get_conversations(
 @router.get("/{conversation_id}", response_model=ConversationOut)
 def get_conversation(
     conversation_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
     Get a specific conversation by ID
     """
     # Check if user is member of this conversation
-    conversation = (
-        db.query(Conversation)
-        .join(ConversationMember)
-        .filter(
-            Conversation.id == conversation_id,
-            ConversationMember.user_id == current_user.id,
-        )
-        .first()
-    )
+    if not membership_cache.is_member(conversation_id, current_user.id, db):
+        raise HTTPException(status_code=404, detail="Conversation not found")
 
+    conversation = db.get(Conversation, conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
@@ -94,7 +102,7 @@ def get_conversation(
 @router.post("", response_model=ConversationOut)
 def create_conversation(
     conversation_data: ConversationCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
@@ -113,39 +121,28 @@ def create_conversation(
                 )
 
             other_user_id = conversation_data.member_user_ids[0]
+            if other_user_id == current_user.id:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Cannot start a direct conversation with yourself",
+                )
 
             # Check if other user exists
             other_user = db.query(User).filter(User.id == other_user_id).first()
             if not other_user:
                 raise HTTPException(status_code=404, detail="User not found")
 
-            # Create new direct conversation (don't check for existing for now)
-            conversation = Conversation(
-                name=None, type="direct"  # Direct conversations don't have names
-            )
-            db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
-
-            # Add both users as members
-            member1 = ConversationMember(
-                conversation_id=conversation.id, user_id=current_user.id, role="member"
+            # Reuse the existing direct conversation for this pair if there is one
+            conversation_id = get_or_create_direct_conversation_id(
+                db, current_user.id, other_user_id
             )
-            member2 = ConversationMember(
-                conversation_id=conversation.id, user_id=other_user_id, role="member"
-            )
-
-            db.add(member1)
-            db.add(member2)
-            db.commit()
 
-            member_ids = [current_user.id, other_user_id]
             return ConversationOut(
-                id=conversation.id,
-                name=conversation.name,
-                type=conversation.type,
-                private_pair_key=None,
-                member_ids=member_ids,
+                id=conversation_id,
+                name=None,  # Direct conversations don't have names
+                type="direct",
+                private_pair_key=pair_key_for_users(current_user.id, other_user_id),
+                member_ids=sorted([current_user.id, other_user_id]),
             )
 
         else:
@@ -168,15 +165,15 @@ def create_conversation(
 
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error creating conversation: {e}")
+    except Exception:
+        logger.exception("create conversation failed")
         raise HTTPException(status_code=500, detail="Failed to create conversation")
 
 
 @router.post("/groups", response_model=ConversationOut)
 def create_group_endpoint(
     payload: ConversationCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
@@ -230,7 +227,7 @@ def create_group_endpoint(
 @router.delete("/{group_id}/leave", response_model=Dict[str, Any])
 def leave_group_endpoint(
     group_id: int = Path(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
@@ -261,7 +258,7 @@ def leave_group_endpoint(
 def transfer_admin_endpoint(
     conversation_id: int = Path(...),
     payload: dict = Body(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
@@ -272,16 +269,7 @@ def transfer_admin_endpoint(
         if not new_admin_id:
             raise HTTPException(status_code=400, detail="new_admin_id is required")
         # Check if current user is admin of this conversation
-        current_member = (
-            db.query(ConversationMember)
-            .filter(
-                ConversationMember.conversation_id == conversation_id,
-                ConversationMember.user_id == current_user.id,
-            )
-            .first()
-        )
-
-        if not current_member or current_member.role != "admin":
+        if membership_cache.role_of(conversation_id, current_user.id, db) != "admin":
             raise HTTPException(
                 status_code=403,
                 detail="Only conversation admin can transfer admin role",
@@ -297,24 +285,26 @@ def transfer_admin_endpoint(
             )
 
         # Check if new admin is a member
-        new_admin_member = (
-            db.query(ConversationMember)
-            .filter(
-                ConversationMember.conversation_id == conversation_id,
-                ConversationMember.user_id == new_admin_id,
-            )
-            .first()
-        )
-
-        if not new_admin_member:
+        if not membership_cache.is_member(conversation_id, new_admin_id, db):
             raise HTTPException(
                 status_code=404, detail="New admin is not a member of this conversation"
             )
 
         # Transfer admin role
-        current_member.role = "member"
-        new_admin_member.role = "admin"
+        db.query(ConversationMember).filter(
+            ConversationMember.conversation_id == conversation_id,
+            ConversationMember.user_id.in_([current_user.id, new_admin_id]),
+        ).update(
+            {
+                ConversationMember.role: case(
+                    (ConversationMember.user_id == new_admin_id, "admin"),
+                    else_="member",
+                )
+            },
+            synchronize_session=False,
+        )
         db.commit()
+        membership_cache.invalidate(conversation_id)
 
         # Get new admin user info
         new_admin_user = db.query(User).filter(User.id == new_admin_id).first()
@@ -350,8 +340,8 @@ def transfer_admin_endpoint(
                 loop.create_task(manager.publish_event(event, set(member_ids)))
             except RuntimeError:
                 asyncio.run(manager.publish_event(event, set(member_ids)))
-        except Exception as e:
-            print(f"Failed to send admin transfer notification: {e}")
+        except Exception:
+            logger.exception("admin transfer notification failed")
 
         return {
             "status": "success",
@@ -376,23 +366,14 @@ def transfer_admin_endpoint(
 def update_conversation(
     conversation_id: int,
     name: str = Body(..., embed=True),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
     Update conversation name
     """
     # Check if user is member of this conversation
-    member = (
-        db.query(ConversationMember)
-        .filter(
-            ConversationMember.conversation_id == conversation_id,
-            ConversationMember.user_id == current_user.id,
-        )
-        .first()
-    )
-
-    if not member:
+    if not membership_cache.is_member(conversation_id, current_user.id, db):
         raise HTTPException(
             status_code=404, detail="Conversation not found or access denied"
         )
@@ -439,8 +420,8 @@ def update_conversation(
         except RuntimeError:
             asyncio.run(notify_members())
 
-    except Exception as e:
-        print(f"Error notifying conversation update: {e}")
+    except Exception:
+        logger.exception("conversation update notification failed")
 
     return ConversationOut(
         id=conversation.id,
@@ -456,23 +437,14 @@ def update_conversation(
 @router.get("/{conversation_id}/members")
 def get_conversation_members(
     conversation_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
     Get detailed information about conversation members
     """
     # Check if user is member of this conversation
-    member = (
-        db.query(ConversationMember)
-        .filter(
-            ConversationMember.conversation_id == conversation_id,
-            ConversationMember.user_id == current_user.id,
-        )
-        .first()
-    )
-
-    if not member:
+    if not membership_cache.is_member(conversation_id, current_user.id, db):
         raise HTTPException(
             status_code=404, detail="Conversation not found or access denied"
         )
@@ -504,38 +476,20 @@ def get_conversation_members(
 def kick_member(
     conversation_id: int,
     member_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
     Kick a member from conversation (only admin/owner can do this)
     """
     # Check if current user is admin of this conversation
-    current_member = (
-        db.query(ConversationMember)
-        .filter(
-            ConversationMember.conversation_id == conversation_id,
-            ConversationMember.user_id == current_user.id,
-        )
-        .first()
-    )
-
-    if not current_member or current_member.role != "admin":
+    if membership_cache.role_of(conversation_id, current_user.id, db) != "admin":
         raise HTTPException(
             status_code=403, detail="Only conversation admin can kick members"
         )
 
     # Check if target member exists
-    target_member = (
-        db.query(ConversationMember)
-        .filter(
-            ConversationMember.conversation_id == conversation_id,
-            ConversationMember.user_id == member_id,
-        )
-        .first()
-    )
-
-    if not target_member:
+    if not membership_cache.is_member(conversation_id, member_id, db):
         raise HTTPException(
             status_code=404, detail="Member not found in this conversation"
         )
@@ -548,20 +502,19 @@ def kick_member(
     kicked_user = db.query(User).filter(User.id == member_id).first()
 
     # Remove member
-    db.delete(target_member)
+    db.query(ConversationMember).filter(
+        ConversationMember.conversation_id == conversation_id,
+        ConversationMember.user_id == member_id,
+    ).delete(synchronize_session=False)
     db.commit()
+    membership_cache.invalidate(conversation_id)
 
     # Notify all remaining members
     try:
         from app.websocket_manager import websocket_manager
 
         # Get remaining member IDs
-        remaining_members = (
-            db.query(ConversationMember)
-            .filter(ConversationMember.conversation_id == conversation_id)
-            .all()
-        )
-        member_ids = [m.user_id for m in remaining_members]
+        member_ids = membership_cache.member_ids(conversation_id, db)
 
         # Create notification event
         event = {
@@ -598,8 +551,8 @@ def kick_member(
         except RuntimeError:
             asyncio.run(notify_members())
 
-    except Exception as e:
-        print(f"Error notifying member kick: {e}")
+    except Exception:
+        logger.exception("member kick notification failed")
 
     return {
         "status": "success",
@@ -611,23 +564,16 @@ def kick_member(
 def add_member_to_conversation(
     conversation_id: int,
     user_id: int = Body(..., embed=True),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
     Add a member to conversation (admin only or based on conversation settings)
     """
     # Check if current user is member of this conversation
-    current_member = (
-        db.query(ConversationMember)
-        .filter(
-            ConversationMember.conversation_id == conversation_id,
-            ConversationMember.user_id == current_user.id,
-        )
-        .first()
-    )
+    current_role = membership_cache.role_of(conversation_id, current_user.id, db)
 
-    if not current_member:
+    if not current_role:
         raise HTTPException(
             status_code=404, detail="Conversation not found or access denied"
         )
@@ -650,7 +596,7 @@ def add_member_to_conversation(
     allow_member_add = conversation_settings.get("allow_member_add", False)
 
     # Only admin can add members, unless conversation allows it
-    if not allow_member_add and current_member.role != "admin":
+    if not allow_member_add and current_role != "admin":
         raise HTTPException(
             status_code=403, detail="Only conversation admin can add members"
         )
@@ -661,16 +607,7 @@ def add_member_to_conversation(
         raise HTTPException(status_code=404, detail="User not found")
 
     # Check if user is already a member
-    existing_member = (
-        db.query(ConversationMember)
-        .filter(
-            ConversationMember.conversation_id == conversation_id,
-            ConversationMember.user_id == user_id,
-        )
-        .first()
-    )
-
-    if existing_member:
+    if membership_cache.is_member(conversation_id, user_id, db):
         raise HTTPException(status_code=400, detail="User is already a member")
 
     # Add new member
@@ -679,18 +616,14 @@ def add_member_to_conversation(
     )
     db.add(new_member)
     db.commit()
+    membership_cache.invalidate(conversation_id)
 
     # Notify all members
     try:
         from app.websocket_manager import websocket_manager
 
         # Get all member IDs including the new one
-        all_members = (
-            db.query(ConversationMember)
-            .filter(ConversationMember.conversation_id == conversation_id)
-            .all()
-        )
-        member_ids = [m.user_id for m in all_members]
+        member_ids = membership_cache.member_ids(conversation_id, db)
 
         # Create notification event
         event = {
@@ -713,8 +646,8 @@ def add_member_to_conversation(
         except RuntimeError:
             asyncio.run(notify_members())
 
-    except Exception as e:
-        print(f"Error notifying member add: {e}")
+    except Exception:
+        logger.exception("member add notification failed")
 
     return {
         "status": "success",
@@ -731,23 +664,14 @@ def add_member_to_conversation(
 def update_conversation_settings(
     conversation_id: int,
     settings: dict = Body(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
     Update conversation settings (admin only)
     """
     # Check if current user is admin of this conversation
-    current_member = (
-        db.query(ConversationMember)
-        .filter(
-            ConversationMember.conversation_id == conversation_id,
-            ConversationMember.user_id == current_user.id,
-        )
-        .first()
-    )
-
-    if not current_member or current_member.role != "admin":
+    if membership_cache.role_of(conversation_id, current_user.id, db) != "admin":
         raise HTTPException(
             status_code=403, detail="Only conversation admin can update settings"
         )
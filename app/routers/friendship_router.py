@@ -4,66 +4,48 @@ from sqlalchemy.orm import Session
 
 from app.database.connection import get_db
 from app.auth.dependencies import get_current_user
+from app.auth.principal import Principal
+from app.database import queries
 from app.database.models import User, Friendship
+from app.crud.friendship_crud import add_friend_edges, delete_friendship
 from app.schemas.friendship_schema import FriendRequestOut, FriendOut
+from app.utils.request_timing import query_budget
 
 router = APIRouter(prefix="/friends", tags=["friends"])
 
 
 @router.get("", response_model=List[FriendOut])
+@query_budget(2)  # current user + friends join
 def get_friends(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)
 ) -> Any:
     """
     Get all friends for current user
     """
-    # Get accepted friendships where current user is either requester or receiver
-    friendships = (
-        db.query(Friendship)
-        .filter(
-            Friendship.status == "accepted",
-            (
-                (Friendship.requester_id == current_user.id)
-                | (Friendship.receiver_id == current_user.id)
-            ),
+    # friend_edges holds both directions, so this is a single range scan + join
+    friends_rows = queries.friends(db, current_user.id)
+
+    try:
+        from app.websocket_manager import websocket_manager
+
+        online = websocket_manager.connections
+    except Exception:
+        online = {}
+
+    return [
+        FriendOut(
+            id=friend.id,
+            username=friend.username,
+            email=friend.email,
+            is_online=friend.id in online,
         )
-        .all()
-    )
-
-    friends = []
-    for friendship in friendships:
-        # Get the other user (friend)
-        friend_id = (
-            friendship.receiver_id
-            if friendship.requester_id == current_user.id
-            else friendship.requester_id
-        )
-        friend = db.query(User).filter(User.id == friend_id).first()
-
-        if friend:
-            # Check if friend is online via WebSocket manager
-            try:
-                from app.websocket_manager import websocket_manager
-
-                is_online = friend_id in websocket_manager.connections
-            except:
-                is_online = False
-
-            friends.append(
-                FriendOut(
-                    id=friend.id,
-                    username=friend.username,
-                    email=friend.email,
-                    is_online=is_online,
-                )
-            )
-
-    return friends
+        for friend in friends_rows
+    ]
 
 
 @router.get("/requests", response_model=List[FriendRequestOut])
 def get_friend_requests(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)
 ) -> Any:
     """
     Get pending friend requests for current user
@@ -99,7 +81,7 @@ def get_friend_requests(
 @router.post("/request")
 def send_friend_request(
     request_data: Dict[str, str],
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
@@ -155,7 +137,7 @@ def send_friend_request(
 @router.put("/requests/{request_id}/accept")
 def accept_friend_request(
     request_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
@@ -175,6 +157,7 @@ def accept_friend_request(
         raise HTTPException(status_code=404, detail="Friend request not found")
 
     request.status = "accepted"
+    add_friend_edges(db, request.requester_id, request.receiver_id)
     db.commit()
 
     return {"message": "Friend request accepted"}
@@ -183,7 +166,7 @@ def accept_friend_request(
 @router.put("/requests/{request_id}/reject")
 def reject_friend_request(
     request_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
@@ -206,3 +189,18 @@ def reject_friend_request(
     db.commit()
 
     return {"message": "Friend request rejected"}
+
+
+@router.delete("/{friend_id}")
+def unfriend(
+    friend_id: int,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Any:
+    """
+    Remove a friend (both directions)
+    """
+    if not delete_friendship(db, current_user.id, friend_id):
+        raise HTTPException(status_code=404, detail="Not friends")
+
+    return {"message": "Friend removed"}
@@ -1,72 +1,63 @@
 from typing import Any, Set, List
 import asyncio
+import logging
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 
 from app.schemas.message_schema import MessageCreate, MessageOut
 from app.chat.services import (
-    get_or_create_direct_conversation,
+    get_or_create_direct_conversation_id,
     create_message,
-    get_conversation_member_ids,
 )
 from app.dependencies.use_loader import get_user_by_token
 from app.auth.dependencies import get_current_user
+from app.auth.principal import Principal
 from app.database.connection import get_db
-from app.database.models import Message, Conversation, ConversationMember, User
+from app.database import queries
+from app.database.models import Conversation
 from app.chat.manager import manager
-from app.chat.utils import build_message_event
+from app.chat.membership import membership_cache
+from app.chat.utils import build_message_event, build_new_message_event
+from app.utils.workload import db_read, db_write
+from app.utils.request_timing import query_budget
+from app.utils.traffic_journal import traffic_journal
+from app.utils.tracing import tracer
 
 router = APIRouter(prefix="/messages", tags=["messages"])
+logger = logging.getLogger("chat.messages")
 
 
 @router.get("/conversation/{conversation_id}", response_model=List[MessageOut])
-def get_messages(
+@query_budget(3)  # current user + membership + history page with senders
+async def get_messages(
     conversation_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
     Get messages for a conversation with pagination
     """
     # Verify user is member of this conversation
-    member = (
-        db.query(ConversationMember)
-        .filter(
-            ConversationMember.conversation_id == conversation_id,
-            ConversationMember.user_id == current_user.id,
-        )
-        .first()
-    )
-
-    if not member:
+    if not await membership_cache.is_member_async(conversation_id, current_user.id, db):
         raise HTTPException(
             status_code=404, detail="Conversation not found or access denied"
         )
 
-    # Get messages for this conversation
-    messages = (
-        db.query(Message)
-        .filter(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    # Get messages for this conversation (sender username joined in)
+    rows = await db_read.run(queries.history_page, db, conversation_id, skip, limit)
 
     # Convert to MessageOut format
     result = []
-    for msg in messages:
-        # Get sender info
-        sender = db.query(User).filter(User.id == msg.sender_id).first()
+    for msg, sender_username in rows:
         result.append(
             MessageOut(
                 id=msg.id,
                 conversation_id=msg.conversation_id,
                 sender_id=msg.sender_id,
-                sender_username=sender.username if sender else "Unknown",
+                sender_username=sender_username or "Unknown",
                 content=msg.content,
                 created_at=msg.created_at,
             )
@@ -79,7 +70,7 @@ def get_messages(
 @router.post("", response_model=MessageOut)
 async def send_message_to_conversation(
     payload: MessageCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """
@@ -89,43 +80,37 @@ async def send_message_to_conversation(
         raise HTTPException(status_code=400, detail="conversation_id is required")
 
     # Verify user is member of this conversation
-    member = (
-        db.query(ConversationMember)
-        .filter(
-            ConversationMember.conversation_id == payload.conversation_id,
-            ConversationMember.user_id == current_user.id,
+    with tracer.span("membership.check"):
+        is_member = await membership_cache.is_member_async(
+            payload.conversation_id, current_user.id, db
         )
-        .first()
-    )
-
-    if not member:
+    if not is_member:
         raise HTTPException(
             status_code=404, detail="Conversation not found or access denied"
         )
+    traffic_journal.http_message(
+        current_user.id, payload.conversation_id, payload.content
+    )
 
     try:
         # Create the message
-        msg_dict = create_message(
-            db, payload.conversation_id, current_user.id, payload.content
-        )
+        with tracer.span("create_message"):
+            msg_dict = await db_write.run(
+                create_message,
+                db,
+                payload.conversation_id,
+                current_user.id,
+                payload.content,
+            )
 
         # Convert created_at to string if it's datetime
         created_at = msg_dict["created_at"]
         if hasattr(created_at, "isoformat"):
             created_at = created_at.isoformat()
+            msg_dict["created_at"] = created_at
 
         # Send real-time notification to conversation members
-        message_event = {
-            "type": "new_message",
-            "message": {
-                "id": msg_dict["id"],
-                "conversation_id": msg_dict["conversation_id"],
-                "sender_id": msg_dict["sender_id"],
-                "sender_username": current_user.username,
-                "content": msg_dict["content"],
-                "created_at": created_at,
-            },
-        }
+        message_event = build_new_message_event(msg_dict, current_user.username)
 
         # Import and use the global WebSocket manager
         try:
@@ -134,12 +119,11 @@ async def send_message_to_conversation(
             await websocket_manager.send_to_conversation(
                 payload.conversation_id, message_event
             )
-            print(f"✅ Broadcasted message to conversation {payload.conversation_id}")
-        except Exception as e:
-            print(f"❌ WebSocket broadcast error: {e}")
-            import traceback
-
-            traceback.print_exc()
+        except Exception:
+            logger.exception(
+                "message broadcast failed",
+                extra={"conversation_id": payload.conversation_id},
+            )
 
         return MessageOut(
             id=msg_dict["id"],
@@ -149,8 +133,8 @@ async def send_message_to_conversation(
             content=msg_dict["content"],
             created_at=created_at,
         )
-    except Exception as e:
-        print(f"Error creating message: {e}")
+    except Exception:
+        logger.exception("create message failed")
         raise HTTPException(status_code=500, detail="Failed to create message")
 
 
@@ -167,10 +151,9 @@ def send_message(
     sender_id = int(sender.id) if hasattr(sender, "id") else int(sender.get("id"))
     receiver_id = int(payload.receiver_id)
 
-    conv = get_or_create_direct_conversation(db, sender_id, receiver_id)
-    msg = create_message(db, conv.id, sender_id, payload.content)
-    member_ids = get_conversation_member_ids(db, conv.id)
-    target_ids: Set[int] = set(member_ids)
+    conv_id = get_or_create_direct_conversation_id(db, sender_id, receiver_id)
+    msg = create_message(db, conv_id, sender_id, payload.content)
+    target_ids: Set[int] = membership_cache.member_ids(conv_id, db)
 
     # publish in background (do not block response)
     try:
@@ -4,15 +4,19 @@ from sqlalchemy.orm import Session
 
 from app.database.connection import get_db
 from app.auth.dependencies import get_current_user
+from app.auth.principal import Principal, principal_cache
+from app.auth.refresh_tokens import revoke_user_refresh_tokens
+from app.database import queries
 from app.database.models import User
 from app.schemas.user_schema import UserOut, UserProfileUpdate, UserPasswordUpdate
-from app.auth.hashing import hash_password, verify_password
+from app.auth.hash_service import hasher
+from app.utils.workload import db_read, db_write
 
 router = APIRouter()
 
 
 @router.get("/users/me", response_model=UserOut)
-def get_current_user_profile(current_user: User = Depends(get_current_user)):
+def get_current_user_profile(current_user: Principal = Depends(get_current_user)):
     """Get current user profile information"""
     return UserOut(
         id=current_user.id,
@@ -25,13 +29,16 @@ def get_current_user_profile(current_user: User = Depends(get_current_user)):
 @router.put("/users/me", response_model=UserOut)
 def update_user_profile(
     profile_data: UserProfileUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Any:
     """Update current user profile (username, email)"""
+    user = queries.user_by_id(db, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
     try:
         # Check if username already exists (if changed)
-        if profile_data.username and profile_data.username != current_user.username:
+        if profile_data.username and profile_data.username != user.username:
             existing_user = (
                 db.query(User)
                 .filter(
@@ -41,10 +48,10 @@ def update_user_profile(
             )
             if existing_user:
                 raise HTTPException(status_code=400, detail="Username already exists")
-            current_user.username = profile_data.username
+            user.username = profile_data.username
 
         # Check if email already exists (if changed)
-        if profile_data.email and profile_data.email != current_user.email:
+        if profile_data.email and profile_data.email != user.email:
             existing_user = (
                 db.query(User)
                 .filter(User.email == profile_data.email, User.id != current_user.id)
@@ -52,16 +59,17 @@ def update_user_profile(
             )
             if existing_user:
                 raise HTTPException(status_code=400, detail="Email already exists")
-            current_user.email = profile_data.email
+            user.email = profile_data.email
 
         db.commit()
-        db.refresh(current_user)
+        db.refresh(user)
+        principal_cache.invalidate(user.id)
 
         return UserOut(
-            id=current_user.id,
-            username=current_user.username,
-            email=current_user.email,
-            created_at=current_user.created_at,
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            created_at=user.created_at,
         )
 
     except Exception as e:
@@ -72,27 +80,29 @@ def update_user_profile(
 
 
 @router.put("/users/me/password")
-def update_user_password(
+async def update_user_password(
     password_data: UserPasswordUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Dict[str, str]:
     """Update current user password"""
-    try:
-        # Verify current password
-        if not verify_password(
-            password_data.current_password, current_user.password_hash
-        ):
-            raise HTTPException(status_code=400, detail="Current password is incorrect")
+    user = await db_read.run(queries.user_by_id, db, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    # outside the try: HashingOverloaded must reach its 503 + Retry-After handler
+    if not await hasher.verify(password_data.current_password, user.password_hash):
+        raise HTTPException(status_code=400, detail="Current password is incorrect")
+    new_hash = await hasher.hash(password_data.new_password)
 
-        # Update password
-        current_user.password_hash = hash_password(password_data.new_password)
-        db.commit()
+    try:
+        user.password_hash = new_hash
+        # sign out every other session along with the old password
+        await db_write.run(revoke_user_refresh_tokens, db, user.id)
+        await db_write.run(db.commit)
+        principal_cache.invalidate(user.id)
 
         return {"status": "success", "message": "Password updated successfully"}
 
-    except Exception as e:
-        db.rollback()
-        if isinstance(e, HTTPException):
-            raise e
+    except Exception:
+        await db_write.run(db.rollback)
         raise HTTPException(status_code=500, detail="Failed to update password")
@@ -25,3 +25,9 @@ class UserOut(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # access token lifetime, seconds
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
@@ -0,0 +1,146 @@
+"""
+Structured logging that stays off the hot path.
+
+`configure_logging()` gives the root logger a single queue handler: the
+calling thread only merges the message with its args and enqueues the record
+(`put_nowait`); JSON encoding, traceback formatting and the write to stdout
+happen on a background `QueueListener` thread. The queue is bounded: when a
+log storm outruns stdout, records are dropped and counted instead of
+blocking the event loop.
+
+Log with fields instead of f-strings, and guard anything costly to compute:
+
+    logger.info("ws connected", extra={"user_id": user_id})
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("fan-out", extra={"members": sorted(user_ids)})
+
+LOG_LEVEL (default INFO), LOG_FORMAT (json | text) and LOG_QUEUE_SIZE
+configure it.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import IO, Optional
+
+from app.utils.metrics import registry
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# LogRecord attributes; anything else on a record came from `extra=`
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = {
+            k: v
+            for k, v in vars(record).items()
+            if k not in _RESERVED and not k.startswith("_")
+        }
+        if extras:
+            line += " " + " ".join(f"{k}={v}" for k, v in extras.items())
+        return line
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller and leaves formatting to the listener."""
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # snapshot the message now (args may be mutated later); the formatter,
+        # exc_info included, runs on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    stream: Optional[IO[str]] = None,
+) -> NonBlockingQueueHandler:
+    """(Re)install the queue handler on the root logger; safe to call again."""
+    global _handler, _listener
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(
+        JsonFormatter() if (fmt or LOG_FORMAT) == "json" else _TextFormatter()
+    )
+    _handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    _listener = logging.handlers.QueueListener(
+        _handler.queue, output, respect_handler_level=True
+    )
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level or LOG_LEVEL)
+    return _handler
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and detach the handler."""
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+registry.callback_gauge(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full",
+    lambda: [((), dropped_records())],
+    kind="counter",
+)
+
+
+atexit.register(shutdown_logging)
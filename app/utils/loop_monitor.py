@@ -0,0 +1,170 @@
+"""
+Event loop lag sampling and blocking-call capture.
+
+Anything synchronous that runs on the event loop (a DB query, a big
+json.dumps, a CPU loop) stalls every socket and request on the worker for as
+long as it runs. `LoopMonitor` makes those stalls visible:
+
+- A sampler task sleeps LOOP_LAG_INTERVAL seconds at a time and records how
+  late each wake-up was into `event_loop_lag_seconds`. A healthy loop stays in
+  the lowest buckets; a blocking call shows up as one late wake-up as long as
+  the call.
+- With LOOP_DEBUG on (the default when ENVIRONMENT is development), a
+  watchdog thread notices when a wake-up is more than LOOP_BLOCK_THRESHOLD
+  seconds overdue and, while the loop is still stuck, captures the loop
+  thread's stack and the running task's name. That names the blocking call
+  itself, not just the fact of the stall. Captures are logged as
+  "event loop blocked" warnings and the last few are kept for
+  `/health/loop`.
+
+The watchdog reads another thread's frame through `sys._current_frames()`,
+which is cheap but not free, so it runs only in debug mode; the sampler is
+always on.
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Deque, Dict, Optional
+
+from app.utils.metrics import registry
+
+logger = logging.getLogger("chat.loop")
+
+ENVIRONMENT = os.getenv("ENVIRONMENT", "production").lower()
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+LOOP_DEBUG = os.getenv(
+    "LOOP_DEBUG", "true" if ENVIRONMENT == "development" else "false"
+).lower() in ("1", "true", "yes")
+
+LAG_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+loop_lag = registry.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop woke the lag sampler",
+    buckets=LAG_BUCKETS,
+)
+loop_blocks = registry.counter(
+    "event_loop_blocked_total",
+    "Stalls longer than LOOP_BLOCK_THRESHOLD caught by the debug watchdog",
+)
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        interval: float = LOOP_LAG_INTERVAL,
+        threshold: float = LOOP_BLOCK_THRESHOLD,
+        debug: bool = LOOP_DEBUG,
+        keep: int = 20,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        self.max_lag_seconds = 0.0
+        self.blocks: Deque[Dict[str, Any]] = collections.deque(maxlen=keep)
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        # perf_counter time the sampler is due to wake up; read by the watchdog
+        self._due = 0.0
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start sampling the running loop (and the watchdog, in debug mode)."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._due = time.perf_counter() + self.interval
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._sample(), name="loop-lag-sampler")
+        if self.debug:
+            self._watchdog = threading.Thread(
+                target=self._watch, name="loop-watchdog", daemon=True
+            )
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _sample(self) -> None:
+        interval = self.interval
+        while True:
+            self._due = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - self._due)
+            loop_lag.observe(lag)
+            if lag > self.max_lag_seconds:
+                self.max_lag_seconds = lag
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopped.wait(self.threshold / 2):
+            due = self._due
+            overdue = time.perf_counter() - due
+            if overdue > self.threshold and due != reported:
+                reported = due  # one capture per stall
+                self._capture(overdue)
+
+    def _capture(self, overdue: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = "".join(traceback.format_stack(frame))
+        task = asyncio.current_task(self._loop)
+        block = {
+            "at": time.time(),
+            "blocked_seconds": round(overdue, 3),
+            "task": task.get_name() if task is not None else None,
+            "stack": stack,
+        }
+        self.blocks.append(block)
+        loop_blocks.inc()
+        logger.warning("event loop blocked", extra=block)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "debug": self.debug,
+            "samples": loop_lag.count(),
+            "max_lag_seconds": round(self.max_lag_seconds, 4),
+            "blocked": int(loop_blocks.value()),
+            "recent_blocks": list(self.blocks),
+        }
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,257 @@
+"""
+Minimal Prometheus-style metrics (text exposition format 0.0.4).
+
+Counters, gauges and histograms live in one process-wide `registry` and are
+rendered by `/metrics`. Each metric declares its label names up front and
+caps the number of label combinations it will track (`max_series`); anything
+past the cap is folded into a single series whose labels are all
+"__overflow__", so a bug that labels by user id cannot grow memory without
+bound. Label values must come from small fixed sets (route templates, status
+classes, pool names), never from request data.
+
+Point-in-time values (open sockets, pool checkouts, queue depths) are
+`CallbackGauge`s, read at scrape time instead of being updated on the hot path.
+
+Metrics are per worker process; scrape every worker or aggregate upstream.
+"""
+
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_OVERFLOW = "__overflow__"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        max_series: int = 200,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str], series: dict) -> LabelValues:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        if key not in series and len(series) >= self.max_series:
+            return (_OVERFLOW,) * len(self.labelnames)
+        return key
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        with self._lock:
+            key = self._key(labels, self._values)
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(
+            tuple(str(labels.get(n, "")) for n in self.labelnames), 0.0
+        )
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels, self._values)] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class CallbackGauge(_Metric):
+    """
+    Samples come from `fn()` at scrape time: [(label_values, value)]. Pass
+    kind="counter" to export a component's own monotonic counters as-is.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        fn: Callable[[], Iterable[Tuple[LabelValues, float]]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._fn = fn
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in list(self._fn())[: self.max_series]:
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        max_series: int = 200,
+    ):
+        super().__init__(name, documentation, labelnames, max_series)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            key = self._key(labels, self._series)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(
+            tuple(str(labels.get(n, "")) for n in self.labelnames)
+        )
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = [(k, list(c), s[0]) for k, (c, s) in self._series.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} "
+                    f"{cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=(), **kw) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, **kw))
+
+    def gauge(self, name: str, documentation: str, labelnames=(), **kw) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, **kw))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), **kw
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kw))
+
+    def callback_gauge(
+        self,
+        name: str,
+        documentation: str,
+        fn: Callable[[], Iterable[Tuple[LabelValues, float]]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, fn, labelnames, kind))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # one broken collector must not take the whole scrape down
+                lines.append(f"# {metric.name} collection failed")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -1,6 +1,9 @@
+import logging
 from typing import Any
 
+logger = logging.getLogger("chat.notifications")
+
 
 def send_notification(user_id: int, event: str, payload: Any):
     # placeholder: in a real app, you'd publish to websocket manager or push service
-    print(f"Notify {user_id}: {event} -> {payload}")
+    logger.debug("notify", extra={"user_id": user_id, "event": event})
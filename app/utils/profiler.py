@@ -0,0 +1,124 @@
+"""
+In-process sampling profiler for live workers.
+
+`SamplingProfiler.run(seconds)` starts a daemon thread that, every
+`1 / hz` seconds, reads every other thread's current frame with
+`sys._current_frames()` and counts the stack. Nothing is traced or hooked, so
+the profiled code runs at full speed; the cost is the sampler thread taking
+the GIL for a few microseconds per thread per sample (about 1% at the default
+100 Hz). Only one profile runs per process at a time. A sample is taken
+when the sampler gets the GIL, i.e. when the other threads release it: in
+blocking calls, or every `sys.getswitchinterval()` (5 ms) of pure Python.
+
+The result is in the collapsed-stack format that flamegraph.pl, speedscope
+and inferno read, one line per distinct stack, root first:
+
+    thread:MainThread;task:Task-42;app.websocket_manager:SimpleWebSocketManager.send_to_user;json:dumps 87
+
+Frames are `module:qualname`, so time lands on `send_to_user`, `json`,
+`sqlalchemy.*` or `argon2.*` directly. Samples of the event loop thread carry
+the running asyncio task's name after the thread name; samples with no task
+running are the loop itself (selector waits, callbacks) and worker threads
+(the DB and crypto budgets) appear under their own thread names. Argon2
+hashes done in the HASH_WORKERS process pool are outside this process and
+show up only as the waiting thread.
+"""
+
+import asyncio
+import collections
+import sys
+import threading
+import time
+from typing import Counter, List, Optional
+
+MAX_DEPTH = 128
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}"
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def run(self, seconds: float, hz: float = 100.0) -> "Profile":
+        """Sample all threads for `seconds`; raises ProfilerBusy if one is running."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("a profile is already running")
+        try:
+            profile = Profile(asyncio.get_running_loop(), threading.get_ident(), hz)
+            sampler = threading.Thread(
+                target=profile.sample, name="profiler", daemon=True
+            )
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.stop()
+                # joining takes at most one sampling interval
+                sampler.join()
+            return profile
+        finally:
+            self._lock.release()
+
+
+class Profile:
+    def __init__(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int, hz: float):
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.interval = 1.0 / hz
+        self.stacks: Counter[str] = collections.Counter()
+        self.samples = 0
+        self.seconds = 0.0
+        self._stopped = threading.Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def sample(self) -> None:
+        own = threading.get_ident()
+        start = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            # read the task first: the loop may switch tasks while we walk frames
+            task = _task_label(self.loop)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                root = [f"thread:{names.get(thread_id, thread_id)}"]
+                if thread_id == self.loop_thread_id and task:
+                    root.append(task)
+                self.stacks[_collapse(root, frame)] += 1
+            self.samples += 1
+        self.seconds = time.perf_counter() - start
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def _collapse(root: List[str], frame) -> str:
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(root + labels[::-1])
+
+
+def _task_label(loop: asyncio.AbstractEventLoop) -> Optional[str]:
+    task = asyncio.current_task(loop)
+    return f"task:{task.get_name()}" if task is not None else None
+
+
+profiler = SamplingProfiler()
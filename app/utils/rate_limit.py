@@ -0,0 +1,209 @@
+"""
+Token-bucket rate limiting for the credential endpoints.
+
+Every login or registration attempt can cost an Argon2 hash, so a
+credential-stuffing burst is a CPU attack. `RateLimiter.hit(key)` takes one
+token from the key's bucket (refilled at `per_minute`, holding at most
+`burst`) and says whether the attempt may proceed; callers check it before
+touching the database or the hasher and answer 429 otherwise.
+
+Buckets live in process memory by default. RATE_LIMIT_BACKEND=redis shares
+them between workers through an atomic Lua script on REDIS_URL; if Redis is
+unreachable the limiter falls back to the local buckets rather than failing
+open or closed.
+"""
+
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.cache import LRUCache
+from app.utils.metrics import registry
+
+try:
+    import redis.asyncio as redis_async
+except Exception:
+    redis_async = None
+
+logger = logging.getLogger("chat.rate_limit")
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# only honour X-Forwarded-For behind a proxy you control (Render, nginx)
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+
+def take_token(
+    tokens: float, updated: float, now: float, burst: int, rate: float
+) -> Tuple[float, bool, float]:
+    """
+    Refill a bucket up to `burst` at `rate` tokens/second and try to take one.
+    Returns (tokens_left, allowed, retry_after_seconds).
+    """
+    tokens = min(float(burst), tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1.0:
+        return tokens - 1.0, True, 0.0
+    return tokens, False, (1.0 - tokens) / rate
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        # an idle bucket is full again after burst/rate seconds, so evicting
+        # it then (or under LRU pressure) loses nothing worth keeping
+        self._buckets = LRUCache(maxsize=max_keys)
+
+    async def take(self, key: str, burst: int, rate: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(burst), now))
+        tokens, allowed, retry_after = take_token(tokens, updated, now, burst, rate)
+        self._buckets.set(key, (tokens, now), ttl=burst / rate)
+        return allowed, retry_after
+
+    def clear(self):
+        self._buckets.clear()
+
+
+_TAKE_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBuckets:
+    def __init__(self, url: Optional[str], fallback: MemoryBuckets):
+        self._url = url
+        self._fallback = fallback
+        self._redis = None
+        self._script = None
+        self._retry_at = 0.0
+
+    async def take(self, key: str, burst: int, rate: float) -> Tuple[bool, float]:
+        if time.monotonic() < self._retry_at:
+            return await self._fallback.take(key, burst, rate)
+        try:
+            if self._script is None:
+                self._redis = redis_async.from_url(self._url, decode_responses=True)
+                self._script = self._redis.register_script(_TAKE_SCRIPT)
+            allowed, retry_after = await self._script(
+                keys=[f"ratelimit:{key}"], args=[burst, rate, time.time()]
+            )
+            return bool(int(allowed)), float(retry_after)
+        except Exception:
+            logger.warning("redis rate limit unavailable; using local buckets")
+            self._script = None
+            # don't pay a connect timeout on every attempt while Redis is down
+            self._retry_at = time.monotonic() + 5.0
+            return await self._fallback.take(key, burst, rate)
+
+    def clear(self):
+        self._fallback.clear()
+
+
+def _make_store():
+    memory = MemoryBuckets()
+    if RATE_LIMIT_BACKEND == "redis":
+        if redis_async is None or not os.getenv("REDIS_URL"):
+            logger.warning("RATE_LIMIT_BACKEND=redis but Redis is unavailable")
+            return memory
+        return RedisBuckets(os.getenv("REDIS_URL"), memory)
+    return memory
+
+
+store = _make_store()
+
+
+class RateLimiter:
+    def __init__(self, name: str, burst: int, per_minute: float):
+        self.name = name
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def hit(self, key: str) -> Tuple[bool, float]:
+        """Spend one attempt for `key`; returns (allowed, retry_after_seconds)."""
+        allowed, retry_after = await store.take(
+            f"{self.name}:{key}", self.burst, self.rate
+        )
+        if allowed:
+            self.admitted += 1
+        else:
+            self.rejected += 1
+        return allowed, retry_after
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "burst": self.burst,
+            "per_minute": round(self.rate * 60, 3),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+def _limiter(name: str, burst: str, per_minute: str) -> RateLimiter:
+    prefix = name.upper()
+    return RateLimiter(
+        name,
+        int(os.getenv(f"{prefix}_BURST", burst)),
+        float(os.getenv(f"{prefix}_PER_MINUTE", per_minute)),
+    )
+
+
+login_ip = _limiter("login_ip", "20", "10")
+login_user = _limiter("login_user", "5", "5")
+register_ip = _limiter("register_ip", "5", "2")
+
+limiters = {lim.name: lim for lim in (login_ip, login_user, register_ip)}
+
+
+def client_ip(request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: lim.stats() for name, lim in limiters.items()}
+
+
+registry.callback_gauge(
+    "rate_limit_attempts_total",
+    "Credential attempts by limiter and outcome",
+    lambda: [
+        ((name, outcome), s[outcome])
+        for name, s in rate_limit_stats().items()
+        for outcome in ("admitted", "rejected")
+    ],
+    ("limiter", "outcome"),
+    kind="counter",
+)
+
+
+def reset() -> None:
+    store.clear()
+    for lim in limiters.values():
+        lim.admitted = 0
+        lim.rejected = 0
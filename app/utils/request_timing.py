@@ -0,0 +1,201 @@
+"""
+Per-request timing: latency histogram, `Server-Timing` header and query budgets.
+
+`RequestTimingMiddleware` times every HTTP request into
+`http_request_duration_seconds{method, route, status}`. `route` is the
+matched route template ("/messages/{conversation_id}"), never the raw path,
+so ids in URLs do not create new series; requests that match no route (static
+files, 404s) share the "unmatched" label. `status` is the status class
+("2xx", "4xx", ...). WebSocket and lifespan scopes pass straight through.
+
+It also puts a `RequestTiming` in a context variable for the duration of the
+request. The engine hooks in `app.database.connection` add every query and
+every pool checkout to it (worker threads inherit the context, so sync
+endpoints and `db_read.run` calls are counted too), `TimedJSONResponse` adds
+the time spent encoding the body, and the response carries
+
+    Server-Timing: db;dur=4.1;desc="3 queries", pool;dur=0.2, serialize;dur=0.3, app;dur=9.8
+
+Endpoints declare how many queries they may issue with `@query_budget(n)`.
+With QUERY_BUDGET_ENFORCE on (the default when ENVIRONMENT is development or
+test) a request over budget is answered with a 500 naming the route, so an
+N+1 loop fails the test that exercises it; otherwise it is logged and counted.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Optional, TypeVar
+
+from fastapi.responses import JSONResponse
+
+from app.utils.metrics import registry
+
+logger = logging.getLogger("chat.request_timing")
+
+ENVIRONMENT = os.getenv("ENVIRONMENT", "production").lower()
+QUERY_BUDGET_ENFORCE = os.getenv(
+    "QUERY_BUDGET_ENFORCE",
+    "true" if ENVIRONMENT in ("development", "test") else "false",
+).lower() in ("1", "true", "yes")
+
+_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status class",
+    ("method", "route", "status"),
+)
+requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"
+)
+budget_exceeded = registry.counter(
+    "http_query_budget_exceeded_total",
+    "Requests that issued more queries than their route's budget",
+    ("route",),
+    max_series=100,
+)
+
+
+class RequestTiming:
+    __slots__ = ("queries", "db_seconds", "pool_wait_seconds", "serialize_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+    def server_timing(self, total_seconds: float) -> str:
+        return (
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries", '
+            f"pool;dur={self.pool_wait_seconds * 1000:.1f}, "
+            f"serialize;dur={self.serialize_seconds * 1000:.1f}, "
+            f"app;dur={total_seconds * 1000:.1f}"
+        )
+
+
+current_timing: contextvars.ContextVar[Optional[RequestTiming]] = (
+    contextvars.ContextVar("request_timing", default=None)
+)
+
+
+def query_budget(limit: int) -> Callable[[F], F]:
+    """Declare the most queries one call of this endpoint may issue."""
+
+    def decorate(endpoint: F) -> F:
+        endpoint.__query_budget__ = limit
+        return endpoint
+
+    return decorate
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _budget_of(scope) -> Optional[int]:
+    endpoint = getattr(scope.get("route"), "endpoint", None)
+    return getattr(endpoint, "__query_budget__", None)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that charges body encoding to the request's serialize time."""
+
+    def render(self, content: Any) -> bytes:
+        start = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            timing = current_timing.get()
+            if timing is not None:
+                timing.serialize_seconds += time.perf_counter() - start
+
+
+class RequestTimingMiddleware:
+    def __init__(self, app, enforce_budgets: Optional[bool] = None):
+        self.app = app
+        self.enforce_budgets = (
+            QUERY_BUDGET_ENFORCE if enforce_budgets is None else enforce_budgets
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        replaced = False
+        start = time.perf_counter()
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+
+        async def send_wrapper(message):
+            nonlocal status, replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                budget = _budget_of(scope)
+                if budget is not None and timing.queries > budget:
+                    replaced = await self._over_budget(scope, send, timing, budget)
+                    if replaced:
+                        status = 500
+                        return
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (b"server-timing", timing.server_timing(elapsed).encode("latin-1"))
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_timing.reset(token)
+            requests_in_flight.dec()
+            method = scope["method"] if scope["method"] in _METHODS else "OTHER"
+            request_duration.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=route_label(scope),
+                status=f"{status // 100}xx",
+            )
+
+    async def _over_budget(self, scope, send, timing: RequestTiming, budget: int):
+        """Record a budget overrun; in enforce mode answer 500 instead."""
+        route = route_label(scope)
+        budget_exceeded.inc(route=route)
+        logger.warning(
+            "query budget exceeded",
+            extra={"route": route, "queries": timing.queries, "budget": budget},
+        )
+        if not self.enforce_budgets:
+            return False
+        body = json.dumps(
+            {
+                "detail": (
+                    f"Query budget exceeded on {scope['method']} {route}: "
+                    f"{timing.queries} queries, budget {budget}"
+                )
+            }
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+        return True
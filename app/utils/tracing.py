@@ -0,0 +1,421 @@
+"""
+Lightweight span tracing along a message's path.
+
+A trace starts at the HTTP request (`TracingMiddleware`, added only when
+TRACE_EXPORTER is set) and follows the work it causes: the membership check,
+`create_message` and every query it issues (the engine hooks in
+`app.database.connection`), the WebSocket fan-out, and Redis pub/sub. The
+publisher puts the W3C `traceparent` of its span in the pub/sub envelope,
+and the worker that receives the event continues the same trace, so one
+trace shows where delivery latency went on both sides.
+
+    with tracer.span("membership.check", conversation_id=cid):
+        ...
+
+`tracer.span()` opens a child of the current span, kept in a context
+variable, so spans follow the request into tasks and worker threads. Outside
+a sampled trace it returns a shared no-op, which is the only cost on
+untraced requests.
+
+Sampling is decided once per trace from its id (like OpenTelemetry's
+TraceIdRatioBased): TRACE_SAMPLE_RATE of new traces are recorded (default 1.0
+in development, 0.01 elsewhere). A request carrying a `traceparent` header
+follows the caller's sampled flag instead.
+
+Finished spans are queued and written by a background thread, batched, as
+OTLP/JSON lines (`{"resourceSpans": [...]}`), the format the OpenTelemetry
+Collector's `otlpjsonfile` receiver reads. TRACE_EXPORTER is `stdout` or
+`file` (to TRACE_FILE, where "{pid}" becomes the worker's process id). When
+the queue is full spans are dropped and counted.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+from typing import IO, Any, Dict, List, Optional
+
+from app.utils.metrics import registry
+
+logger = logging.getLogger("chat.tracing")
+
+ENVIRONMENT = os.getenv("ENVIRONMENT", "production").lower()
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces-{pid}.jsonl")
+TRACE_SAMPLE_RATE = float(
+    os.getenv("TRACE_SAMPLE_RATE", "1.0" if ENVIRONMENT == "development" else "0.01")
+)
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "20000"))
+SERVICE_NAME = os.getenv("SERVICE_NAME", "chat_real_time")
+
+# OTLP span kinds and status codes
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT, KIND_PRODUCER, KIND_CONSUMER = 1, 2, 3, 4, 5
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_BATCH_SIZE = 512
+_FLUSH_SECONDS = 1.0
+
+spans_total = registry.counter(
+    "trace_spans_total",
+    "Finished spans by outcome (exported, or dropped on a full queue)",
+    ("outcome",),
+    max_series=4,
+)
+
+
+def _attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    __slots__ = (
+        "tracer",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "kind",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "status",
+        "_token",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        trace_id: str,
+        parent_id: Optional[str],
+        name: str,
+        kind: int = KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        start_ns: Optional[int] = None,
+    ):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.status = STATUS_UNSET
+        self._token = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, exc: Optional[BaseException] = None) -> None:
+        self.status = STATUS_ERROR
+        if exc is not None:
+            self.attributes["exception.type"] = type(exc).__name__
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        if not self.end_ns:
+            self.end_ns = end_ns or time.time_ns()
+            self.tracer._export(self)
+
+    # scope: make this the current span for the `with` block
+    def __enter__(self) -> "Span":
+        self._token = current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        current_span.reset(self._token)
+        if exc is not None:
+            self.set_error(exc)
+        self.end()
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Stands in for a span when the request is not traced."""
+
+    __slots__ = ()
+    traceparent = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, exc: Optional[BaseException] = None) -> None:
+        pass
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def parse_traceparent(value: Optional[str]):
+    """(trace id, parent span id, sampled) from a W3C traceparent, or None."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], sampled
+
+
+class Tracer:
+    def __init__(
+        self,
+        exporter: str = TRACE_EXPORTER,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        path: str = TRACE_FILE,
+        queue_size: int = TRACE_QUEUE_SIZE,
+    ):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.path = path
+        self.queue_size = queue_size
+        self.enabled = False
+        self.exported = 0
+        self.dropped = 0
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._resource: Dict[str, Any] = {}
+
+    @property
+    def configured(self) -> bool:
+        return self.exporter in ("stdout", "file")
+
+    def start(self) -> None:
+        if self.enabled or not self.configured:
+            return
+        if self.exporter == "file":
+            path = self.path.replace("{pid}", str(os.getpid()))
+            out = open(path, "a", encoding="utf-8")
+        else:
+            out = sys.stdout
+        self._resource = {
+            "attributes": [
+                _attribute("service.name", SERVICE_NAME),
+                _attribute("host.name", socket.gethostname()),
+                _attribute("process.pid", os.getpid()),
+            ]
+        }
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._thread = threading.Thread(
+            target=self._drain, args=(out,), name="trace-exporter", daemon=True
+        )
+        self._thread.start()
+        self.enabled = True
+        logger.info(
+            "tracing enabled",
+            extra={"exporter": self.exporter, "sample_rate": self.sample_rate},
+        )
+
+    def stop(self) -> None:
+        """Export what is queued and close the output."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    # ---- creating spans ----
+    def _sampled(self, trace_id: str) -> bool:
+        # the low 64 bits of a random trace id are uniform
+        return int(trace_id[16:], 16) < self.sample_rate * 2**64
+
+    def start_trace(
+        self,
+        name: str,
+        traceparent: Optional[str] = None,
+        kind: int = KIND_SERVER,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        A root span (or the continuation of a remote parent) if this trace is
+        sampled, else NOOP_SPAN. Use it as a context manager to make it current.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = self._sampled(trace_id)
+        if not sampled:
+            return NOOP_SPAN
+        return Span(self, trace_id, parent_id, name, kind, attributes)
+
+    def span(self, name: str, kind: int = KIND_INTERNAL, **attributes: Any):
+        """Child of the current span, or NOOP_SPAN when nothing is being traced."""
+        parent = current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(self, parent.trace_id, parent.span_id, name, kind, attributes)
+
+    def record(
+        self, name: str, seconds: float, kind: int = KIND_INTERNAL, **attributes: Any
+    ) -> None:
+        """Add an already finished child span that took `seconds`, ending now."""
+        parent = current_span.get()
+        if parent is None:
+            return
+        end_ns = time.time_ns()
+        span = Span(
+            self,
+            parent.trace_id,
+            parent.span_id,
+            name,
+            kind,
+            attributes,
+            start_ns=end_ns - int(seconds * 1e9),
+        )
+        span.end(end_ns)
+
+    # ---- export ----
+    def _export(self, span: Span) -> None:
+        if not self.enabled:
+            return
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+            spans_total.inc(outcome="dropped")
+
+    def _drain(self, out: IO[str]) -> None:
+        get = self._queue.get
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + _FLUSH_SECONDS
+            while len(batch) < _BATCH_SIZE:
+                try:
+                    item = get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                self._write(out, batch)
+        if out is not sys.stdout:
+            out.close()
+
+    def _write(self, out: IO[str], batch: List[Span]) -> None:
+        try:
+            line = json.dumps(
+                {
+                    "resourceSpans": [
+                        {
+                            "resource": self._resource,
+                            "scopeSpans": [
+                                {
+                                    "scope": {"name": "chat"},
+                                    "spans": [span.to_otlp() for span in batch],
+                                }
+                            ],
+                        }
+                    ]
+                },
+                separators=(",", ":"),
+                default=str,
+            )
+            out.write(line + "\n")
+            out.flush()
+        except Exception:
+            logger.exception("trace export failed", extra={"spans": len(batch)})
+            return
+        self.exported += len(batch)
+        spans_total.inc(len(batch), outcome="exported")
+
+
+tracer = Tracer()
+
+
+class TracingMiddleware:
+    """Opens a server span per HTTP request, named by method and route template."""
+
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+        traceparent = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        span = self.tracer.start_trace(
+            scope["method"],
+            traceparent,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        )
+        if span is NOOP_SPAN:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.status = STATUS_ERROR
+            await send(message)
+
+        with span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.name = f"{scope['method']} {route}"
+                    span.set_attribute("http.route", route)
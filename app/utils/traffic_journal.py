@@ -0,0 +1,239 @@
+"""
+Optional recording of inbound chat traffic for replay.
+
+With TRAFFIC_JOURNAL_PATH set, every inbound WebSocket message that passes
+the size/rate limits and every authorized `POST /messages` is appended, with
+its arrival time, to a journal that `benchmarks/replay_traffic.py` can
+re-drive against a local instance. On the request path recording is one
+`time.time()` and a `put_nowait`; scrubbing, encoding and the write happen
+on a background thread, and when the bounded queue is full records are
+dropped and counted rather than waiting. Frames that are not valid JSON are
+ignored by the server and not recorded.
+
+The journal is append-only NDJSON. The first line of each recording is a
+header, every other line a compact array whose first element is the
+milliseconds since that header's `start`:
+
+    {"journal": 1, "start": 1714564800.123, "pid": 4242, "scrubbed": true}
+    [0, "o", 1, 17]                 socket 1 opened by user 17
+    [12, "f", 1, "{\\"type\\": \\"join_conversation\\", \\"conversation_id\\": 5}"]
+    [40, "m", 17, 5, "lorem ipsum"] POST /messages by user 17 to conversation 5
+    [95, "c", 1]                    socket 1 closed
+
+Message content is scrubbed before it reaches the disk unless
+TRAFFIC_JOURNAL_SCRUB is off: text is replaced by filler of the same length,
+so payload sizes (and roughly their compressibility) survive but the words
+do not. `scrub_journal()` does the same to a journal recorded unscrubbed.
+Access tokens are never written; the replay tool mints its own for the
+recorded user ids.
+
+A "{pid}" in the path is replaced by the process id, so each uvicorn worker
+writes its own file; the replay tool merges them by wall-clock time.
+"""
+
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import IO, Iterable, Iterator, Optional, Tuple
+
+from app.utils.metrics import registry
+
+logger = logging.getLogger("chat.traffic_journal")
+
+TRAFFIC_JOURNAL_PATH = os.getenv("TRAFFIC_JOURNAL_PATH", "")
+TRAFFIC_JOURNAL_SCRUB = os.getenv("TRAFFIC_JOURNAL_SCRUB", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+TRAFFIC_JOURNAL_QUEUE_SIZE = int(os.getenv("TRAFFIC_JOURNAL_QUEUE_SIZE", "50000"))
+
+JOURNAL_VERSION = 1
+
+OPEN, FRAME, CLOSE, MESSAGE = "o", "f", "c", "m"
+
+_FILLER = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua ut enim ad minim veniam "
+    "quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo "
+)
+
+
+def scrub_text(text: str) -> str:
+    """Filler of the same length as `text`."""
+    n = len(text)
+    return (_FILLER * (n // len(_FILLER) + 1))[:n]
+
+
+def scrub_frame(frame: str) -> str:
+    """Scrub the `content` of a JSON frame; a frame that is not JSON is all content."""
+    try:
+        data = json.loads(frame)
+    except ValueError:
+        return scrub_text(frame)
+    if isinstance(data, dict) and isinstance(data.get("content"), str):
+        data["content"] = scrub_text(data["content"])
+        return json.dumps(data)
+    return frame
+
+
+def scrub_record(record: list) -> list:
+    if record[1] == FRAME:
+        record[3] = scrub_frame(record[3])
+    elif record[1] == MESSAGE:
+        record[4] = scrub_text(record[4])
+    return record
+
+
+class TrafficJournal:
+    def __init__(
+        self,
+        path: str = TRAFFIC_JOURNAL_PATH,
+        scrub: bool = TRAFFIC_JOURNAL_SCRUB,
+        queue_size: int = TRAFFIC_JOURNAL_QUEUE_SIZE,
+    ):
+        self.path = path
+        self.scrub = scrub
+        self.queue_size = queue_size
+        self.enabled = False
+        self.written = 0
+        self.dropped = 0
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ids = itertools.count(1)
+
+    def start(self) -> None:
+        if self.enabled or not self.path:
+            return
+        path = self.path.replace("{pid}", str(os.getpid()))
+        # open on the caller so a bad path fails loudly at startup
+        fh = open(path, "a", encoding="utf-8")
+        start = time.time()
+        fh.write(
+            json.dumps(
+                {
+                    "journal": JOURNAL_VERSION,
+                    "start": start,
+                    "pid": os.getpid(),
+                    "scrubbed": self.scrub,
+                }
+            )
+            + "\n"
+        )
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._thread = threading.Thread(
+            target=self._drain, args=(fh, start), name="traffic-journal", daemon=True
+        )
+        self._thread.start()
+        self.enabled = True
+        logger.info("traffic journal recording", extra={"path": path})
+
+    def stop(self) -> None:
+        """Write out what is queued and close the file."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    # ---- recording (event loop side) ----
+    def _put(self, record: tuple) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def ws_open(self, user_id: int) -> int:
+        """Record a new socket; returns the id to pass to ws_frame/ws_close."""
+        conn_id = next(self._ids)
+        if self.enabled:
+            self._put((time.time(), OPEN, conn_id, user_id))
+        return conn_id
+
+    def ws_frame(self, conn_id: int, frame: str) -> None:
+        if self.enabled:
+            self._put((time.time(), FRAME, conn_id, frame))
+
+    def ws_close(self, conn_id: int) -> None:
+        if self.enabled:
+            self._put((time.time(), CLOSE, conn_id))
+
+    def http_message(
+        self, user_id: int, conversation_id: Optional[int], content: str
+    ) -> None:
+        if self.enabled:
+            self._put((time.time(), MESSAGE, user_id, conversation_id, content))
+
+    # ---- writer thread ----
+    def _drain(self, fh: IO[str], start: float) -> None:
+        get = self._queue.get
+        try:
+            while True:
+                item = get()
+                if item is None:
+                    break
+                record = [int((item[0] - start) * 1000), *item[1:]]
+                if self.scrub:
+                    scrub_record(record)
+                fh.write(json.dumps(record, separators=(",", ":")) + "\n")
+                self.written += 1
+                if self._queue.empty():
+                    fh.flush()
+        except Exception:
+            logger.exception("traffic journal writer failed; recording stopped")
+            self.enabled = False
+        finally:
+            fh.close()
+
+
+traffic_journal = TrafficJournal()
+
+registry.callback_gauge(
+    "traffic_journal_records_total",
+    "Traffic journal records written, or dropped because its queue was full",
+    lambda: [
+        (("written",), traffic_journal.written),
+        (("dropped",), traffic_journal.dropped),
+    ],
+    ("outcome",),
+    kind="counter",
+)
+
+
+# ---- reading ----
+def read_journal(fh: Iterable[str]) -> Iterator[Tuple[dict, float, list]]:
+    """Yield (header, absolute time, record) for every record in a journal file."""
+    header = None
+    for line in fh:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if isinstance(item, dict):
+            if item.get("journal") != JOURNAL_VERSION:
+                raise ValueError(f"unsupported journal version {item.get('journal')}")
+            header = item
+            continue
+        if header is None:
+            raise ValueError("journal record before any header line")
+        yield header, header["start"] + item[0] / 1000, item
+
+
+def scrub_journal(src: Iterable[str], dst: IO[str]) -> int:
+    """Copy a journal with all message content scrubbed; returns records copied."""
+    count = 0
+    for line in src:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if isinstance(item, dict):
+            item["scrubbed"] = True
+            dst.write(json.dumps(item) + "\n")
+            continue
+        dst.write(json.dumps(scrub_record(item), separators=(",", ":")) + "\n")
+        count += 1
+    return count
@@ -0,0 +1,123 @@
+"""
+Separate thread budgets per workload class.
+
+Sync routers and `run_in_threadpool` all share AnyIO's default 40-token
+limiter, so a burst of Argon2 logins can occupy every slot and stall history
+reads and message writes. Each `WorkloadPool` owns its own capacity limiter:
+work for one class queues behind its own budget only.
+
+    user = await db_read.run(load_user, db, user_id)
+    token = await crypto.run(create_access_token, payload)
+
+Budgets come from DB_READ_CONCURRENCY, DB_WRITE_CONCURRENCY and
+CRYPTO_CONCURRENCY. Keep db_read + db_write at or below the SQLAlchemy pool
+size (5 + 10 overflow by default) or threads will queue on pool checkout.
+"""
+
+import functools
+import math
+import os
+import time
+from typing import Any, Callable, Dict, TypeVar
+
+import anyio
+import anyio.to_thread
+
+from app.utils.metrics import registry
+
+T = TypeVar("T")
+
+DB_READ_CONCURRENCY = int(os.getenv("DB_READ_CONCURRENCY", "10"))
+DB_WRITE_CONCURRENCY = int(os.getenv("DB_WRITE_CONCURRENCY", "5"))
+CRYPTO_CONCURRENCY = int(os.getenv("CRYPTO_CONCURRENCY", str(os.cpu_count() or 2)))
+# size of AnyIO's default limiter, still used by plain sync `def` endpoints
+THREADPOOL_TOKENS = int(os.getenv("THREADPOOL_TOKENS", "40"))
+
+# threads are admitted by the pool's own limiter, not AnyIO's default one
+_UNBOUNDED = anyio.CapacityLimiter(math.inf)
+
+
+class WorkloadPool:
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self._limiter = anyio.CapacityLimiter(capacity)
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking callable in a worker thread once a slot is free."""
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await self._limiter.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - start
+        self.wait_seconds_total += waited
+        if waited > self.wait_seconds_max:
+            self.wait_seconds_max = waited
+
+        self.in_flight += 1
+        try:
+            return await anyio.to_thread.run_sync(
+                functools.partial(fn, *args, **kwargs), limiter=_UNBOUNDED
+            )
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._limiter.release()
+
+    def stats(self) -> Dict[str, Any]:
+        started = self.completed + self.in_flight
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "completed": self.completed,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "wait_seconds_avg": (
+                round(self.wait_seconds_total / started, 6) if started else 0.0
+            ),
+        }
+
+
+db_read = WorkloadPool("db_read", DB_READ_CONCURRENCY)
+db_write = WorkloadPool("db_write", DB_WRITE_CONCURRENCY)
+crypto = WorkloadPool("crypto", CRYPTO_CONCURRENCY)
+
+pools = {p.name: p for p in (db_read, db_write, crypto)}
+
+
+def configure_default_threadpool() -> None:
+    """Apply THREADPOOL_TOKENS to AnyIO's default limiter (call inside the loop)."""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_TOKENS
+
+
+def workload_stats() -> Dict[str, Dict[str, Any]]:
+    stats = {name: pool.stats() for name, pool in pools.items()}
+    default = anyio.to_thread.current_default_thread_limiter()
+    stats["default"] = {
+        "capacity": default.total_tokens,
+        "in_flight": default.borrowed_tokens,
+        "queue_depth": default.statistics().tasks_waiting,
+    }
+    return stats
+
+
+registry.callback_gauge(
+    "workload_queue_depth",
+    "Calls waiting for a slot in each thread budget",
+    lambda: [((name,), s["queue_depth"]) for name, s in workload_stats().items()],
+    ("pool",),
+)
+registry.callback_gauge(
+    "workload_in_flight",
+    "Calls running in each thread budget",
+    lambda: [((name,), s["in_flight"]) for name, s in workload_stats().items()],
+    ("pool",),
+)
@@ -1,5 +1,8 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 import json
+import logging
+
+logger = logging.getLogger("chat.ws_test")
 
 router = APIRouter()
 
@@ -9,16 +12,13 @@ async def websocket_test(websocket: WebSocket):
     """
     Simple WebSocket test endpoint
     """
-    print("WebSocket test connection attempt")
     await websocket.accept()
-    print("WebSocket test connection accepted")
     try:
         while True:
             data = await websocket.receive_text()
-            print(f"Received: {data}")
             await websocket.send_text(f"Echo: {data}")
     except WebSocketDisconnect:
-        print("WebSocket test disconnected")
+        logger.debug("ws-test disconnected")
 
 
 @router.websocket("/ws/{token}")
@@ -27,16 +27,12 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
     WebSocket endpoint for real-time chat
     Simple version without complex dependencies
     """
-    print(f"WebSocket connection attempt with token: {token[:20]}...")
-
     # For now, accept any token (simplified for testing)
     await websocket.accept()
-    print("WebSocket connection accepted")
 
     try:
         while True:
             data = await websocket.receive_text()
-            print(f"Received WebSocket data: {data}")
 
             try:
                 message_data = json.loads(data)
@@ -44,7 +40,6 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 
                 if message_type == "ping":
                     await websocket.send_text(json.dumps({"type": "pong"}))
-                    print("Sent pong response")
                 else:
                     # Echo back for now
                     await websocket.send_text(
@@ -52,9 +47,9 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                     )
 
             except json.JSONDecodeError:
-                print("Invalid JSON received")
+                logger.debug("ws invalid json")
 
     except WebSocketDisconnect:
-        print("WebSocket disconnected")
-    except Exception as e:
-        print(f"WebSocket error: {e}")
+        logger.debug("ws disconnected")
+    except Exception:
+        logger.exception("ws error")
@@ -1,22 +1,60 @@
 """
 Simple WebSocket Manager for Real-time Chat
 """
+
 import json
-from typing import Dict, Set
-from collections import defaultdict
+import logging
+import time
+
+from app.chat.heartbeat import Heartbeat
+from app.chat.registry import ConnectionRegistry, RoomRegistry, memory_report
+from app.utils.metrics import registry
+from app.utils.tracing import tracer
+from app.utils.workload import db_read
+
+logger = logging.getLogger("chat.ws")
+
+fanout_seconds = registry.histogram(
+    "ws_fanout_seconds", "Time to deliver one event to every member of a conversation"
+)
+frames_sent = registry.counter(
+    "ws_frames_sent_total", "Outbound WebSocket frames delivered by this worker"
+)
+send_failures = registry.counter(
+    "ws_send_failures_total", "Outbound sends that failed and dropped the socket"
+)
+
+
+def _friend_ids(user_id: int):
+    # Import here to avoid circular imports
+    from app.database.connection import SessionLocal
+    from app.crud.friendship_crud import get_friend_ids
+
+    db = SessionLocal()
+    try:
+        # index range scan on friend_edges
+        return get_friend_ids(db, user_id)
+    finally:
+        db.close()
+
+
+async def load_friend_ids(user_id: int):
+    """Friend ids from a DB-read worker thread; never query on the event loop."""
+    return await db_read.run(_friend_ids, user_id)
 
 
 class SimpleWebSocketManager:
     def __init__(self):
-        self.connections: Dict[int, Set] = defaultdict(set)
-        self.conversation_members: Dict[int, Set[int]] = defaultdict(set)
+        # user_id -> Connection record(s); conversation_id <-> joined user_ids
+        self.connections = ConnectionRegistry()
+        self.rooms = RoomRegistry()
+        self.heartbeat = Heartbeat(self)
 
     async def connect(self, user_id: int, websocket):
-        was_offline = (
-            user_id not in self.connections or len(self.connections[user_id]) == 0
-        )
-        self.connections[user_id].add(websocket)
-        print(f"User {user_id} connected via WebSocket")
+        was_offline = user_id not in self.connections
+        connection = self.connections.add(user_id, websocket)
+        self.heartbeat.watch(connection)
+        logger.debug("ws user connected", extra={"user_id": user_id})
 
         # Send online notification to friends if user was offline
         if was_offline:
@@ -24,48 +62,21 @@ class SimpleWebSocketManager:
 
         # Send current online status of friends to this user
         await self.send_friends_status(user_id)
+        return connection
 
     async def disconnect(self, user_id: int, websocket):
-        self.connections[user_id].discard(websocket)
-        is_now_offline = not self.connections[user_id]
+        is_now_offline = self.connections.remove(user_id, websocket)
         if is_now_offline:
-            self.connections.pop(user_id, None)
+            # Rooms are joined per user; the last socket leaves them all
+            self.rooms.leave_all(user_id)
             # Send offline notification to friends
             await self.broadcast_user_status(user_id, False)
-        print(f"User {user_id} disconnected from WebSocket")
+        logger.debug("ws user disconnected", extra={"user_id": user_id})
 
     async def broadcast_user_status(self, user_id: int, is_online: bool):
         """Broadcast user online/offline status to their friends"""
         try:
-            # Import here to avoid circular imports
-            from app.database.connection import get_db
-            from app.database.models import User, Friendship
-            from sqlalchemy.orm import Session
-
-            # Get database session
-            db = next(get_db())
-
-            # Get user's friends
-            friendships = (
-                db.query(Friendship)
-                .filter(
-                    Friendship.status == "accepted",
-                    (
-                        (Friendship.requester_id == user_id)
-                        | (Friendship.receiver_id == user_id)
-                    ),
-                )
-                .all()
-            )
-
-            friend_ids = []
-            for friendship in friendships:
-                friend_id = (
-                    friendship.receiver_id
-                    if friendship.requester_id == user_id
-                    else friendship.requester_id
-                )
-                friend_ids.append(friend_id)
+            friend_ids = await load_friend_ids(user_id)
 
             # Send status update to online friends
             status_message = {
@@ -77,49 +88,22 @@ class SimpleWebSocketManager:
                 if friend_id in self.connections:
                     await self.send_to_user(friend_id, status_message)
 
-            db.close()
-            print(
-                f"📡 Broadcasted {user_id} status ({'online' if is_online else 'offline'}) to {len(friend_ids)} friends"
+            logger.debug(
+                "presence broadcast",
+                extra={
+                    "user_id": user_id,
+                    "online": is_online,
+                    "friends": len(friend_ids),
+                },
             )
 
-        except Exception as e:
-            print(f"❌ Error broadcasting user status: {e}")
-            import traceback
-
-            traceback.print_exc()
+        except Exception:
+            logger.exception("presence broadcast failed", extra={"user_id": user_id})
 
     async def send_friends_status(self, user_id: int):
         """Send current online status of all friends to a newly connected user"""
         try:
-            # Import here to avoid circular imports
-            from app.database.connection import get_db
-            from app.database.models import User, Friendship
-            from sqlalchemy.orm import Session
-
-            # Get database session
-            db = next(get_db())
-
-            # Get user's friends
-            friendships = (
-                db.query(Friendship)
-                .filter(
-                    Friendship.status == "accepted",
-                    (
-                        (Friendship.requester_id == user_id)
-                        | (Friendship.receiver_id == user_id)
-                    ),
-                )
-                .all()
-            )
-
-            friend_ids = []
-            for friendship in friendships:
-                friend_id = (
-                    friendship.receiver_id
-                    if friendship.requester_id == user_id
-                    else friendship.requester_id
-                )
-                friend_ids.append(friend_id)
+            friend_ids = await load_friend_ids(user_id)
 
             # Send status of each friend
             for friend_id in friend_ids:
@@ -130,59 +114,85 @@ class SimpleWebSocketManager:
                 }
                 await self.send_to_user(user_id, status_message)
 
-            db.close()
-            print(f"📤 Sent status of {len(friend_ids)} friends to user {user_id}")
-
-        except Exception as e:
-            print(f"❌ Error sending friends status: {e}")
-            import traceback
+            logger.debug(
+                "presence snapshot sent",
+                extra={"user_id": user_id, "friends": len(friend_ids)},
+            )
 
-            traceback.print_exc()
+        except Exception:
+            logger.exception("presence snapshot failed", extra={"user_id": user_id})
 
     async def join_conversation(self, user_id: int, conversation_id: int):
-        self.conversation_members[conversation_id].add(user_id)
-        print(f"User {user_id} joined conversation {conversation_id}")
+        self.rooms.join(int(conversation_id), user_id)
+        logger.debug(
+            "ws joined conversation",
+            extra={"user_id": user_id, "conversation_id": conversation_id},
+        )
 
     async def send_to_conversation(self, conversation_id: int, message: dict):
         """Send message to all users in a conversation"""
-        user_ids = self.conversation_members.get(conversation_id, set())
-        print(f"🚀 Sending to conversation {conversation_id}")
-        print(f"👥 Conversation members: {user_ids}")
-        print(f"🌐 All connected users: {list(self.connections.keys())}")
-        print(f"📨 Message: {message}")
-
-        if not user_ids:
-            print(
-                f"❌ No members found for conversation {conversation_id}, broadcasting to all connected users"
+        user_ids = self.rooms.members(conversation_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "fan-out",
+                extra={
+                    "conversation_id": conversation_id,
+                    "members": len(user_ids),
+                    "connected_users": len(self.connections),
+                    "message_type": message.get("type"),
+                },
             )
-            # Broadcast to all connected users for now
-            for user_id in self.connections.keys():
-                await self.send_to_user(user_id, message)
-            return
 
-        print(f"✅ Broadcasting to conversation members: {user_ids}")
-        for user_id in user_ids:
-            await self.send_to_user(user_id, message)
+        start = time.perf_counter()
+        with tracer.span("ws.fanout", members=len(user_ids)):
+            for user_id in user_ids:
+                await self.send_to_user(user_id, message)
+        fanout_seconds.observe(time.perf_counter() - start)
 
     async def send_to_user(self, user_id: int, message: dict):
         """Send message to a specific user"""
-        connections = list(self.connections.get(user_id, set()))
+        connections = self.connections.connections(user_id)
         if connections:
             message_text = json.dumps(message)
             sent_count = 0
-            for ws in connections:
+            for connection in connections:
+                ws = connection.websocket
                 try:
                     await ws.send_text(message_text)
                     sent_count += 1
                 except Exception as e:
-                    print(f"❌ Failed to send to user {user_id}: {e}")
+                    send_failures.inc()
+                    logger.info(
+                        "ws send failed; dropping connection",
+                        extra={"user_id": user_id, "error": str(e)},
+                    )
                     await self.disconnect(user_id, ws)
 
-            if sent_count > 0:
-                print(
-                    f"✅ Sent message to user {user_id}: {message['type']} ({sent_count} connections)"
+            frames_sent.inc(sent_count)
+            if sent_count > 0 and logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "ws sent",
+                    extra={
+                        "user_id": user_id,
+                        "message_type": message.get("type"),
+                        "connections": sent_count,
+                    },
                 )
 
+    def memory_report(self, sample: int = 100) -> dict:
+        """Approximate bytes per socket, per room and in total on this worker"""
+        return memory_report(self.connections, self.rooms, sample)
+
 
 # Global manager instance
 websocket_manager = SimpleWebSocketManager()
+
+registry.callback_gauge(
+    "ws_connections",
+    "Open WebSocket connections and distinct connected users on this worker",
+    lambda: [
+        (("sockets",), websocket_manager.connections.sockets),
+        (("users",), len(websocket_manager.connections)),
+    ],
+    ("kind",),
+)
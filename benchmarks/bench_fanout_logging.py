@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Fan-out throughput of SimpleWebSocketManager.send_to_conversation at the
+default INFO level (per-delivery debug records are skipped by level checks),
+at DEBUG through the queue handler, and at DEBUG through a plain synchronous
+StreamHandler (formatting and writes in the sending coroutine).
+
+Sockets are in-memory fakes, so the numbers isolate the manager's own cost:
+JSON encoding once per message, one send per connection, and whatever the
+logging configuration adds on top. Log output goes to /dev/null.
+
+    python benchmarks/bench_fanout_logging.py [--members 500] [--messages 200] [--json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.logging_config import (  # noqa: E402
+    JsonFormatter,
+    configure_logging,
+    dropped_records,
+    shutdown_logging,
+)
+from app.websocket_manager import SimpleWebSocketManager  # noqa: E402
+
+
+class FakeSocket:
+    __slots__ = ("sent",)
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_text(self, text: str):
+        self.sent += 1
+
+
+def _build(members: int) -> SimpleWebSocketManager:
+    manager = SimpleWebSocketManager()
+    for user_id in range(1, members + 1):
+        # bypass connect(): presence lookups would hit the database
+        manager.connections.add(user_id, FakeSocket())
+        manager.rooms.join(1, user_id)
+    return manager
+
+
+async def _fanout(manager: SimpleWebSocketManager, messages: int) -> float:
+    event = {
+        "type": "new_message",
+        "message": {"conversation_id": 1, "sender_id": 1, "content": "x" * 64},
+    }
+    start = time.perf_counter()
+    for _ in range(messages):
+        await manager.send_to_conversation(1, event)
+    return time.perf_counter() - start
+
+
+def _sync_logging(devnull):
+    shutdown_logging()
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+    return handler
+
+
+def run(mode: str, members: int, messages: int, devnull) -> dict:
+    sync_handler = None
+    if mode == "info":
+        configure_logging(level="INFO", stream=devnull)
+    elif mode == "debug":
+        configure_logging(level="DEBUG", stream=devnull)
+    else:
+        sync_handler = _sync_logging(devnull)
+
+    manager = _build(members)
+    elapsed = asyncio.run(_fanout(manager, messages))
+    dropped = dropped_records()
+    if sync_handler is not None:
+        logging.getLogger().removeHandler(sync_handler)
+    shutdown_logging()
+
+    deliveries = members * messages
+    return {
+        "messages_per_second": round(messages / elapsed, 1),
+        "deliveries_per_second": round(deliveries / elapsed, 1),
+        "dropped_log_records": dropped,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="fan-out with logging on/off")
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with open(os.devnull, "w") as devnull:
+        for mode in ("info", "debug", "debug-sync"):
+            results[mode] = run(mode, args.members, args.messages, devnull)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'logging':<12}{'msg/s':>12}{'deliveries/s':>16}{'dropped':>10}")
+    for mode, r in results.items():
+        print(
+            f"{mode:<12}{r['messages_per_second']:>12}"
+            f"{r['deliveries_per_second']:>16}{r['dropped_log_records']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
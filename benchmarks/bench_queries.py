@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Per-request ORM overhead of the hot read paths: ad-hoc Query objects (how the
+routers used to build them) versus the pre-built statements in
+app/database/queries.py.
+
+Runs against an in-memory SQLite database so the numbers are dominated by
+SQLAlchemy's Python-side work (statement construction, cache key generation,
+compilation, result processing) rather than by I/O.
+
+    python benchmarks/bench_queries.py [--iterations 2000] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app.database import queries  # noqa: E402
+from app.database.connection import Base  # noqa: E402
+from app.database.models import (  # noqa: E402
+    Conversation,
+    ConversationMember,
+    FriendEdge,
+    Message,
+    User,
+)
+
+N_USERS = 100
+N_MESSAGES = 500
+
+
+def _seed(session):
+    session.add_all(
+        User(id=i, username=f"user{i}", password_hash="x")
+        for i in range(1, N_USERS + 1)
+    )
+    session.add(Conversation(id=1, type="group", name="bench"))
+    session.add_all(
+        ConversationMember(conversation_id=1, user_id=i, role="member")
+        for i in range(1, N_USERS + 1)
+    )
+    session.add_all(
+        Message(conversation_id=1, sender_id=(i % N_USERS) + 1, content=f"m{i}")
+        for i in range(N_MESSAGES)
+    )
+    session.add_all(FriendEdge(user_id=1, friend_id=i) for i in range(2, 52))
+    session.commit()
+
+
+# ---- legacy shapes (a new Query per call, as in the routers before) ----
+def legacy_user_by_id(db, uid):
+    return db.query(User).filter(User.id == uid).first()
+
+
+def legacy_is_member(db, cid, uid):
+    return (
+        db.query(ConversationMember)
+        .filter(
+            ConversationMember.conversation_id == cid,
+            ConversationMember.user_id == uid,
+        )
+        .first()
+    )
+
+
+def legacy_history(db, cid):
+    messages = (
+        db.query(Message)
+        .filter(Message.conversation_id == cid)
+        .order_by(Message.created_at.desc())
+        .offset(0)
+        .limit(50)
+        .all()
+    )
+    return [
+        (m, db.query(User).filter(User.id == m.sender_id).first()) for m in messages
+    ]
+
+
+def legacy_friend_ids(db, uid):
+    return [
+        e.friend_id
+        for e in db.query(FriendEdge).filter(FriendEdge.user_id == uid).all()
+    ]
+
+
+# ---- pre-built statements ----
+CASES = {
+    "user_by_id": (
+        lambda db: legacy_user_by_id(db, 7),
+        lambda db: queries.user_by_id(db, 7),
+    ),
+    "membership": (
+        lambda db: legacy_is_member(db, 1, 7),
+        lambda db: queries.member_roles(db, 1),
+    ),
+    "history_page": (
+        lambda db: legacy_history(db, 1),
+        lambda db: queries.history_page(db, 1, 0, 50),
+    ),
+    "friend_ids": (
+        lambda db: legacy_friend_ids(db, 1),
+        lambda db: queries.friend_ids(db, 1),
+    ),
+}
+
+
+def _time(fn, session_factory, iterations):
+    # fresh session per call, like one request; warm up first
+    for _ in range(20):
+        with session_factory() as db:
+            fn(db)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with session_factory() as db:
+            fn(db)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ORM overhead: Query vs pre-built")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    with factory() as s:
+        _seed(s)
+
+    results = {}
+    for name, (before, after) in CASES.items():
+        b = _time(before, factory, args.iterations)
+        a = _time(after, factory, args.iterations)
+        results[name] = {
+            "before_us": round(b, 1),
+            "after_us": round(a, 1),
+            "speedup": round(b / a, 2),
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'query':<14}{'before µs':>12}{'after µs':>12}{'speedup':>10}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['before_us']:>12}{r['after_us']:>12}{r['speedup']:>9}x")
+
+
+if __name__ == "__main__":
+    main()
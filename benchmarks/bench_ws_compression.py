@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+CPU cost against bandwidth saved for WebSocket compression settings (see
+app/chat/compression.py), on the frames the server actually sends.
+
+The stream is a seeded mix of presence updates and pongs (tens of bytes),
+new_message events with seed_dataset-style bodies (a few hundred bytes) and
+50-message history pages (~10 KB). Each setting runs the stream through the
+server's extension exactly as a socket would, then inflates it as the
+client would. Per setting:
+
+- wire bytes and the share saved (frame headers excluded: same either way);
+- server deflate and client inflate time per message (1 core);
+- resident memory per socket, measured in a forked child holding `--sockets`
+  contexts that have each sent a few messages; zlib pages are only backed
+  once touched, so this is below the allocation in app.chat.compression.
+
+    python benchmarks/bench_ws_compression.py [--messages 20000] [--sockets 500] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from websockets.extensions.permessage_deflate import (  # noqa: E402
+    ClientPerMessageDeflateFactory,
+)
+from websockets.frames import OP_TEXT, Frame  # noqa: E402
+
+from app.chat.compression import deflate_factory  # noqa: E402
+from scripts.seed_dataset import _sentences  # noqa: E402
+
+# name: (window bits, memLevel, context takeover, min bytes); None = off
+SETTINGS = {
+    "off": None,
+    "uvicorn-default": (15, 8, True, 0),
+    "12/5 takeover >=0": (12, 5, True, 0),
+    "12/5 takeover >=128": (12, 5, True, 128),
+    "12/5 takeover >=512": (12, 5, True, 512),
+    "10/4 takeover >=128": (10, 4, True, 128),
+    "15/8 takeover >=128": (15, 8, True, 128),
+    "12/5 per-message >=128": (12, 5, False, 128),
+    "12/5 per-message >=512": (12, 5, False, 512),
+}
+# share of each frame kind in the stream
+MIX = (("presence", 0.35), ("pong", 0.15), ("new_message", 0.48), ("history", 0.02))
+
+
+def build_stream(count: int, seed: int):
+    rng = random.Random(seed)
+    bodies = _sentences(rng, 2000)
+
+    def message(i):
+        return {
+            "id": 100000 + i,
+            "conversation_id": rng.randint(1, 500),
+            "sender_id": rng.randint(1, 5000),
+            "sender_username": f"user{rng.randint(1, 5000)}",
+            "content": rng.choice(bodies),
+            "created_at": f"2024-03-{rng.randint(1, 28):02d}T12:{i % 60:02d}:00",
+        }
+
+    kinds, weights = zip(*MIX)
+    stream = []
+    for i, kind in enumerate(rng.choices(kinds, weights, k=count)):
+        if kind == "presence":
+            event = {"type": rng.choice(("user_online", "user_offline"))}
+            event["user_id"] = rng.randint(1, 5000)
+        elif kind == "pong":
+            event = {"type": "pong"}
+        elif kind == "new_message":
+            event = {"type": "new_message", "message": message(i)}
+        else:
+            event = {"type": "history", "messages": [message(i) for _ in range(50)]}
+        stream.append(json.dumps(event).encode())
+    return stream
+
+
+def _extensions(setting):
+    """(server extension, client extension) as negotiated by a browser offer."""
+    bits, mem_level, takeover, min_size = setting
+    server = deflate_factory(min_size, bits, mem_level, takeover)
+    client = ClientPerMessageDeflateFactory(client_max_window_bits=True)
+    response, server_ext = server.process_request_params(
+        client.get_request_params(), []
+    )
+    return server_ext, client.process_response_params(response, [])
+
+
+def measure(setting, stream) -> dict:
+    raw = sum(len(data) for data in stream)
+    if setting is None:
+        return {"raw_bytes": raw, "wire_bytes": raw, "saved_pct": 0.0}
+    server, client = _extensions(setting)
+    start = time.process_time()
+    encoded = [server.encode(Frame(OP_TEXT, data)) for data in stream]
+    deflate = time.process_time() - start
+    start = time.process_time()
+    for frame in encoded:
+        client.decode(frame)
+    inflate = time.process_time() - start
+    wire = sum(len(frame.data) for frame in encoded)
+    return {
+        "raw_bytes": raw,
+        "wire_bytes": wire,
+        "saved_pct": round(100 * (1 - wire / raw), 1),
+        "deflate_us_per_msg": round(deflate / len(stream) * 1e6, 2),
+        "inflate_us_per_msg": round(inflate / len(stream) * 1e6, 2),
+        "deflate_us_per_kb_saved": round(
+            deflate * 1e6 / max(1, (raw - wire) / 1024), 1
+        ),
+    }
+
+
+def _rss_kib() -> int:
+    with open("/proc/self/statm") as fh:
+        return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def rss_per_socket(setting, stream, sockets: int):
+    """Resident KiB per socket in a forked child; None off Linux."""
+    if setting is None or not os.path.exists("/proc/self/statm"):
+        return None
+    sample = [data for data in stream if len(data) >= setting[3]][:8]
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        before = _rss_kib()
+        held = []
+        for _ in range(sockets):
+            server, _ = _extensions(setting)
+            for data in sample:
+                server.encode(Frame(OP_TEXT, data))
+            held.append(server)
+        os.write(write, str((_rss_kib() - before) / sockets).encode())
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as fh:
+        value = float(fh.read())
+    os.waitpid(pid, 0)
+    return round(value, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WebSocket compression settings")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--sockets", type=int, default=500, help="for memory")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args(argv)
+
+    stream = build_stream(args.messages, args.seed)
+    results = {}
+    for name, setting in SETTINGS.items():
+        results[name] = measure(setting, stream)
+        results[name]["rss_kib_per_socket"] = rss_per_socket(
+            setting, stream, args.sockets
+        )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(
+        f"{'setting':<24}{'wire KB':>10}{'saved':>8}{'deflate us':>12}"
+        f"{'inflate us':>12}{'us/KB saved':>13}{'RSS KB':>9}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<24}{r['wire_bytes'] // 1024:>10}{r['saved_pct']:>7}%"
+            f"{r.get('deflate_us_per_msg', '-'):>12}"
+            f"{r.get('inflate_us_per_msg', '-'):>12}"
+            f"{r.get('deflate_us_per_kb_saved', '-'):>13}"
+            f"{r['rss_kib_per_socket'] if r['rss_kib_per_socket'] is not None else '-':>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
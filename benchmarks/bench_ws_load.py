@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+End-to-end load generator: seeds users and group conversations, opens one
+`/ws/{token}` socket per user from this process, then drives messages through
+`POST /messages` and pings over the sockets at fixed rates.
+
+Every message carries its send time, so each delivery on each member's socket
+yields an end-to-end latency (HTTP request -> DB write -> fan-out -> socket).
+The report covers connect time, HTTP latency and status codes, delivery
+latency percentiles and completeness, ping round trips, and the server's own
+error counters (5xx, failed sends, rejected frames) read from `/metrics`
+before and after the run.
+
+Seeding writes straight into the server's database with BulkWriter (no
+registration or login round trips, so the credential rate limits and Argon2
+stay out of the picture) and mints access tokens locally, so SECRET_KEY must
+match the server's. Against a local SQLite-backed server:
+
+    export DATABASE_URL=sqlite:///./load.db SECRET_KEY=dev REDIS_URL=redis://localhost:6379/0
+    CREATE_DB_ON_STARTUP=true DB_WRITE_CONCURRENCY=1 uvicorn app.main:app &
+    python benchmarks/bench_ws_load.py --users 2000 --conversations 100 \\
+        --members 20 --http-rate 50 --duration 30 --json --output runs.jsonl
+
+`--output` appends one JSON line per run (with the git revision) so runs can
+be compared over time. Thousands of sockets need a matching open-file limit;
+the soft limit is raised to the hard limit at start.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx  # noqa: E402
+import websockets  # noqa: E402
+from sqlalchemy import create_engine, func, select  # noqa: E402
+
+from app.auth.jwt_handler import create_access_token  # noqa: E402
+from app.database.bulk_import import BulkWriter  # noqa: E402
+from app.database.connection import Base  # noqa: E402
+from app.database.models import Conversation, User  # noqa: E402
+
+MARKER = "lt"
+# stay under the server's per-user WS_MESSAGE_BURST when joining many rooms
+JOIN_BURST = 8
+JOIN_INTERVAL = 0.25
+
+
+def _percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[k]
+
+
+def _latency_summary(seconds) -> dict:
+    if not seconds:
+        return {"count": 0}
+    ms = [s * 1000 for s in seconds]
+    return {
+        "count": len(ms),
+        "p50_ms": round(_percentile(ms, 50), 2),
+        "p95_ms": round(_percentile(ms, 95), 2),
+        "p99_ms": round(_percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2),
+    }
+
+
+def _raise_fd_limit() -> int:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    return soft
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+# ---- seeding ----
+def seed(database_url: str, users: int, conversations: int, members: int, rng):
+    """
+    Insert `users` users and `conversations` group conversations with
+    `members` random members each. Returns (user_ids, {conversation_id: [user_ids]}).
+    """
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    writer = BulkWriter(engine)
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        first_user = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+        first_conv = (conn.execute(select(func.max(Conversation.id))).scalar() or 0) + 1
+    run = uuid.uuid4().hex[:8]
+    now = datetime.now(timezone.utc)
+
+    user_ids = list(range(first_user, first_user + users))
+    writer.write(
+        "users",
+        ("id", "username", "email", "password_hash", "created_at"),
+        # not a valid hash: these accounts only ever use minted tokens
+        [(uid, f"load_{run}_{uid}", None, "!", now) for uid in user_ids],
+    )
+    rooms = {}
+    for cid in range(first_conv, first_conv + conversations):
+        rooms[cid] = rng.sample(user_ids, min(members, users))
+    writer.write(
+        "conversations",
+        ("id", "name", "type", "created_at"),
+        [(cid, f"load {run} #{cid}", "group", now) for cid in rooms],
+    )
+    writer.write(
+        "conversation_members",
+        ("conversation_id", "user_id", "role", "joined_at"),
+        [(cid, uid, "member", now) for cid, uids in rooms.items() for uid in uids],
+    )
+    writer.reset_sequences(["users", "conversations"])
+    engine.dispose()
+    return user_ids, rooms, time.perf_counter() - start
+
+
+# ---- load ----
+class LoadRun:
+    def __init__(self, args, user_ids, rooms):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.rooms = rooms
+        self.tokens = {uid: create_access_token({"id": uid}) for uid in user_ids}
+        self.user_rooms = collections.defaultdict(list)
+        for cid, uids in rooms.items():
+            for uid in uids:
+                self.user_rooms[uid].append(cid)
+        self.sockets = {}
+        self.readers = []
+        self.joined = collections.defaultdict(set)  # conversation -> user ids
+        self.pings = collections.defaultdict(collections.deque)
+        self.connect_seconds = []
+        self.connect_errors = collections.Counter()
+        self.closes = collections.Counter()
+        self.http_seconds = []
+        self.http_status = collections.Counter()
+        self.delivery_seconds = []
+        self.expected_deliveries = 0
+        self.ping_seconds = []
+        self.stopping = False
+
+    async def _connect(self, uid, gate):
+        url = f"{self.args.ws_url}/ws/{self.tokens[uid]}"
+        async with gate:
+            start = time.perf_counter()
+            try:
+                ws = await websockets.connect(
+                    url, open_timeout=30, max_queue=None, ping_interval=None
+                )
+                await ws.recv()  # welcome frame
+            except Exception as exc:
+                self.connect_errors[type(exc).__name__] += 1
+                return
+            self.connect_seconds.append(time.perf_counter() - start)
+        self.sockets[uid] = ws
+        for i, cid in enumerate(self.user_rooms.get(uid, [])):
+            if i >= JOIN_BURST:
+                await asyncio.sleep(JOIN_INTERVAL)
+            await ws.send(
+                json.dumps({"type": "join_conversation", "conversation_id": cid})
+            )
+        self.readers.append(asyncio.ensure_future(self._reader(uid, ws)))
+
+    async def _reader(self, uid, ws):
+        try:
+            async for frame in ws:
+                now = time.perf_counter()
+                event = json.loads(frame)
+                kind = event.get("type")
+                if kind == "new_message":
+                    content = event["message"]["content"]
+                    if content.startswith(MARKER + ":"):
+                        self.delivery_seconds.append(now - float(content.split(":")[1]))
+                elif kind == "pong" and self.pings[uid]:
+                    self.ping_seconds.append(now - self.pings[uid].popleft())
+                elif kind == "joined_conversation":
+                    self.joined[event["conversation_id"]].add(uid)
+        except websockets.ConnectionClosed as exc:
+            if not self.stopping:
+                self.closes[str(exc.rcvd.code if exc.rcvd else 1006)] += 1
+        finally:
+            self.sockets.pop(uid, None)
+
+    async def _send_http(self, client, sem):
+        cid = self.rng.choice(list(self.rooms))
+        sender = self.rng.choice(self.rooms[cid])
+        self.expected_deliveries += len(self.joined[cid] & self.sockets.keys())
+        content = f"{MARKER}:{time.perf_counter():.6f}:{uuid.uuid4().hex[:6]}"
+        async with sem:
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/messages",
+                    json={"conversation_id": cid, "content": content},
+                    headers={"Authorization": f"Bearer {self.tokens[sender]}"},
+                )
+                self.http_status[str(response.status_code)] += 1
+            except httpx.HTTPError as exc:
+                self.http_status[type(exc).__name__] += 1
+                return
+            self.http_seconds.append(time.perf_counter() - start)
+
+    async def _send_ping(self):
+        if not self.sockets:
+            return
+        uid = self.rng.choice(list(self.sockets))
+        ws = self.sockets.get(uid)
+        self.pings[uid].append(time.perf_counter())
+        try:
+            await ws.send('{"type": "ping"}')
+        except websockets.ConnectionClosed:
+            self.pings[uid].pop()
+
+    async def _open_loop(self, rate: float, duration: float, fire):
+        """Start `fire()` every 1/rate seconds, not waiting for completions."""
+        if rate <= 0:
+            return []
+        tasks = []
+        interval = 1.0 / rate
+        start = time.perf_counter()
+        n = 0
+        while time.perf_counter() - start < duration:
+            tasks.append(asyncio.ensure_future(fire()))
+            n += 1
+            delay = start + n * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        return tasks
+
+    async def run(self) -> dict:
+        args = self.args
+        gate = asyncio.Semaphore(args.connect_concurrency)
+        connect_start = time.perf_counter()
+        await asyncio.gather(*(self._connect(uid, gate) for uid in self.tokens))
+        connect_elapsed = time.perf_counter() - connect_start
+        await asyncio.sleep(args.settle)
+
+        limits = httpx.Limits(max_connections=args.http_concurrency)
+        async with httpx.AsyncClient(
+            base_url=args.base_url, limits=limits, timeout=30
+        ) as client:
+            before = await scrape_metrics(client)
+            sem = asyncio.Semaphore(args.http_concurrency)
+            start = time.perf_counter()
+            http_tasks, ping_tasks = await asyncio.gather(
+                self._open_loop(
+                    args.http_rate, args.duration, lambda: self._send_http(client, sem)
+                ),
+                self._open_loop(args.ping_rate, args.duration, self._send_ping),
+            )
+            await asyncio.gather(*http_tasks, *ping_tasks)
+            elapsed = time.perf_counter() - start
+            await asyncio.sleep(args.drain)
+            after = await scrape_metrics(client)
+
+        self.stopping = True
+        await asyncio.gather(
+            *(ws.close() for ws in list(self.sockets.values())), return_exceptions=True
+        )
+        await asyncio.gather(*self.readers, return_exceptions=True)
+        return self._report(connect_elapsed, elapsed, before, after)
+
+    def _report(self, connect_elapsed, elapsed, before, after) -> dict:
+        sent = sum(self.http_status.values())
+        ok = sum(n for code, n in self.http_status.items() if code.startswith("2"))
+        delivered = len(self.delivery_seconds)
+        return {
+            "connect": {
+                "attempted": len(self.tokens),
+                "opened": len(self.connect_seconds),
+                "errors": dict(self.connect_errors),
+                "seconds": round(connect_elapsed, 2),
+                **_latency_summary(self.connect_seconds),
+            },
+            "http": {
+                "sent": sent,
+                "ok": ok,
+                "status": dict(self.http_status),
+                "error_rate": round(1 - ok / sent, 4) if sent else 0.0,
+                "requests_per_second": round(sent / elapsed, 1),
+                **_latency_summary(self.http_seconds),
+            },
+            "delivery": {
+                "expected": self.expected_deliveries,
+                "delivered": delivered,
+                "completeness": (
+                    round(delivered / self.expected_deliveries, 4)
+                    if self.expected_deliveries
+                    else None
+                ),
+                "deliveries_per_second": round(delivered / elapsed, 1),
+                **_latency_summary(self.delivery_seconds),
+            },
+            "ws_ping": _latency_summary(self.ping_seconds),
+            "ws_closed_during_run": dict(self.closes),
+            "server": server_deltas(before, after),
+            "duration_seconds": round(elapsed, 2),
+        }
+
+
+# ---- server counters ----
+async def scrape_metrics(client) -> dict:
+    """{sample name with labels: value} from /metrics, or {} if unavailable."""
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return {}
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+def server_deltas(before: dict, after: dict) -> dict:
+    if not after:
+        return {"available": False}
+
+    def delta(predicate):
+        return sum(v - before.get(k, 0.0) for k, v in after.items() if predicate(k))
+
+    requests = delta(lambda k: k.startswith("http_request_duration_seconds_count"))
+    errors = delta(
+        lambda k: k.startswith("http_request_duration_seconds_count")
+        and 'status="5xx"' in k
+    )
+    return {
+        "available": True,
+        "http_requests": int(requests),
+        "http_5xx": int(errors),
+        "http_5xx_rate": round(errors / requests, 4) if requests else 0.0,
+        "ws_send_failures": int(
+            delta(lambda k: k.startswith("ws_send_failures_total"))
+        ),
+        "ws_frames_sent": int(delta(lambda k: k.startswith("ws_frames_sent_total"))),
+        "ws_inbound_rejected": int(
+            delta(lambda k: k.startswith("ws_inbound_total") and "rejected" in k)
+        ),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WebSocket/HTTP load generator")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--database-url",
+        default=os.getenv("DATABASE_URL"),
+        help="the server's database, for seeding (defaults to $DATABASE_URL)",
+    )
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--members", type=int, default=10, help="per conversation")
+    parser.add_argument("--http-rate", type=float, default=20, help="messages/s")
+    parser.add_argument("--ping-rate", type=float, default=20, help="pings/s in total")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--http-concurrency", type=int, default=64)
+    parser.add_argument("--settle", type=float, default=2, help="wait after joining")
+    parser.add_argument("--drain", type=float, default=3, help="wait for deliveries")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--output", help="append the run as one JSON line to this file")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    args.ws_url = "ws" + args.base_url[len("http") :]
+
+    fd_limit = _raise_fd_limit()
+    rng = random.Random(args.seed)
+    user_ids, rooms, seed_seconds = seed(
+        args.database_url, args.users, args.conversations, args.members, rng
+    )
+    report = asyncio.run(LoadRun(args, user_ids, rooms).run())
+    report["seed_seconds"] = round(seed_seconds, 2)
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": _git_revision(),
+        "config": {
+            k: getattr(args, k)
+            for k in (
+                "users",
+                "conversations",
+                "members",
+                "http_rate",
+                "ping_rate",
+                "duration",
+            )
+        },
+        "fd_limit": fd_limit,
+        **report,
+    }
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(record) + "\n")
+
+    if args.json:
+        print(json.dumps(record, indent=2))
+        return
+    c, h, d = record["connect"], record["http"], record["delivery"]
+    print(f"sockets   {c['opened']}/{c['attempted']} open in {c['seconds']}s")
+    print(
+        f"http      {h['sent']} sent, {h['ok']} ok, {h['requests_per_second']} req/s, "
+        f"p50 {h.get('p50_ms')} ms, p99 {h.get('p99_ms')} ms"
+    )
+    print(
+        f"delivery  {d['delivered']}/{d['expected']} ({d['completeness']}), "
+        f"{d['deliveries_per_second']}/s, p50 {d.get('p50_ms')} ms, "
+        f"p95 {d.get('p95_ms')} ms, p99 {d.get('p99_ms')} ms"
+    )
+    print(f"ping      p50 {record['ws_ping'].get('p50_ms')} ms")
+    print(f"server    {record['server']}")
+
+
+if __name__ == "__main__":
+    main()
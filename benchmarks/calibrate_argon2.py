@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Argon2 calibration for this host: hash latency and peak memory across a grid
+of ARGON_TIME_COST / ARGON_MEMORY_COST / ARGON_PARALLELISM values, measured
+the way the login path runs them (a pool of HASH_WORKERS processes serving
+`--concurrency` clients that log in back to back).
+
+For every grid point a fresh process pool is started so peak RSS is per
+setting. The recommendation is the strongest setting (memory x time cost)
+whose login p95 stays under `--target-p95-ms`; with `--database-url` the
+stored hashes are checked against it through `needs_rehash`, i.e. how many
+users would be re-hashed on their next login after switching.
+
+    python benchmarks/calibrate_argon2.py --target-p95-ms 250 --concurrency 8 \\
+        [--workers 4] [--time-cost 1,2,3] [--memory-cost 19456,47104,65536] \\
+        [--database-url postgresql+psycopg://...] [--json]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.auth.hashing import build_context, needs_rehash  # noqa: E402
+
+PASSWORD = "Calibration-Passw0rd!"
+
+# worker-side: one CryptContext per process, built once by the initializer
+_context = None
+_baseline_kib = 0
+
+
+def _maxrss_kib() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB on Linux
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _init_worker(time_cost: int, memory_cost: int, parallelism: int) -> None:
+    global _context, _baseline_kib
+    _context = build_context(time_cost, memory_cost, parallelism)
+    _baseline_kib = _maxrss_kib()
+
+
+def _hash_once(_: int) -> int:
+    """Hash once; return how far this worker's peak RSS rose above its baseline."""
+    _context.hash(PASSWORD)
+    return _maxrss_kib() - _baseline_kib
+
+
+def _percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[k]
+
+
+async def _closed_loop(executor, concurrency: int, requests: int):
+    """`concurrency` clients each hashing in turn; latency includes queueing."""
+    loop = asyncio.get_running_loop()
+    latencies, peaks = [], []
+    remaining = [requests]
+
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            peaks.append(await loop.run_in_executor(executor, _hash_once, 0))
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, peaks
+
+
+def measure(params, workers: int, concurrency: int, requests: int):
+    time_cost, memory_cost, parallelism = params
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=params,
+    )
+    try:
+        # warm every worker so process start-up is not counted as latency
+        list(executor.map(_hash_once, range(workers)))
+        started = time.perf_counter()
+        latencies, peaks = asyncio.run(_closed_loop(executor, concurrency, requests))
+        elapsed = time.perf_counter() - started
+    finally:
+        executor.shutdown()
+
+    peak_mib = max(peaks) / 1024
+    ms = [x * 1000 for x in latencies]
+    return {
+        "time_cost": time_cost,
+        "memory_cost": memory_cost,
+        "parallelism": parallelism,
+        "p50_ms": round(statistics.median(ms), 1),
+        "p95_ms": round(_percentile(ms, 95), 1),
+        "max_ms": round(max(ms), 1),
+        "hashes_per_second": round(len(ms) / elapsed, 1),
+        "peak_rss_mib_per_worker": round(peak_mib, 1),
+        "peak_rss_mib_total": round(peak_mib * workers, 1),
+    }
+
+
+def recommend(results, target_p95_ms: float):
+    passing = [r for r in results if r["p95_ms"] <= target_p95_ms]
+    if not passing:
+        return None
+    return max(
+        passing,
+        key=lambda r: (r["memory_cost"] * r["time_cost"], r["memory_cost"]),
+    )
+
+
+def count_upgrades(database_url: str, best) -> dict:
+    os.environ.setdefault("DATABASE_URL", database_url)
+    from sqlalchemy import create_engine, select
+
+    from app.database.models import User
+
+    context = build_context(best["time_cost"], best["memory_cost"], best["parallelism"])
+    engine = create_engine(database_url)
+    total = upgrades = 0
+    try:
+        with engine.connect() as conn:
+            rows = conn.execution_options(yield_per=5000).execute(
+                select(User.password_hash)
+            )
+            for (password_hash,) in rows:
+                total += 1
+                if needs_rehash(password_hash, context):
+                    upgrades += 1
+    finally:
+        engine.dispose()
+    return {"stored_hashes": total, "would_rehash": upgrades}
+
+
+def _ints(value: str):
+    return [int(x) for x in value.split(",") if x.strip()]
+
+
+def main(argv=None):
+    from app.auth.hash_service import HASH_WORKERS
+
+    parser = argparse.ArgumentParser(description="Argon2 parameter calibration")
+    parser.add_argument("--time-cost", type=_ints, default=[1, 2, 3])
+    parser.add_argument(
+        "--memory-cost",
+        type=_ints,
+        default=[19456, 47104, 65536],
+        help="KiB, comma separated",
+    )
+    parser.add_argument("--parallelism", type=_ints, default=[1])
+    parser.add_argument("--workers", type=int, default=max(HASH_WORKERS, 1))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=48, help="hashes per setting")
+    parser.add_argument("--target-p95-ms", type=float, default=250.0)
+    parser.add_argument("--database-url", help="count hashes needs_rehash would flag")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args(argv)
+
+    grid = [
+        (t, m, p)
+        for m in args.memory_cost
+        for t in args.time_cost
+        for p in args.parallelism
+    ]
+    results = []
+    for params in grid:
+        if not args.json:
+            print(
+                f"measuring t={params[0]} m={params[1]} p={params[2]} ...", flush=True
+            )
+        results.append(measure(params, args.workers, args.concurrency, args.requests))
+
+    best = recommend(results, args.target_p95_ms)
+    report = {
+        "host_cpus": os.cpu_count(),
+        "workers": args.workers,
+        "concurrency": args.concurrency,
+        "target_p95_ms": args.target_p95_ms,
+        "results": results,
+        "recommended": best,
+    }
+    if best and args.database_url:
+        report["rehash"] = count_upgrades(args.database_url, best)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(
+        f"\n{'t':>3}{'m KiB':>9}{'p':>3}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'hash/s':>9}{'MiB/wkr':>9}{'MiB tot':>9}"
+    )
+    for r in results:
+        print(
+            f"{r['time_cost']:>3}{r['memory_cost']:>9}{r['parallelism']:>3}"
+            f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['hashes_per_second']:>9}"
+            f"{r['peak_rss_mib_per_worker']:>9}{r['peak_rss_mib_total']:>9}"
+        )
+    if best is None:
+        print(
+            f"\nno setting meets p95 <= {args.target_p95_ms} ms at concurrency "
+            f"{args.concurrency}; add workers or lower the grid"
+        )
+        return
+    print(f"\nrecommended for p95 <= {args.target_p95_ms} ms @ {args.concurrency}:")
+    print(f"  ARGON_TIME_COST={best['time_cost']}")
+    print(f"  ARGON_MEMORY_COST={best['memory_cost']}")
+    print(f"  ARGON_PARALLELISM={best['parallelism']}")
+    print(f"  HASH_WORKERS={args.workers}")
+    if "rehash" in report:
+        r = report["rehash"]
+        print(
+            f"  {r['would_rehash']} of {r['stored_hashes']} stored hashes would be "
+            "re-hashed on next login"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the functions that dominate CPU on the message path,
+with stored baselines and a regression check.
+
+    python benchmarks/micro.py                  # run, compare with the baseline
+    python benchmarks/micro.py --save           # run and store as the new baseline
+    python benchmarks/micro.py -k fanout --threshold 0.15 --json
+
+Cases:
+    fanout[N]              SimpleWebSocketManager.send_to_conversation, N fake sockets
+    new_message_event      build_new_message_event + json.dumps (the POST /messages broadcast)
+    decode_token[cold|hot] decode_access_token with an empty / warm claims cache
+    message_page[100]      100 MessageOut built and serialized, as get_messages returns them
+    create_message         app.chat.services.create_message on in-memory SQLite
+
+Each case is timed in `--rounds` rounds of auto-sized batches; the fastest
+round's time per call is reported (the least disturbed by the rest of the
+machine). Baselines are per machine, so they live in benchmarks/baselines/
+(git-ignored) keyed by host name. The process exits 1 when any case is slower
+than its baseline by more than `--threshold` (default 0.25 = 25%), so it can
+gate a local pre-push hook.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "micro-benchmark")
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app.auth.jwt_handler import (  # noqa: E402
+    claims_cache,
+    create_access_token,
+    decode_access_token,
+)
+from app.chat.services import create_message  # noqa: E402
+from app.chat.utils import build_new_message_event  # noqa: E402
+from app.database.connection import Base  # noqa: E402
+from app.database.models import Conversation, User  # noqa: E402
+from app.schemas.message_schema import MessageOut  # noqa: E402
+from app.websocket_manager import SimpleWebSocketManager  # noqa: E402
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+CASES = {}
+
+
+def case(name):
+    """Register `setup() -> fn`; `fn()` is the operation being timed."""
+
+    def register(setup):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+# ---- cases ----
+class FakeSocket:
+    __slots__ = ()
+
+    async def send_text(self, text: str):
+        pass
+
+
+def _fanout(members: int):
+    def setup():
+        manager = SimpleWebSocketManager()
+        for user_id in range(1, members + 1):
+            # bypass connect(): presence lookups would hit the database
+            manager.connections.add(user_id, FakeSocket())
+            manager.rooms.join(1, user_id)
+        event = build_new_message_event(_message_dict(1), "alice")
+        loop = asyncio.new_event_loop()
+        send = manager.send_to_conversation
+        return lambda: loop.run_until_complete(send(1, event))
+
+    return setup
+
+
+for _n in (10, 100, 1000, 10000):
+    case(f"fanout[{_n}]")(_fanout(_n))
+
+
+def _message_dict(i: int) -> dict:
+    return {
+        "id": i,
+        "conversation_id": 1,
+        "sender_id": 7,
+        "content": "hello there, this is a typical chat message " + str(i),
+        "message_type": "text",
+        "created_at": "2024-05-01T12:00:00.123456",
+    }
+
+
+@case("new_message_event")
+def _event():
+    msg = _message_dict(1)
+    return lambda: json.dumps(build_new_message_event(msg, "alice"))
+
+
+@case("decode_token[cold]")
+def _decode_cold():
+    token = create_access_token({"id": 7, "username": "alice"})
+
+    def fn():
+        claims_cache.clear()
+        return decode_access_token(token)
+
+    return fn
+
+
+@case("decode_token[hot]")
+def _decode_hot():
+    token = create_access_token({"id": 7, "username": "alice"})
+    decode_access_token(token)
+    return lambda: decode_access_token(token)
+
+
+@case("message_page[100]")
+def _message_page():
+    rows = [_message_dict(i) | {"sender_username": "alice"} for i in range(100)]
+    adapter = TypeAdapter(List[MessageOut])
+
+    def fn():
+        page = [
+            MessageOut(
+                id=r["id"],
+                conversation_id=r["conversation_id"],
+                sender_id=r["sender_id"],
+                sender_username=r["sender_username"],
+                content=r["content"],
+                created_at=r["created_at"],
+            )
+            for r in rows
+        ]
+        return adapter.dump_json(page)
+
+    return fn
+
+
+@case("create_message")
+def _create_message():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    session.add(User(id=7, username="alice", password_hash="x"))
+    session.add(Conversation(id=1, type="group", name="bench"))
+    session.commit()
+    return lambda: create_message(session, 1, 7, "hello there")
+
+
+# ---- harness ----
+def measure(fn, rounds: int, min_round_seconds: float) -> dict:
+    fn()  # warm up caches, compiled statements, the event loop
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_seconds:
+            break
+        batch *= 2 if elapsed <= 0 else max(2, int(min_round_seconds / elapsed) + 1)
+    per_call = [elapsed / batch]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        per_call.append((time.perf_counter() - start) / batch)
+    best = min(per_call)
+    return {
+        "us_per_call": round(best * 1e6, 3),
+        "calls_per_round": batch,
+        "spread": round(max(per_call) / best - 1, 3),
+    }
+
+
+def baseline_path(path=None) -> str:
+    return path or os.path.join(
+        BASELINE_DIR, f"micro-{platform.node() or 'local'}.json"
+    )
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> dict:
+    """Attach `change` (fraction, + is slower) and `regressed` to each result."""
+    for name, result in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            continue
+        change = result["us_per_call"] / base["us_per_call"] - 1
+        result["baseline_us"] = base["us_per_call"]
+        result["change"] = round(change, 3)
+        result["regressed"] = change > threshold
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="hot-path micro-benchmarks")
+    parser.add_argument("-k", dest="filter", help="only cases containing this text")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-round-seconds", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--baseline", help="baseline file (default: per host)")
+    parser.add_argument("--save", action="store_true", help="store as the baseline")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, setup in CASES.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(setup(), args.rounds, args.min_round_seconds)
+
+    path = baseline_path(args.baseline)
+    if args.save:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        existing = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                existing = json.load(fh).get("cases", {})
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(
+                {
+                    "saved_at": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "cases": {**existing, **results},
+                },
+                fh,
+                indent=2,
+            )
+    elif os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            compare(results, json.load(fh), args.threshold)
+
+    regressed = sorted(n for n, r in results.items() if r.get("regressed"))
+    if args.json:
+        print(json.dumps({"results": results, "regressed": regressed}, indent=2))
+    else:
+        print(f"{'case':<22}{'us/call':>12}{'baseline':>12}{'change':>9}{'spread':>8}")
+        for name, r in results.items():
+            base = r.get("baseline_us", "")
+            change = f"{r['change']:+.1%}" if "change" in r else ""
+            flag = "  REGRESSED" if r.get("regressed") else ""
+            print(
+                f"{name:<22}{r['us_per_call']:>12}{base:>12}{change:>9}"
+                f"{r['spread']:>8.1%}{flag}"
+            )
+        if args.save:
+            print(f"baseline saved to {path}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
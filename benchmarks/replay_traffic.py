@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Re-drive recorded traffic (see app/utils/traffic_journal.py) against a
+running instance: every recorded socket is reopened as the same user and
+sends the same frames (joins, pings, chatter), and every recorded
+`POST /messages` is posted again, all on the recorded schedule.
+
+    python benchmarks/replay_traffic.py traffic-*.ndjson --speed 10
+    python benchmarks/replay_traffic.py traffic.ndjson --speed max --json --output runs.jsonl
+    python benchmarks/replay_traffic.py raw.ndjson --scrub-to clean.ndjson
+
+`--speed` is a multiple of real time (1, 10, ...) or "max", which sends each
+event as soon as the one before it was dispatched (per-socket order is kept
+either way). Several journals, e.g. one per worker, are merged by wall-clock
+time. `--skip` and `--duration` select a window of the recording, in
+recorded seconds.
+
+Access tokens are minted locally for the recorded user ids, so SECRET_KEY
+must match the server's and the target database must have those users and
+conversations (a restored snapshot, or a `scripts/seed_dataset.py` run from
+which the recording was taken). `--user-offset` shifts every user id.
+
+The report covers how far the client fell behind schedule, socket connects
+and server-initiated closes, HTTP latency and status codes, frames received
+by type, ping round trips and the server's error counters from `/metrics`.
+"""
+import argparse
+import asyncio
+import collections
+import heapq
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx  # noqa: E402
+import websockets  # noqa: E402
+
+from app.auth.jwt_handler import create_access_token  # noqa: E402
+from app.utils.traffic_journal import (  # noqa: E402
+    CLOSE,
+    FRAME,
+    MESSAGE,
+    OPEN,
+    read_journal,
+    scrub_journal,
+)
+from bench_ws_load import (  # noqa: E402
+    _git_revision,
+    _latency_summary,
+    _raise_fd_limit,
+    scrape_metrics,
+    server_deltas,
+)
+
+
+def load_events(paths, skip: float = 0.0, duration: float = None):
+    """
+    Merge journals into one list of (time, kind, key, fields) in time order.
+
+    `key` names a recorded socket across files and server restarts:
+    (pid, recording start, socket id).
+    """
+    streams = []
+    for path in paths:
+        with open(path, encoding="utf-8") as fh:
+            events = []
+            for header, at, record in read_journal(fh):
+                kind = record[1]
+                if kind == MESSAGE:
+                    events.append((at, kind, None, record[2:]))
+                else:
+                    key = (header["pid"], header["start"], record[2])
+                    events.append((at, kind, key, record[3:]))
+            streams.append(sorted(events, key=lambda e: e[0]))
+    events = list(heapq.merge(*streams, key=lambda e: e[0]))
+    if not events:
+        return []
+    first = events[0][0] + skip
+    last = first + duration if duration is not None else float("inf")
+    return [e for e in events if first <= e[0] <= last]
+
+
+def _frame_type(frame: str) -> str:
+    try:
+        kind = json.loads(frame).get("type")
+    except (ValueError, AttributeError):
+        return "invalid"
+    return kind if isinstance(kind, str) else "invalid"
+
+
+def recording_shape(events) -> dict:
+    frames = collections.Counter(
+        _frame_type(f[0]) for _, k, _, f in events if k == FRAME
+    )
+    span = events[-1][0] - events[0][0] if events else 0.0
+    return {
+        "recorded_seconds": round(span, 2),
+        "sockets": sum(1 for e in events if e[1] == OPEN),
+        "frames": dict(frames),
+        "http_messages": sum(1 for e in events if e[1] == MESSAGE),
+    }
+
+
+class Replay:
+    def __init__(self, args, events):
+        self.args = args
+        self.events = events
+        self.tokens = {}
+        self.queues = {}
+        self.sockets = []
+        self.http_tasks = []
+        self.pending_posts = set()
+        self.connect_gate = asyncio.Semaphore(args.connect_concurrency)
+        self.http_gate = asyncio.Semaphore(args.http_concurrency)
+        self.lag_seconds = []
+        self.connect_seconds = []
+        self.connect_errors = collections.Counter()
+        self.closes = collections.Counter()
+        self.http_status = collections.Counter()
+        self.http_seconds = []
+        self.received = collections.Counter()
+        self.ping_seconds = []
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.stopping = False
+
+    def _token(self, user_id: int) -> str:
+        user_id += self.args.user_offset
+        if user_id not in self.tokens:
+            self.tokens[user_id] = create_access_token(
+                {"id": user_id}, expires_delta=timedelta(days=1)
+            )
+        return self.tokens[user_id]
+
+    # ---- sockets ----
+    async def _socket(self, user_id: int, outbox: asyncio.Queue):
+        url = f"{self.args.ws_url}/ws/{self._token(user_id)}"
+        ws = None
+        async with self.connect_gate:
+            start = time.perf_counter()
+            try:
+                ws = await websockets.connect(
+                    url, open_timeout=30, max_queue=None, ping_interval=None
+                )
+                await ws.recv()  # welcome frame
+                self.connect_seconds.append(time.perf_counter() - start)
+            except Exception as exc:
+                self.connect_errors[type(exc).__name__] += 1
+                ws = None
+        pings = collections.deque()
+        reader = asyncio.ensure_future(self._reader(ws, pings)) if ws else None
+        while True:
+            frame = await outbox.get()
+            if frame is None:
+                break
+            if ws is None:
+                self.frames_skipped += 1
+                continue
+            if _frame_type(frame) == "ping":
+                pings.append(time.perf_counter())
+            try:
+                await ws.send(frame)
+                self.frames_sent += 1
+            except websockets.ConnectionClosed:
+                self.frames_skipped += 1
+        if ws is not None:
+            await ws.close()
+            await asyncio.gather(reader, return_exceptions=True)
+
+    async def _reader(self, ws, pings):
+        try:
+            async for frame in ws:
+                kind = _frame_type(frame)
+                self.received[kind] += 1
+                if kind == "pong" and pings:
+                    self.ping_seconds.append(time.perf_counter() - pings.popleft())
+        except websockets.ConnectionClosed as exc:
+            if not self.stopping:
+                self.closes[str(exc.rcvd.code if exc.rcvd else 1006)] += 1
+
+    # ---- HTTP ----
+    async def _post(self, client, user_id: int, conversation_id, content: str):
+        async with self.http_gate:
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/messages",
+                    json={"conversation_id": conversation_id, "content": content},
+                    headers={"Authorization": f"Bearer {self._token(user_id)}"},
+                )
+                self.http_status[str(response.status_code)] += 1
+            except httpx.HTTPError as exc:
+                self.http_status[type(exc).__name__] += 1
+                return
+            self.http_seconds.append(time.perf_counter() - start)
+
+    # ---- driver ----
+    def _dispatch(self, client, kind, key, fields):
+        if kind == OPEN:
+            outbox = asyncio.Queue()
+            self.queues[key] = outbox
+            self.sockets.append(asyncio.ensure_future(self._socket(fields[0], outbox)))
+        elif kind == FRAME:
+            outbox = self.queues.get(key)
+            if outbox is None:
+                # socket opened before the recording (or the window) began
+                self.frames_skipped += 1
+            else:
+                outbox.put_nowait(fields[0])
+        elif kind == CLOSE:
+            outbox = self.queues.pop(key, None)
+            if outbox is None:
+                return
+            if self.pending_posts:
+                # faster than real time a close can overtake posts sent before
+                # it; keep the socket until they are answered so it gets their
+                # deliveries, as it did when recorded
+                self.http_tasks.append(
+                    asyncio.ensure_future(
+                        self._close_after(outbox, list(self.pending_posts))
+                    )
+                )
+            else:
+                outbox.put_nowait(None)
+        elif kind == MESSAGE:
+            task = asyncio.ensure_future(self._post(client, *fields))
+            self.pending_posts.add(task)
+            task.add_done_callback(self.pending_posts.discard)
+            self.http_tasks.append(task)
+
+    async def _close_after(self, outbox: asyncio.Queue, posts):
+        await asyncio.gather(*posts, return_exceptions=True)
+        outbox.put_nowait(None)
+
+    async def run(self) -> dict:
+        args = self.args
+        limits = httpx.Limits(max_connections=args.http_concurrency)
+        async with httpx.AsyncClient(
+            base_url=args.base_url, limits=limits, timeout=30
+        ) as client:
+            before = await scrape_metrics(client)
+            origin = self.events[0][0]
+            start = time.perf_counter()
+            for at, kind, key, fields in self.events:
+                if args.speed:
+                    behind = time.perf_counter() - start - (at - origin) / args.speed
+                    if behind < 0:
+                        await asyncio.sleep(-behind)
+                    else:
+                        self.lag_seconds.append(behind)
+                else:
+                    await asyncio.sleep(0)  # let sockets and posts make progress
+                self._dispatch(client, kind, key, fields)
+            # sockets still open when the recording ends
+            for outbox in self.queues.values():
+                outbox.put_nowait(None)
+            await asyncio.gather(*self.http_tasks)
+            self.stopping = True
+            await asyncio.gather(*self.sockets)
+            elapsed = time.perf_counter() - start
+            await asyncio.sleep(args.drain)
+            after = await scrape_metrics(client)
+        return self._report(elapsed, before, after)
+
+    def _report(self, elapsed, before, after) -> dict:
+        sent = sum(self.http_status.values())
+        ok = sum(n for code, n in self.http_status.items() if code.startswith("2"))
+        return {
+            "schedule_lag": _latency_summary(self.lag_seconds),
+            "connect": {
+                "attempted": len(self.sockets),
+                "opened": len(self.connect_seconds),
+                "errors": dict(self.connect_errors),
+                **_latency_summary(self.connect_seconds),
+            },
+            "frames": {"sent": self.frames_sent, "skipped": self.frames_skipped},
+            "http": {
+                "sent": sent,
+                "ok": ok,
+                "status": dict(self.http_status),
+                "error_rate": round(1 - ok / sent, 4) if sent else 0.0,
+                **_latency_summary(self.http_seconds),
+            },
+            "received": dict(self.received),
+            "ws_ping": _latency_summary(self.ping_seconds),
+            "ws_closed_by_server": dict(self.closes),
+            "server": server_deltas(before, after),
+            "duration_seconds": round(elapsed, 2),
+        }
+
+
+def _speed(value: str) -> float:
+    if value == "max":
+        return 0.0
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="replay recorded chat traffic")
+    parser.add_argument("journals", nargs="+", help="traffic journal files")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--speed", type=_speed, default=1.0, help="multiple of real time, or 'max'"
+    )
+    parser.add_argument("--skip", type=float, default=0.0, help="recorded seconds")
+    parser.add_argument("--duration", type=float, help="recorded seconds to replay")
+    parser.add_argument("--user-offset", type=int, default=0)
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--http-concurrency", type=int, default=64)
+    parser.add_argument("--drain", type=float, default=2, help="wait after the end")
+    parser.add_argument(
+        "--scrub-to", help="write a scrubbed copy of the journals here and exit"
+    )
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--output", help="append the run as one JSON line to this file")
+    args = parser.parse_args(argv)
+    args.ws_url = "ws" + args.base_url[len("http") :]
+
+    if args.scrub_to:
+        copied = 0
+        with open(args.scrub_to, "w", encoding="utf-8") as out:
+            for path in args.journals:
+                with open(path, encoding="utf-8") as src:
+                    copied += scrub_journal(src, out)
+        print(f"{copied} records scrubbed into {args.scrub_to}")
+        return
+
+    events = load_events(args.journals, args.skip, args.duration)
+    if not events:
+        parser.error("no events in the selected window")
+    fd_limit = _raise_fd_limit()
+    report = asyncio.run(Replay(args, events).run())
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": _git_revision(),
+        "config": {
+            "journals": [os.path.basename(p) for p in args.journals],
+            "speed": args.speed or "max",
+            "skip": args.skip,
+            "duration": args.duration,
+        },
+        "recording": recording_shape(events),
+        "fd_limit": fd_limit,
+        **report,
+    }
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(record) + "\n")
+
+    if args.json:
+        print(json.dumps(record, indent=2))
+        return
+    r, c, h = record["recording"], record["connect"], record["http"]
+    print(
+        f"recording {r['recorded_seconds']}s, {r['sockets']} sockets, "
+        f"{sum(r['frames'].values())} frames, {r['http_messages']} posts"
+    )
+    print(
+        f"replay    {record['duration_seconds']}s at speed {record['config']['speed']}, "
+        f"lag p99 {record['schedule_lag'].get('p99_ms')} ms"
+    )
+    print(
+        f"sockets   {c['opened']}/{c['attempted']} open, closed {record['ws_closed_by_server']}"
+    )
+    print(
+        f"http      {h['sent']} sent, {h['ok']} ok, "
+        f"p50 {h.get('p50_ms')} ms, p99 {h.get('p99_ms')} ms"
+    )
+    print(f"received  {record['received']}")
+    print(f"ping      p50 {record['ws_ping'].get('p50_ms')} ms")
+    print(f"server    {record['server']}")
+
+
+if __name__ == "__main__":
+    main()
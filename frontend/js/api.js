@@ -9,18 +9,85 @@ class APIService {
             ? window.location.origin
             : 'http://127.0.0.1:8000';
         this.token = localStorage.getItem('access_token');
+        this.refreshToken = localStorage.getItem('refresh_token');
+        this.refreshTimer = null;
+        this.refreshing = null;
+        this.scheduleRefresh();
     }
 
     // Set authorization token
     setToken(token) {
         this.token = token;
         localStorage.setItem('access_token', token);
+        this.scheduleRefresh();
+    }
+
+    // Store the access + refresh token pair returned by login / refresh
+    setSession(tokens) {
+        if (tokens.refresh_token) {
+            this.refreshToken = tokens.refresh_token;
+            localStorage.setItem('refresh_token', tokens.refresh_token);
+        }
+        this.setToken(tokens.access_token);
     }
 
     // Remove authorization token
     removeToken() {
         this.token = null;
+        this.refreshToken = null;
         localStorage.removeItem('access_token');
+        localStorage.removeItem('refresh_token');
+        clearTimeout(this.refreshTimer);
+    }
+
+    // Milliseconds since epoch when a JWT expires (null if unreadable)
+    tokenExpiry(token) {
+        try {
+            const payload = token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/');
+            return JSON.parse(atob(payload)).exp * 1000;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    // Refresh one minute before the access token expires, without a password
+    scheduleRefresh() {
+        clearTimeout(this.refreshTimer);
+        if (!this.token || !this.refreshToken) return;
+
+        const expiry = this.tokenExpiry(this.token);
+        if (!expiry) return;
+        const delay = Math.max(expiry - Date.now() - 60 * 1000, 0);
+        this.refreshTimer = setTimeout(() => {
+            this.refreshAccessToken().catch(error => console.error('Token refresh failed:', error));
+        }, delay);
+    }
+
+    // Rotate the refresh token; concurrent callers share one request
+    async refreshAccessToken() {
+        if (!this.refreshToken) {
+            throw new Error('Not signed in');
+        }
+        if (!this.refreshing) {
+            this.refreshing = (async () => {
+                try {
+                    const response = await fetch(`${this.baseURL}/auth/refresh`, {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ refresh_token: this.refreshToken }),
+                    });
+                    if (!response.ok) {
+                        this.removeToken();
+                        throw new Error('Session expired, please log in again');
+                    }
+                    this.setSession(await response.json());
+                    return this.token;
+                } finally {
+                    this.refreshing = null;
+                }
+            })();
+        }
+        return this.refreshing;
     }
 
     // Get authorization headers
@@ -37,7 +104,7 @@ class APIService {
     }
 
     // Generic request method
-    async request(endpoint, options = {}) {
+    async request(endpoint, options = {}, retried = false) {
         const url = `${this.baseURL}${endpoint}`;
         const config = {
             headers: this.getAuthHeaders(),
@@ -46,6 +113,13 @@ class APIService {
 
         try {
             const response = await fetch(url, config);
+
+            // Access token expired (e.g. laptop slept past the timer): refresh once and retry
+            if (response.status === 401 && !retried && this.refreshToken && !endpoint.startsWith('/auth/')) {
+                await this.refreshAccessToken();
+                return await this.request(endpoint, options, true);
+            }
+
             const data = await response.json();
 
             if (!response.ok) {
@@ -84,6 +158,17 @@ class APIService {
         });
     }
 
+    async logout() {
+        const refreshToken = this.refreshToken;
+        this.removeToken();
+        if (refreshToken) {
+            await this.request('/auth/logout', {
+                method: 'POST',
+                body: JSON.stringify({ refresh_token: refreshToken }),
+            });
+        }
+    }
+
     async getCurrentUser() {
         return await this.request('/auth/me');
     }
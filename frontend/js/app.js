@@ -25,8 +25,8 @@ class ChatApp {
                 await this.loadCurrentUser();
                 await this.showMainApp();
 
-                // Connect to WebSocket for real-time features
-                this.connectWebSocket(token);
+                // Connect to WebSocket for real-time features (token may have been refreshed)
+                this.connectWebSocket(api.token);
             } catch (error) {
                 console.error('Failed to load user:', error);
                 this.showAuthPage();
@@ -293,7 +293,7 @@ class ChatApp {
             UI.clearMessage();
             const response = await api.login(credentials);
 
-            api.setToken(response.access_token);
+            api.setSession(response);
             await this.loadCurrentUser();
             await this.showMainApp();
 
@@ -1149,7 +1149,7 @@ class ChatApp {
 
     // Logout
     logout() {
-        api.removeToken();
+        api.logout().catch(error => console.error('Logout failed:', error));
 
         // Disconnect WebSocket
         if (window.webSocket) {
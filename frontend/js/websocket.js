@@ -348,8 +348,10 @@ class WebSocketService {
         console.log(`Attempting to reconnect (${this.reconnectAttempts}/${this.maxReconnectAttempts})...`);
 
         setTimeout(() => {
-            if (this.token) {
-                this.connect(this.token);
+            // the access token may have been refreshed since the first connect
+            const token = api.token || this.token;
+            if (token) {
+                this.connect(token);
             }
         }, this.reconnectInterval);
     }
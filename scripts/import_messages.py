@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Bulk-import legacy chat data from NDJSON.
+
+Usage:
+    python scripts/import_messages.py dump.ndjson[.gz] [--database-url URL]
+    cat dump.ndjson | python scripts/import_messages.py -
+
+Uses Postgres COPY when DATABASE_URL points at Postgres, chunked executemany
+otherwise. See app/database/bulk_import.py for the record format.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+
+# allow importing app package when running from repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from app.database.bulk_import import NDJSONImporter  # noqa: E402
+
+
+def _open_input(path: str):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="NDJSON file (.gz ok) or '-' for stdin")
+    parser.add_argument(
+        "--database-url",
+        default=os.getenv("DATABASE_URL"),
+        help="target database (defaults to $DATABASE_URL)",
+    )
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--progress-every", type=int, default=100000)
+    parser.add_argument(
+        "--rejects", help="write rejected input lines to this file for inspection"
+    )
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    engine = create_engine(args.database_url)
+    rejects = open(args.rejects, "w", encoding="utf-8") if args.rejects else None
+    source = _open_input(args.input)
+    try:
+        importer = NDJSONImporter(
+            engine,
+            batch_size=args.batch_size,
+            progress_every=args.progress_every,
+            reject_file=rejects,
+        )
+        stats = importer.run(source)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if rejects:
+            rejects.close()
+        engine.dispose()
+
+    print(json.dumps(stats.summary(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
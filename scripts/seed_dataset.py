@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Generate a large, realistically skewed chat dataset for performance work.
+
+Usage:
+    python scripts/seed_dataset.py --users 100000 --groups 20000 \\
+        --messages 5000000 [--seed 42] [--database-url URL] [--json]
+
+What gets generated (all deterministic for a given --seed and sizes):
+  * users, each with a Pareto "activity" weight that drives everything else;
+    all of them log in with --password (one Argon2 hash, computed once)
+  * a preferential-attachment friend graph (power-law degrees: a few hubs,
+    a long tail of users with a handful of friends), written as accepted
+    `friendships` plus both `friend_edges` directions
+  * direct conversations for a sample of friend pairs and group
+    conversations with Pareto sizes, members drawn by activity
+  * messages split across conversations by a heavy-tailed weight, sent in
+    bursts (exponential gaps of seconds inside a burst, hours between bursts)
+    by members in proportion to their activity
+
+Rows go through BulkWriter (COPY on Postgres, raw executemany on SQLite)
+with secondary indexes dropped during the load and rebuilt at the end; on
+SQLite the loading connection also turns off fsync and the rollback journal.
+Ids continue after whatever the target already holds, so a run can be added
+to an existing database.
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# allow importing app package when running from repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+TARGET_URL = os.getenv("DATABASE_URL")
+# app.database.connection builds its engine at import; --database-url may differ
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event, func, select  # noqa: E402
+
+from app.auth.hashing import pwd_context  # noqa: E402
+from app.database.bulk_import import BulkWriter  # noqa: E402
+from app.database.connection import Base  # noqa: E402
+from app.database.models import Conversation, Message, User  # noqa: E402
+
+logger = logging.getLogger("chat.seed")
+
+USER_COLUMNS = ("id", "username", "email", "password_hash", "created_at")
+FRIENDSHIP_COLUMNS = (
+    "requester_id",
+    "receiver_id",
+    "status",
+    "created_at",
+    "updated_at",
+)
+EDGE_COLUMNS = ("user_id", "friend_id", "created_at")
+CONVERSATION_COLUMNS = ("id", "name", "type", "private_pair_key", "created_at")
+MEMBER_COLUMNS = ("conversation_id", "user_id", "role", "joined_at")
+MESSAGE_COLUMNS = ("id", "conversation_id", "sender_id", "content", "created_at")
+
+WORDS = (
+    "ok yes no lol haha sure thanks see you tomorrow tonight later meeting "
+    "lunch coffee call me when are we going what about the project deadline "
+    "sounds good great nice did you get my message running late on my way "
+    "where is everyone happy birthday congrats let's do it maybe next week "
+    "I think that works for me can't make it sorry busy right now"
+).split()
+
+
+def _sentences(rng: random.Random, count: int):
+    """A pool of message bodies; drawing from it keeps generation cheap."""
+    pool = []
+    for _ in range(count):
+        length = min(40, int(rng.expovariate(1 / 7)) + 1)
+        pool.append(" ".join(rng.choices(WORDS, k=length)))
+    return pool
+
+
+class DatasetSeeder:
+    def __init__(self, engine, args):
+        self.engine = engine
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.writer = BulkWriter(engine, chunk_size=args.batch_size)
+        self.written = {}
+        self.start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.end = self.start + timedelta(days=args.days)
+
+    # -- helpers --
+    def _write(self, table, columns, rows):
+        self.written[table] = self.written.get(table, 0) + self.writer.write(
+            table, columns, rows
+        )
+
+    def _next_id(self, model) -> int:
+        with self.engine.connect() as conn:
+            return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+    def _when(self, fraction: float) -> datetime:
+        return self.start + timedelta(days=self.args.days * fraction)
+
+    # -- tables --
+    def users(self):
+        rng = self.rng
+        first = self._next_id(User)
+        self.user_ids = list(range(first, first + self.args.users))
+        password_hash = pwd_context.hash(self.args.password)
+        rows = []
+        for uid in self.user_ids:
+            created = self._when(rng.random() * 0.5)
+            rows.append(
+                (uid, f"user{uid}", f"user{uid}@example.test", password_hash, created)
+            )
+        self._write("users", USER_COLUMNS, rows)
+        # heavy-tailed activity: a few users send most of the messages
+        self.activity = [rng.paretovariate(1.2) for _ in self.user_ids]
+        self.activity_cum = list(itertools.accumulate(self.activity))
+
+    def friends(self):
+        """Barabasi-Albert style: newcomers befriend users in proportion to degree."""
+        rng = self.rng
+        m = max(1, self.args.avg_friends // 2)
+        ids = self.user_ids
+        endpoints = list(ids[: m + 1])  # every edge adds both ends once
+        edges = set()
+        for uid in ids[m + 1 :]:
+            targets = set()
+            while len(targets) < m:
+                targets.add(endpoints[rng.randrange(len(endpoints))])
+            for friend in targets:
+                edges.add((friend, uid))
+                endpoints.append(friend)
+                endpoints.append(uid)
+        self.friend_pairs = sorted(edges)
+
+        friendships, friend_edges = [], []
+        for low, high in self.friend_pairs:
+            when = self._when(0.5 + rng.random() * 0.5)
+            friendships.append((high, low, "accepted", when, when))
+            friend_edges.append((low, high, when))
+            friend_edges.append((high, low, when))
+            if len(friend_edges) >= self.args.batch_size:
+                self._write("friendships", FRIENDSHIP_COLUMNS, friendships)
+                self._write("friend_edges", EDGE_COLUMNS, friend_edges)
+                friendships, friend_edges = [], []
+        self._write("friendships", FRIENDSHIP_COLUMNS, friendships)
+        self._write("friend_edges", EDGE_COLUMNS, friend_edges)
+
+    def conversations(self):
+        rng = self.rng
+        cid = self._next_id(Conversation)
+        conversations, members = [], []
+        self.rooms = []  # (conversation_id, member ids)
+
+        direct = rng.sample(
+            self.friend_pairs,
+            min(len(self.friend_pairs), int(len(self.friend_pairs) * self.args.direct)),
+        )
+        for low, high in sorted(direct):
+            when = self._when(0.5 + rng.random() * 0.4)
+            conversations.append((cid, None, "direct", f"direct:{low}:{high}", when))
+            members.append((cid, low, "member", when))
+            members.append((cid, high, "member", when))
+            self.rooms.append((cid, [low, high]))
+            cid += 1
+
+        for _ in range(self.args.groups):
+            # Pareto sizes: mostly 3-10 people, occasionally hundreds
+            size = min(
+                self.args.max_group, len(self.user_ids), int(3 * rng.paretovariate(1.3))
+            )
+            size = max(3, size) if len(self.user_ids) >= 3 else len(self.user_ids)
+            chosen = set()
+            while len(chosen) < size:
+                chosen.update(
+                    rng.choices(
+                        self.user_ids,
+                        cum_weights=self.activity_cum,
+                        k=size - len(chosen),
+                    )
+                )
+            group = sorted(chosen)
+            when = self._when(rng.random() * 0.9)
+            conversations.append((cid, f"group {cid}", "group", None, when))
+            members.append((cid, group[0], "admin", when))
+            members.extend((cid, uid, "member", when) for uid in group[1:])
+            self.rooms.append((cid, group))
+            cid += 1
+
+        self._write("conversations", CONVERSATION_COLUMNS, conversations)
+        for start in range(0, len(members), self.args.batch_size):
+            self._write(
+                "conversation_members",
+                MEMBER_COLUMNS,
+                members[start : start + self.args.batch_size],
+            )
+
+    def messages(self):
+        rng = self.rng
+        total = self.args.messages
+        if not self.rooms or total <= 0:
+            return
+        # heavy-tailed traffic per conversation, larger rooms somewhat busier
+        weights = [
+            rng.paretovariate(1.1) * math.sqrt(len(uids)) for _, uids in self.rooms
+        ]
+        scale = total / sum(weights)
+        counts = [int(w * scale) for w in weights]
+        for i in rng.sample(range(len(counts)), min(len(counts), total - sum(counts))):
+            counts[i] += 1
+
+        bodies = _sentences(rng, 4096)
+        span = (self.end - self.start).total_seconds()
+        start_ts = self.start.timestamp()
+        user_index = {uid: i for i, uid in enumerate(self.user_ids)}
+        mid = self._next_id(Message)
+        rows = []
+        for (cid, uids), n in zip(self.rooms, counts):
+            if n == 0:
+                continue
+            senders = rng.choices(
+                uids,
+                cum_weights=list(
+                    itertools.accumulate(self.activity[user_index[u]] for u in uids)
+                ),
+                k=n,
+            )
+            texts = rng.choices(bodies, k=n)
+            mean_gap = span / max(1.0, n / 6)  # ~6 messages per burst
+            t = rng.random() * span
+            left_in_burst = 0
+            for sender, text in zip(senders, texts):
+                if left_in_burst == 0:
+                    left_in_burst = int(rng.expovariate(1 / 6)) + 1
+                    t += rng.expovariate(1 / mean_gap)
+                else:
+                    t += rng.expovariate(1 / 20)
+                left_in_burst -= 1
+                created = datetime.fromtimestamp(start_ts + t % span, timezone.utc)
+                rows.append((mid, cid, sender, text, created))
+                mid += 1
+            if len(rows) >= self.args.batch_size:
+                self._write("messages", MESSAGE_COLUMNS, rows)
+                rows = []
+                logger.info("messages written: %d", self.written["messages"])
+        self._write("messages", MESSAGE_COLUMNS, rows)
+
+    def run(self) -> dict:
+        started = time.perf_counter()
+        Base.metadata.create_all(self.engine)
+        tables = (
+            "users",
+            "friendships",
+            "friend_edges",
+            "conversations",
+            "conversation_members",
+            "messages",
+        )
+        with self.writer.deferred_indexes(tables):
+            for step in (self.users, self.friends, self.conversations, self.messages):
+                step_start = time.perf_counter()
+                step()
+                logger.info(
+                    "%s done in %.1fs", step.__name__, time.perf_counter() - step_start
+                )
+            load_seconds = time.perf_counter() - started
+            index_start = time.perf_counter()
+        index_seconds = time.perf_counter() - index_start
+        self.writer.reset_sequences(["users", "conversations", "messages"])
+        elapsed = time.perf_counter() - started
+        rows = sum(self.written.values())
+        group_sizes = sorted(len(u) for _, u in self.rooms if len(u) > 2) or [0]
+        degrees = {}
+        for low, high in self.friend_pairs:
+            degrees[low] = degrees.get(low, 0) + 1
+            degrees[high] = degrees.get(high, 0) + 1
+        degree_list = sorted(degrees.values()) or [0]
+        return {
+            "seed": self.args.seed,
+            "rows": self.written,
+            "total_rows": rows,
+            "load_seconds": round(load_seconds, 2),
+            "index_seconds": round(index_seconds, 2),
+            "elapsed_seconds": round(elapsed, 2),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed else 0.0,
+            "group_size": {
+                "median": group_sizes[len(group_sizes) // 2],
+                "max": group_sizes[-1],
+            },
+            "friend_degree": {
+                "median": degree_list[len(degree_list) // 2],
+                "max": degree_list[-1],
+            },
+        }
+
+
+def _fast_sqlite(engine):
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, _record):
+        # a seed run is disposable: skip fsync and the rollback journal
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA journal_mode=MEMORY")
+        cursor.execute("PRAGMA cache_size=-262144")
+        cursor.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--database-url",
+        default=TARGET_URL,
+        help="target database (defaults to $DATABASE_URL)",
+    )
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--avg-friends", type=int, default=20)
+    parser.add_argument(
+        "--direct",
+        type=float,
+        default=0.3,
+        help="fraction of friend pairs with a direct conversation",
+    )
+    parser.add_argument("--groups", type=int, default=2000)
+    parser.add_argument("--max-group", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=90, help="message time span")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--password", default="Password123!")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    engine = create_engine(args.database_url)
+    if engine.dialect.name == "sqlite":
+        _fast_sqlite(engine)
+    try:
+        summary = DatasetSeeder(engine, args).run()
+    finally:
+        engine.dispose()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        for table, n in summary["rows"].items():
+            print(f"{table:<22}{n:>12,}")
+        print(
+            f"{summary['total_rows']:,} rows in {summary['elapsed_seconds']}s "
+            f"({summary['rows_per_second']:,.0f} rows/s, "
+            f"indexes {summary['index_seconds']}s)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
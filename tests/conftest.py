@@ -1,5 +1,12 @@
 """Pytest configuration and fixtures"""
 
+import os
+
+# hash on the crypto thread budget; the process pool has its own test
+os.environ.setdefault("HASH_WORKERS", "0")
+# routes over their @query_budget answer 500
+os.environ.setdefault("ENVIRONMENT", "test")
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -7,15 +14,23 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
-from app.database.connection import Base, get_db
+from app.database.connection import Base, get_db, instrument_engine
+from app.chat.services import direct_conversation_cache
+from app.chat.membership import membership_cache
+from app.auth.jwt_handler import claims_cache
+from app.auth.principal import principal_cache
+from app.utils import rate_limit
+from app.chat.ws_limits import ws_limits
 
 # Use in-memory SQLite for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
+engine = instrument_engine(
+    create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -24,6 +39,13 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 def db_session():
     """Create a fresh database for each test"""
     Base.metadata.create_all(bind=engine)
+    # in-process caches must not outlive the database they mirror
+    direct_conversation_cache.clear()
+    membership_cache.clear()
+    principal_cache.clear()
+    claims_cache.clear()
+    rate_limit.reset()
+    ws_limits.reset()
     db = TestingSessionLocal()
     try:
         yield db
@@ -74,3 +96,29 @@ def test_user_token(client, test_user_data):
     assert login_response.status_code == 200
     
     return login_response.json()["access_token"]
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Register and log in a user by name; returns their Authorization header"""
+    def register_and_login(username):
+        client.post(
+            "/auth/register",
+            json={"username": username, "email": f"{username}@example.com", "password": "Secret123!"},
+        )
+        response = client.post("/auth/login", json={"username": username, "password": "Secret123!"})
+        assert response.status_code == 200
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return register_and_login
+
+
+@pytest.fixture
+def admin_headers(client, auth_headers, monkeypatch):
+    """Authorization header for a user listed in ADMIN_USER_IDS"""
+    from app.auth import dependencies
+
+    headers = auth_headers("operator")
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    monkeypatch.setattr(dependencies, "ADMIN_USER_IDS", frozenset({user_id}))
+    return headers
@@ -102,3 +102,103 @@ def test_get_current_user_invalid_token(client):
     )
     
     assert response.status_code == 401
+
+
+def test_repeated_token_uses_cached_claims(client, test_user_token):
+    """A second request with the same token skips JWT verification"""
+    from app.auth.jwt_handler import claims_cache
+
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    hits = claims_cache.hits
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    assert claims_cache.hits == hits + 1
+
+
+def test_profile_change_refreshes_cached_principal(client, test_user_token):
+    """Renaming yourself is visible on the very next request"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    assert client.get("/users/me", headers=headers).json()["username"] == "testuser"
+
+    response = client.put("/users/me", json={"username": "renamed"}, headers=headers)
+    assert response.status_code == 200
+    assert client.get("/users/me", headers=headers).json()["username"] == "renamed"
+
+
+def _login(client, test_user_data):
+    client.post("/auth/register", json=test_user_data)
+    response = client.post("/auth/login", json={
+        "username": test_user_data["username"],
+        "password": test_user_data["password"]
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_refresh_rotates_tokens(client, test_user_data):
+    """A refresh token buys a new pair once; replaying it kills the session"""
+    tokens = _login(client, test_user_data)
+    assert tokens["refresh_token"] and tokens["expires_in"] > 0
+
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert me.json()["username"] == test_user_data["username"]
+
+    # replaying the old token is treated as theft: the whole family is revoked
+    replay = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert replay.status_code == 401
+    response = client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]})
+    assert response.status_code == 401
+
+
+def test_logout_revokes_refresh_token(client, test_user_data):
+    tokens = _login(client, test_user_data)
+    response = client.post("/auth/logout", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+
+def test_login_rate_limited_per_username(client, test_user_data, monkeypatch):
+    """Once a username's bucket is empty, attempts get 429 without hashing"""
+    from app.auth.hash_service import hasher
+    from app.utils.rate_limit import login_user, rate_limit_stats
+
+    monkeypatch.setattr(login_user, "burst", 2)
+    client.post("/auth/register", json=test_user_data)
+    attempt = {"username": test_user_data["username"], "password": "wrong-password"}
+    assert client.post("/auth/login", json=attempt).status_code == 401
+    assert client.post("/auth/token", json=attempt).status_code == 401
+
+    hashed = hasher.completed
+    response = client.post("/auth/login", json=attempt)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert hasher.completed == hashed
+
+    stats = rate_limit_stats()["login_user"]
+    assert stats["admitted"] == 2 and stats["rejected"] == 1
+
+
+def test_password_change_sheds_load_when_hashing_is_saturated(
+    client, test_user_token, monkeypatch
+):
+    """A full hashing queue is a 503 with Retry-After, not a 500"""
+    from app.auth.hash_service import HashingOverloaded, hasher
+
+    async def overloaded(*args):
+        raise HashingOverloaded()
+
+    monkeypatch.setattr(hasher, "verify", overloaded)
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    response = client.put(
+        "/users/me/password",
+        json={"current_password": "TestPassword123!", "new_password": "NewPassword456!"},
+        headers=headers,
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
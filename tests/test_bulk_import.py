@@ -0,0 +1,132 @@
+"""Tests for the NDJSON bulk importer (SQLite executemany path)"""
+
+import io
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect
+
+from app.chat.services import get_or_create_direct_conversation_id
+from app.database.bulk_import import BulkWriter, NDJSONImporter, _csv_line
+from app.database.models import Conversation, ConversationMember, Message, User
+
+
+def _ndjson(*records):
+    return [json.dumps(r) for r in records]
+
+
+def test_import_writes_rows_and_rejects_broken_references(db_session):
+    db_session.add_all(
+        [
+            User(id=1, username="alice", password_hash="x"),
+            User(id=2, username="bob", password_hash="x"),
+        ]
+    )
+    db_session.commit()
+
+    lines = _ndjson(
+        {"kind": "conversation", "id": 10, "type": "direct", "members": [1, 2]},
+        {"kind": "member", "conversation_id": 10, "user_id": 1},
+        {"kind": "member", "conversation_id": 10, "user_id": 2},
+        {"kind": "member", "conversation_id": 10, "user_id": 2},
+        {"kind": "member", "conversation_id": 10, "user_id": 99},
+        {"kind": "message", "id": 1, "conversation_id": 10, "sender_id": 1,
+         "content": "hi", "created_at": "2020-01-01T10:00:00Z"},
+        {"kind": "message", "id": 2, "conversation_id": 77, "sender_id": 1,
+         "content": "orphan"},
+        {"kind": "bogus"},
+    ) + ["not json"]
+
+    rejects = io.StringIO()
+    importer = NDJSONImporter(db_session.get_bind(), batch_size=2, reject_file=rejects)
+    stats = importer.run(lines)
+
+    assert stats.written == {
+        "conversations": 1,
+        "conversation_members": 2,
+        "messages": 1,
+    }
+    assert stats.rejected == {
+        "duplicate_member": 1,
+        "unknown_user": 1,
+        "unknown_conversation": 1,
+        "unknown_kind": 1,
+        "malformed": 1,
+    }
+    assert len(rejects.getvalue().splitlines()) == 5
+    assert db_session.query(ConversationMember).count() == 2
+    msg = db_session.query(Message).one()
+    assert msg.content == "hi" and msg.created_at.year == 2020
+
+
+def test_reimport_skips_existing_ids(db_session):
+    db_session.add(User(id=1, username="alice", password_hash="x"))
+    db_session.commit()
+    lines = _ndjson(
+        {"kind": "conversation", "id": 5, "type": "group", "name": "g"},
+        {"kind": "member", "conversation_id": 5, "user_id": 1},
+        {"kind": "message", "id": 9, "conversation_id": 5, "sender_id": 1,
+         "content": ""},
+    )
+    NDJSONImporter(db_session.get_bind()).run(lines)
+    stats = NDJSONImporter(db_session.get_bind()).run(lines)
+
+    assert stats.total_written == 0
+    assert stats.rejected == {
+        "duplicate_conversation": 1,
+        "duplicate_member": 1,
+        "duplicate_message": 1,
+    }
+    assert db_session.query(ConversationMember).count() == 1
+
+
+def test_imported_direct_pair_is_found_by_pair_key(db_session):
+    db_session.add_all(
+        [User(id=i, username=f"u{i}", password_hash="x") for i in (1, 2, 3)]
+    )
+    db_session.commit()
+    lines = _ndjson(
+        {"kind": "conversation", "id": 20, "type": "direct", "members": [2, 1]},
+        {"kind": "member", "conversation_id": 20, "user_id": 1},
+        {"kind": "member", "conversation_id": 20, "user_id": 2},
+        {"kind": "member", "conversation_id": 20, "user_id": 3},
+        {"kind": "conversation", "id": 21, "type": "direct", "members": [1, 2]},
+        {"kind": "conversation", "id": 22, "type": "direct", "members": [1]},
+        {"kind": "conversation", "id": 23, "type": "direct"},
+    )
+    stats = NDJSONImporter(db_session.get_bind()).run(lines)
+
+    assert stats.written["conversations"] == 1
+    assert stats.rejected == {
+        "not_in_pair": 1,
+        "duplicate_pair": 1,
+        "direct_not_two_members": 2,
+    }
+    assert get_or_create_direct_conversation_id(db_session, 1, 2) == 20
+    assert db_session.query(Conversation).count() == 1
+
+
+def test_bulk_writer_positional_rows_and_deferred_indexes(db_session):
+    engine = db_session.get_bind()
+    writer = BulkWriter(engine)
+    before = {ix["name"] for ix in inspect(engine).get_indexes("users")}
+    when = datetime(2021, 3, 4, 5, 6, 7, 890, tzinfo=timezone.utc)
+
+    with writer.deferred_indexes(["users"]):
+        during = {ix["name"] for ix in inspect(engine).get_indexes("users")}
+        writer.write(
+            "users",
+            ("id", "username", "email", "password_hash", "created_at"),
+            [(1, "alice", None, "x", when), (2, "bob", "b@example.com", "x", None)],
+        )
+
+    assert {ix["name"] for ix in inspect(engine).get_indexes("users")} == before
+    assert during < before  # only the unique indexes stay during the load
+    alice = db_session.get(User, 1)
+    assert alice.created_at.replace(tzinfo=None) == when.replace(tzinfo=None)
+    assert db_session.get(User, 2).created_at is None
+
+
+def test_copy_csv_keeps_empty_strings_apart_from_null():
+    row = (1, None, "", 'say "hi",\nbye', datetime(2020, 1, 2, 3, 4, 5))
+    assert _csv_line(row) == '1,,"","say ""hi"",\nbye",2020-01-02T03:04:05\n'
@@ -0,0 +1,55 @@
+"""Tests for negotiated WebSocket compression"""
+
+import json
+
+from websockets.extensions.permessage_deflate import (
+    ClientPerMessageDeflateFactory,
+    ServerPerMessageDeflateFactory,
+)
+from websockets.frames import OP_CONT, OP_TEXT, Frame
+
+from app.chat import compression
+
+
+def _negotiate(factory):
+    client = ClientPerMessageDeflateFactory(client_max_window_bits=True)
+    response, server = factory.process_request_params(
+        client.get_request_params(), []
+    )
+    return server, client.process_response_params(response, [])
+
+
+def test_small_messages_skip_deflate_and_large_ones_round_trip():
+    server, client = _negotiate(compression.deflate_factory(min_size=128))
+    assert server.deflate.local_max_window_bits == 12
+    assert server.deflate.remote_max_window_bits == 12  # browser offer honoured
+
+    pong = json.dumps({"type": "pong"}).encode()
+    frame = server.encode(Frame(OP_TEXT, pong))
+    assert not frame.rsv1 and frame.data == pong
+
+    event = json.dumps({"type": "new_message", "content": "see you " * 40}).encode()
+    for _ in range(2):
+        frame = server.encode(Frame(OP_TEXT, event))
+        assert frame.rsv1 and len(frame.data) < len(event) // 4
+        assert client.decode(frame).data == event
+
+    # a fragmented message follows the decision made on its first frame
+    first = server.encode(Frame(OP_TEXT, b"tiny", fin=False))
+    rest = server.encode(Frame(OP_CONT, b"x" * 500))
+    assert not first.rsv1 and rest.data == b"x" * 500
+
+
+def test_negotiate_replaces_the_servers_deflate_offer(monkeypatch):
+    class Protocol:
+        available_extensions = [ServerPerMessageDeflateFactory()]
+
+    protocol = Protocol()
+    offered = protocol.available_extensions
+    compression.negotiate(protocol)
+    assert protocol.available_extensions is offered  # the list the handshake reads
+    assert [type(e) for e in offered] == [compression.ThresholdDeflateFactory]
+
+    monkeypatch.setattr(compression, "_factory", None)
+    compression.negotiate(protocol)
+    assert offered == []
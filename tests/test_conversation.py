@@ -0,0 +1,135 @@
+"""Tests for conversation endpoints"""
+
+
+def test_direct_conversation_is_reused_for_same_pair(client, auth_headers):
+    """Creating a direct chat twice (from either side) returns the same conversation"""
+    alice = auth_headers("alice")
+    bob = auth_headers("bobby")
+    me_a = client.get("/auth/me", headers=alice).json()
+    me_b = client.get("/auth/me", headers=bob).json()
+
+    first = client.post(
+        "/conversations",
+        headers=alice,
+        json={"type": "direct", "member_user_ids": [me_b["id"]]},
+    )
+    second = client.post(
+        "/conversations",
+        headers=bob,
+        json={"type": "direct", "member_user_ids": [me_a["id"]]},
+    )
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert first.json()["id"] == second.json()["id"]
+    low, high = sorted([me_a["id"], me_b["id"]])
+    assert first.json()["private_pair_key"] == f"direct:{low}:{high}"
+
+    listing = client.get("/conversations", headers=alice)
+    assert len([c for c in listing.json() if c["type"] == "direct"]) == 1
+
+
+def test_direct_conversation_with_self_rejected(client, test_user_token):
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {test_user_token}"}).json()
+    response = client.post(
+        "/conversations",
+        headers={"Authorization": f"Bearer {test_user_token}"},
+        json={"type": "direct", "member_user_ids": [me["id"]]},
+    )
+    assert response.status_code == 400
+
+
+def test_kick_invalidates_membership_cache(client, auth_headers):
+    """A kicked member loses send access immediately even though membership is cached"""
+    admin = auth_headers("admin1")
+    member = auth_headers("member1")
+    member_id = client.get("/auth/me", headers=member).json()["id"]
+
+    group = client.post(
+        "/conversations",
+        headers=admin,
+        json={"type": "group", "name": "G", "member_user_ids": [member_id]},
+    ).json()
+    send = {"conversation_id": group["id"], "content": "hello"}
+
+    assert client.post("/messages", headers=member, json=send).status_code == 200
+    kicked = client.delete(f"/conversations/{group['id']}/members/{member_id}", headers=admin)
+    assert kicked.status_code == 200
+    assert client.post("/messages", headers=member, json=send).status_code == 404
+
+
+def test_remote_invalidation_drops_cached_entry():
+    """Control messages from other workers evict the local membership entry"""
+    from app.chat.manager import manager
+    from app.chat.membership import membership_cache
+
+    membership_cache._cache.set(42, {1: "admin"})
+    manager._dispatch_control(
+        {
+            "control": {"kind": "membership.invalidate", "data": {"conversation_id": 42}},
+            "origin": "another-worker",
+        }
+    )
+    assert membership_cache.peek(42) is None
+
+
+def test_invalidation_during_load_discards_the_loaded_rows(monkeypatch):
+    """A load that raced a kick must not cache the pre-kick member list"""
+    from app.chat.membership import MembershipCache
+
+    cache = MembershipCache()
+
+    def load(conversation_id, db):
+        cache.invalidate(conversation_id, broadcast=False)  # lands mid-load
+        return {1: "admin", 2: "member"}
+
+    monkeypatch.setattr(cache, "_load", load)
+    assert cache.roles(42) == {1: "admin", 2: "member"}
+    assert cache.peek(42) is None and cache._loads == {}
+
+    monkeypatch.setattr(cache, "_load", lambda conversation_id, db: {1: "admin"})
+    cache.roles(42)
+    assert cache.peek(42) == {1: "admin"}
+
+
+def test_conversation_listing_stays_within_query_budget(client, auth_headers):
+    """Member ids for every conversation come from one query, not one per row"""
+    from app.auth.principal import principal_cache
+    from app.chat.membership import membership_cache
+
+    headers = auth_headers("carol")
+    for name in ("dave", "erin", "frank", "grace"):
+        other_id = client.get("/auth/me", headers=auth_headers(name)).json()["id"]
+        client.post(
+            "/conversations",
+            headers=headers,
+            json={"type": "direct", "member_user_ids": [other_id]},
+        )
+    membership_cache.clear()
+    principal_cache.clear()
+
+    listing = client.get("/conversations", headers=headers)
+    assert listing.status_code == 200
+    assert len(listing.json()) == 4
+    assert all(len(c["member_ids"]) == 2 for c in listing.json())
+    assert 'desc="3 queries"' in listing.headers["server-timing"]
+
+
+def test_losing_the_direct_pair_race_keeps_the_callers_pending_work(db_session):
+    """The duplicate insert only rolls back its savepoint"""
+    from app.chat.services import create_direct_conversation, direct_conversation_cache
+    from app.database.models import Conversation, User
+
+    db_session.add_all(
+        [User(id=1, username="a", password_hash="x"), User(id=2, username="b", password_hash="x")]
+    )
+    db_session.commit()
+    first = create_direct_conversation(db_session, 1, 2)
+    direct_conversation_cache.clear()
+
+    db_session.add(User(id=3, username="pending", password_hash="x"))
+    again = create_direct_conversation(db_session, 2, 1)  # hits the unique pair key
+    db_session.commit()
+
+    assert again.id == first.id
+    assert db_session.get(User, 3) is not None
+    assert db_session.query(Conversation).count() == 1
@@ -0,0 +1,21 @@
+"""Tests for friendship endpoints"""
+
+
+def test_accept_and_unfriend_keep_friend_list_in_sync(client, auth_headers):
+    alice = auth_headers("alice")
+    bob = auth_headers("bobby")
+
+    assert client.post("/friends/request", headers=alice, json={"username": "bobby"}).status_code == 200
+    request_id = client.get("/friends/requests", headers=bob).json()[0]["id"]
+    assert client.put(f"/friends/requests/{request_id}/accept", headers=bob).status_code == 200
+
+    alice_friends = client.get("/friends", headers=alice).json()
+    bob_friends = client.get("/friends", headers=bob).json()
+    assert [f["username"] for f in alice_friends] == ["bobby"]
+    assert [f["username"] for f in bob_friends] == ["alice"]
+
+    bob_id = alice_friends[0]["id"]
+    assert client.delete(f"/friends/{bob_id}", headers=alice).status_code == 200
+    assert client.get("/friends", headers=alice).json() == []
+    assert client.get("/friends", headers=bob).json() == []
+    assert client.delete(f"/friends/{bob_id}", headers=alice).status_code == 404
@@ -0,0 +1,42 @@
+"""Tests for the bounded password hashing service"""
+
+import time
+
+import anyio
+import pytest
+
+from app.auth.hash_service import HashingOverloaded, HashingService
+
+
+def test_process_pool_hash_and_verify():
+    service = HashingService(workers=1, max_in_flight=1, queue_limit=4)
+
+    async def scenario():
+        password_hash = await service.hash("s3cret!")
+        assert await service.verify("s3cret!", password_hash)
+        assert not await service.verify("wrong", password_hash)
+
+    try:
+        anyio.run(scenario)
+    finally:
+        service.shutdown()
+    stats = service.stats()
+    assert stats["mode"] == "process"
+    assert stats["completed"] == 3 and stats["in_flight"] == 0
+
+
+def test_full_queue_rejects_instead_of_waiting():
+    service = HashingService(workers=0, max_in_flight=1, queue_limit=1)
+
+    async def scenario():
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(service.run, time.sleep, 0.2)
+            tg.start_soon(service.run, time.sleep, 0.2)
+            await anyio.sleep(0.05)
+            assert service.stats()["queue_depth"] == 1
+            with pytest.raises(HashingOverloaded):
+                await service.run(time.sleep, 0)
+
+    anyio.run(scenario)
+    stats = service.stats()
+    assert stats["rejected"] == 1 and stats["completed"] == 2
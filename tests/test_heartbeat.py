@@ -0,0 +1,91 @@
+"""Tests for server-driven WebSocket heartbeats"""
+
+import asyncio
+
+from app.chat.heartbeat import Heartbeat, TimerWheel
+from app.chat.ws_protocol import PROTOCOL_SCOPE_KEY
+from app.websocket_manager import SimpleWebSocketManager, websocket_manager
+
+
+class FakeTransport:
+    aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+
+class FakeProtocol:
+    def __init__(self, answer: bool):
+        self.answer = answer
+        self.pings = 0
+        self.transport = FakeTransport()
+
+    async def ping(self):
+        self.pings += 1
+        pong = asyncio.get_running_loop().create_future()
+        if self.answer:
+            pong.set_result(None)
+        return pong
+
+
+class FakeSocket:
+    def __init__(self, protocol):
+        self.scope = {PROTOCOL_SCOPE_KEY: protocol}
+
+
+def test_timer_wheel_returns_only_due_items():
+    wheel = TimerWheel(tick=1.0, slots=5, now=100.0)
+    wheel.schedule("a", 101.5)
+    wheel.schedule("b", 103.0)
+    wheel.schedule("far", 500.0)  # beyond the wheel: comes back early
+    assert wheel.advance(101.9) == []
+    assert wheel.advance(102.0) == ["a"]
+    assert wheel.advance(103.0) == ["b"]
+    assert wheel.advance(104.0) == ["far"]
+    assert wheel.size == 0
+
+
+def test_pings_quiet_sockets_and_reaps_dead_ones():
+    manager = SimpleWebSocketManager()
+    live, dead = FakeProtocol(answer=True), FakeProtocol(answer=False)
+
+    async def scenario():
+        heartbeat = Heartbeat(manager, interval=10, timeout=30, tick=1)
+        # drive the wheel by hand instead of start()
+        heartbeat._wheel = TimerWheel(1, 32, 0.0)
+        connections = []
+        for user_id, protocol in ((1, live), (2, dead)):
+            connection = manager.connections.add(user_id, FakeSocket(protocol))
+            connection.last_seen = 0.0
+            heartbeat.watch(connection)
+            connections.append(connection)
+
+        heartbeat.check(5.0)
+        assert live.pings == dead.pings == 0
+        heartbeat.check(10.0)
+        await asyncio.sleep(0.01)  # ping sent, pong seen
+        assert live.pings == dead.pings == 1
+        assert connections[0].last_seen > 0.0 and connections[1].last_seen == 0.0
+
+        connections[0].last_seen = 25.0
+        heartbeat.check(30.0)
+        assert dead.transport.aborted and not live.transport.aborted
+        assert heartbeat._wheel.size == 1  # the live socket, re-filed
+
+    asyncio.run(scenario())
+
+
+def test_server_closes_silent_socket(client, test_user_token, monkeypatch):
+    heartbeat = websocket_manager.heartbeat
+    monkeypatch.setattr(heartbeat, "interval", 0.1)
+    monkeypatch.setattr(heartbeat, "timeout", 0.2)
+    monkeypatch.setattr(heartbeat, "tick", 0.05)
+    with client.websocket_connect(f"/ws/{test_user_token}") as websocket:
+        websocket.receive_json()  # connected
+        # the test client has no protocol pings, so nothing answers for us
+        while True:
+            message = websocket.receive()
+            if message["type"] == "websocket.close":
+                break
+    assert message["code"] == 1001
+    assert heartbeat.stats()["reaped"] >= 1
@@ -0,0 +1,28 @@
+"""Tests for the queued structured logging setup"""
+
+import io
+import json
+import logging
+
+from app.utils.logging_config import configure_logging, shutdown_logging
+
+
+def test_records_are_written_as_json_by_the_listener():
+    stream = io.StringIO()
+    configure_logging(level="INFO", fmt="json", stream=stream)
+    try:
+        logger = logging.getLogger("chat.test")
+        logger.debug("skipped", extra={"user_id": 1})
+        logger.info("ws connected", extra={"user_id": 7})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("ws error")
+    finally:
+        shutdown_logging()  # drains the queue
+        configure_logging()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["msg"] for line in lines] == ["ws connected", "ws error"]
+    assert lines[0]["user_id"] == 7 and lines[0]["logger"] == "chat.test"
+    assert "ValueError: boom" in lines[1]["exc"]
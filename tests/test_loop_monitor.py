@@ -0,0 +1,41 @@
+"""Tests for the event loop lag monitor and blocking-call capture"""
+
+import asyncio
+import time
+
+from app.utils.loop_monitor import LoopMonitor
+
+
+def _blocking_presence_query():
+    time.sleep(0.3)
+
+
+def test_watchdog_captures_the_blocking_call():
+    monitor = LoopMonitor(interval=0.01, threshold=0.05, debug=True)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+
+        async def handler():
+            _blocking_presence_query()
+
+        await asyncio.create_task(handler(), name="ws-handler")
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+
+    assert monitor.max_lag_seconds >= 0.2
+    assert len(monitor.blocks) == 1
+    block = monitor.blocks[0]
+    assert block["task"] == "ws-handler"
+    assert "_blocking_presence_query" in block["stack"]
+
+
+def test_loop_health_endpoint(client, admin_headers):
+    response = client.get("/health/loop", headers=admin_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["running"] is True
+    assert "max_lag_seconds" in body
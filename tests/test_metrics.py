@@ -0,0 +1,41 @@
+"""Tests for the in-process metrics registry and /metrics endpoint"""
+
+from app.utils.metrics import Counter, Histogram
+
+
+def test_metrics_endpoint_uses_route_templates(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    client.get("/conversations/12345/members", headers=headers)
+    client.get("/conversations/67890/members", headers=headers)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'route="/conversations/{conversation_id}/members"' in body
+    # raw ids never become labels (timing values may still contain the digits)
+    assert 'route="/conversations/12345' not in body
+    assert 'route="/conversations/67890' not in body
+    assert 'ws_connections{kind="sockets"}' in body
+    assert 'db_pool_connections{state="checkedout"}' in body
+    assert 'rate_limit_attempts_total{limiter="login_user",outcome="admitted"}' in body
+
+
+def test_label_sets_are_capped():
+    counter = Counter("test_capped_total", "test", ("user",), max_series=3)
+    for user_id in range(100):
+        counter.inc(user=str(user_id))
+    assert len(counter._values) == 4
+    assert counter.value(user="__overflow__") == 97
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "test", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+    lines = histogram.render()
+    assert 'test_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{le="1"} 3' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 4' in lines
+    assert "test_seconds_count 4" in lines
@@ -0,0 +1,70 @@
+"""Tests for the sampling profiler and its admin endpoint"""
+
+import asyncio
+import json
+import threading
+import time
+
+from app.auth import dependencies
+from app.utils.profiler import SamplingProfiler
+
+
+def _encode_payloads(stop):
+    while not stop.is_set():
+        json.dumps([{"id": i, "content": "x" * 50} for i in range(200)])
+
+
+def _encode_payloads_for(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        json.dumps([{"id": i, "content": "x" * 50} for i in range(200)])
+
+
+def test_collapsed_stacks_name_threads_tasks_and_functions():
+    stop = threading.Event()
+    worker = threading.Thread(target=_encode_payloads, args=(stop,), name="encoder")
+    worker.start()
+
+    async def scenario():
+        async def busy():
+            await asyncio.sleep(0.05)
+            # CPU on the loop thread, as a slow fan-out would be
+            _encode_payloads_for(0.2)
+
+        task = asyncio.create_task(busy(), name="fanout")
+        profile = await SamplingProfiler().run(0.3, hz=200)
+        await task
+        return profile
+
+    try:
+        profile = asyncio.run(scenario())
+    finally:
+        stop.set()
+        worker.join()
+
+    assert profile.samples > 10
+    lines = profile.collapsed().splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(
+        line.startswith("thread:encoder;")
+        and "tests.test_profiler:_encode_payloads" in line
+        for line in lines
+    )
+    assert any(
+        line.startswith("thread:MainThread;task:fanout;")
+        and "tests.test_profiler:_encode_payloads_for" in line
+        for line in lines
+    )
+
+
+def test_profile_endpoint_is_admin_only(client, test_user_token, monkeypatch):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    assert client.get("/admin/profile", headers=headers).status_code == 403
+
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    monkeypatch.setattr(dependencies, "ADMIN_USER_IDS", frozenset({user_id}))
+    response = client.get("/admin/profile?seconds=0.1", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert int(response.headers["x-profile-samples"]) > 0
+    assert "thread:" in response.text
@@ -0,0 +1,41 @@
+"""Tests that the pre-built hot-path statements are served from the compiled cache"""
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT
+
+from app.database import queries
+from app.database.models import ConversationMember, Conversation, User
+
+
+@pytest.fixture
+def cache_hits(db_session):
+    """Record whether each statement executed on the test engine was a compiled-cache hit"""
+    engine = db_session.get_bind()
+    seen = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seen.append(context.cache_hit == CACHE_HIT)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield seen
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_hot_queries_hit_compiled_cache(db_session, cache_hits):
+    db_session.add_all([User(id=1, username="a", password_hash="x"), Conversation(id=1, type="group")])
+    db_session.add(ConversationMember(conversation_id=1, user_id=1, role="admin"))
+    db_session.commit()
+
+    # the first round may compile; every later call with new values must be a cache hit
+    for round_no, value in enumerate((1, 2, 3)):
+        if round_no == 1:
+            cache_hits.clear()
+        queries.user_by_id(db_session, value)
+        queries.member_roles(db_session, value)
+        queries.history_page(db_session, value, value, 50)
+        queries.friend_ids(db_session, value)
+
+    assert cache_hits and all(cache_hits)
+    assert queries.user_by_id(db_session, 1).username == "a"
+    assert queries.member_roles(db_session, 1) == {1: "admin"}
@@ -0,0 +1,88 @@
+"""Tests for the compact connection/room registries and the memory report"""
+
+import asyncio
+
+from app.auth import dependencies
+from app.chat.registry import ConnectionRegistry, RoomRegistry
+from app.websocket_manager import SimpleWebSocketManager
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text: str):
+        self.sent.append(text)
+
+
+def test_registries_track_sockets_and_rooms():
+    connections = ConnectionRegistry()
+    first, second = FakeSocket(), FakeSocket()
+    connections.add(1000, first)
+    connections.add(1000, second)
+    connections.add(7, FakeSocket())
+    assert connections.sockets == 3 and len(connections) == 2
+    assert [c.websocket for c in connections.connections(1000)] == [first, second]
+    assert connections.remove(1000, first) is False
+    assert connections.remove(1000, first) is False  # already gone
+    assert connections.remove(1000, second) is True
+    assert 1000 not in connections and connections.sockets == 1
+
+    rooms = RoomRegistry()
+    for user_id in (30, 10, 20):
+        assert rooms.join(5, user_id)
+    assert not rooms.join(5, 10)
+    rooms.join(6, 10)
+    members = rooms.members(5)
+    assert list(members) == [10, 20, 30]
+    assert rooms.leave_all(10) == 2
+    assert list(rooms.members(5)) == [20, 30]
+    assert list(members) == [10, 20, 30]  # callers hold a snapshot
+    assert len(rooms) == 1 and list(rooms.rooms_of(10)) == []
+
+
+def test_last_disconnect_leaves_rooms(monkeypatch):
+    manager = SimpleWebSocketManager()
+
+    async def no_presence(user_id, is_online):
+        pass
+
+    monkeypatch.setattr(manager, "broadcast_user_status", no_presence)
+    alice, bob = FakeSocket(), FakeSocket()
+    # bypass connect(): presence lookups would hit the database
+    manager.connections.add(1, alice)
+    manager.connections.add(2, bob)
+
+    async def scenario():
+        await manager.join_conversation(1, "9")
+        await manager.join_conversation(2, 9)
+        await manager.disconnect(2, bob)
+        await manager.send_to_conversation(9, {"type": "new_message"})
+        # a room nobody joined reaches nobody
+        await manager.send_to_conversation(10, {"type": "new_message"})
+
+    asyncio.run(scenario())
+    assert len(alice.sent) == 1 and bob.sent == []
+    assert list(manager.rooms.members(9)) == [1]
+
+
+def test_memory_endpoint_reports_sockets_and_rooms(
+    client, test_user_token, monkeypatch
+):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    assert client.get("/admin/memory", headers=headers).status_code == 403
+
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    monkeypatch.setattr(dependencies, "ADMIN_USER_IDS", frozenset({user_id}))
+    with client.websocket_connect(f"/ws/{test_user_token}") as websocket:
+        websocket.receive_json()  # connected
+        websocket.send_json({"type": "join_conversation", "conversation_id": 3})
+        while websocket.receive_json()["type"] != "joined_conversation":
+            pass
+        report = client.get("/admin/memory", headers=headers).json()
+
+    assert report["sockets"] == 1 and report["rooms"] == 1
+    assert report["socket_bytes"]["sampled"] == 1
+    assert report["per_socket_bytes"] > report["socket_bytes"]["mean"] > 0
+    assert report["largest_rooms"][0]["conversation_id"] == 3
+    assert report["total_bytes"] >= report["per_socket_bytes"]
@@ -0,0 +1,36 @@
+"""Tests for the Server-Timing header and per-route query budgets"""
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.database.connection import get_db
+from app.utils.request_timing import RequestTimingMiddleware, query_budget
+
+
+def _budget_app(db_session, enforce):
+    app = FastAPI()
+    app.add_middleware(RequestTimingMiddleware, enforce_budgets=enforce)
+    app.dependency_overrides[get_db] = lambda: db_session
+
+    @app.get("/loop")
+    @query_budget(2)
+    def loop(db=Depends(get_db)):
+        # an N+1 shape: one query per item
+        return [db.execute(text("SELECT :n"), {"n": n}).scalar() for n in range(5)]
+
+    return TestClient(app)
+
+
+def test_server_timing_reports_queries(db_session):
+    response = _budget_app(db_session, enforce=False).get("/loop")
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert 'db;dur=' in timing and 'desc="5 queries"' in timing
+    assert "pool;dur=" in timing and "serialize;dur=" in timing
+
+
+def test_query_budget_is_enforced(db_session):
+    response = _budget_app(db_session, enforce=True).get("/loop")
+    assert response.status_code == 500
+    assert "Query budget exceeded on GET /loop: 5 queries, budget 2" in response.json()["detail"]
@@ -0,0 +1,112 @@
+"""Tests for span tracing and trace propagation through pub/sub"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.chat.manager import ConnectionManager
+from app.main import app
+from app.utils.tracing import TracingMiddleware, tracer
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer.exporter, tracer.path, tracer.sample_rate = "file", str(path), 1.0
+    tracer.start()
+    yield path
+    tracer.stop()
+    tracer.exporter = ""
+
+
+def _spans(path):
+    tracer.stop()
+    spans = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            for resource in json.loads(line)["resourceSpans"]:
+                for scope in resource["scopeSpans"]:
+                    spans.extend(scope["spans"])
+    return spans
+
+
+def test_message_post_is_traced_through_db_and_fanout(
+    client, test_user_token, trace_file
+):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    conversation_id = client.post(
+        "/conversations",
+        headers=headers,
+        json={"type": "group", "name": "Traced", "member_user_ids": []},
+    ).json()["id"]
+
+    # no `with`: the `client` fixture already ran the app's startup
+    traced = TestClient(TracingMiddleware(app))
+    response = traced.post(
+        "/messages",
+        headers=headers,
+        json={"conversation_id": conversation_id, "content": "hi"},
+    )
+    assert response.status_code == 200
+    untraced = traced.post(
+        "/messages",
+        headers={**headers, "traceparent": f"00-{'a' * 32}-{'b' * 16}-00"},
+        json={"conversation_id": conversation_id, "content": "not sampled"},
+    )
+    assert untraced.status_code == 200
+
+    spans = _spans(trace_file)
+    assert len({span["traceId"] for span in spans}) == 1
+    by_name = {span["name"]: span for span in spans}
+    root = by_name["POST /messages"]
+    assert "parentSpanId" not in root
+    assert by_name["membership.check"]["parentSpanId"] == root["spanId"]
+    create = by_name["create_message"]
+    assert create["parentSpanId"] == root["spanId"]
+    # queries run in a worker thread and still land under create_message
+    inserts = [
+        s
+        for s in spans
+        if s["name"] == "db.query" and s["parentSpanId"] == create["spanId"]
+    ]
+    assert any(
+        "INSERT INTO messages" in a["value"]["stringValue"]
+        for s in inserts
+        for a in s["attributes"]
+        if a["key"] == "db.statement"
+    )
+    assert by_name["ws.fanout"]["parentSpanId"] == root["spanId"]
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, channel, payload):
+        self.published.append(payload)
+
+
+def test_trace_continues_on_the_receiving_worker(trace_file):
+    sender, receiver = ConnectionManager(), ConnectionManager()
+    sender._redis = _FakeRedis()
+
+    async def scenario():
+        with tracer.start_trace("POST /messages/send") as root:
+            await sender.publish_event({"type": "message"}, {7})
+        envelope = json.loads(sender._redis.published[0])
+        # the publishing worker ignores its own event; the other one delivers
+        await sender._deliver_event(envelope)
+        await receiver._deliver_event(envelope)
+        return root, envelope
+
+    root, envelope = asyncio.run(scenario())
+    assert envelope["trace"].split("-")[1] == root.trace_id
+
+    spans = {span["name"]: span for span in _spans(trace_file)}
+    publish, deliver = spans["pubsub.publish"], spans["pubsub.deliver"]
+    assert publish["parentSpanId"] == root.span_id
+    assert deliver["traceId"] == root.trace_id
+    assert deliver["parentSpanId"] == publish["spanId"]
+    assert list(spans).count("pubsub.deliver") == 1
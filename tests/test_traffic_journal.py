@@ -0,0 +1,114 @@
+"""Tests for traffic recording and journal scrubbing"""
+
+import io
+import json
+import queue
+import time
+
+from app.utils.traffic_journal import (
+    TrafficJournal,
+    read_journal,
+    scrub_journal,
+    traffic_journal,
+)
+
+
+def test_records_ws_frames_and_message_posts(client, test_user_token, tmp_path):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    conversation_id = client.post(
+        "/conversations",
+        headers=headers,
+        json={"type": "group", "name": "Journal", "member_user_ids": []},
+    ).json()["id"]
+
+    path = tmp_path / "traffic.ndjson"
+    traffic_journal.path = str(path)
+    traffic_journal.start()
+    try:
+        with client.websocket_connect(f"/ws/{test_user_token}") as websocket:
+            websocket.receive_json(mode="text")
+            websocket.send_json({"type": "ping"})
+            for _ in range(10):
+                if websocket.receive_json(mode="text").get("type") == "pong":
+                    break
+            denied = client.post(  # not a member: rejected, so not recorded
+                "/messages",
+                headers=headers,
+                json={"conversation_id": conversation_id + 1000, "content": "x"},
+            )
+            assert denied.status_code == 404
+            response = client.post(
+                "/messages",
+                headers=headers,
+                json={"conversation_id": conversation_id, "content": "secret plans"},
+            )
+            assert response.status_code == 200
+        # the server records the close once its presence update is done
+        deadline = time.monotonic() + 5
+        while traffic_journal.written < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        traffic_journal.stop()
+        traffic_journal.path = ""
+
+    with open(path, encoding="utf-8") as fh:
+        text = fh.read()
+    assert "secret" not in text and test_user_token not in text
+    records = [record for _, _, record in read_journal(io.StringIO(text))]
+    kinds = [record[1] for record in records]
+    assert kinds == ["o", "f", "m", "c"]
+    assert json.loads(records[1][3]) == {"type": "ping"}
+    assert records[2][3] == conversation_id
+    assert len(records[2][4]) == len("secret plans")
+
+
+def test_frames_rejected_by_the_message_limit_are_not_recorded(
+    client, test_user_token, tmp_path, monkeypatch
+):
+    from app.chat.ws_limits import ws_limits
+
+    monkeypatch.setattr(ws_limits, "message_burst", 0)
+    path = tmp_path / "traffic.ndjson"
+    traffic_journal.path = str(path)
+    traffic_journal.start()
+    try:
+        with client.websocket_connect(f"/ws/{test_user_token}") as websocket:
+            websocket.receive_json(mode="text")
+            websocket.send_json({"type": "ping"})  # exempt from the message limit
+            websocket.send_json({"type": "join_conversation", "conversation_id": 1})
+            while websocket.receive()["type"] != "websocket.close":
+                pass
+    finally:
+        traffic_journal.stop()  # drains the queue
+        traffic_journal.path = ""
+
+    with open(path, encoding="utf-8") as fh:
+        records = [record for _, _, record in read_journal(fh)]
+    frames = [record for record in records if record[1] == "f"]
+    assert len(frames) == 1
+    assert json.loads(frames[0][3]) == {"type": "ping"}
+
+
+def test_scrub_journal_and_dropped_records(tmp_path):
+    journal = TrafficJournal(path=str(tmp_path / "raw.ndjson"), scrub=False)
+    journal.start()
+    conn_id = journal.ws_open(7)
+    journal.ws_frame(conn_id, '{"type": "chat", "content": "hello bob"}')
+    journal.http_message(7, 3, "meet at noon")
+    journal.stop()
+
+    scrubbed = io.StringIO()
+    with open(tmp_path / "raw.ndjson", encoding="utf-8") as fh:
+        assert "hello bob" in fh.read()
+        fh.seek(0)
+        assert scrub_journal(fh, scrubbed) == 3
+    assert "hello" not in scrubbed.getvalue() and "noon" not in scrubbed.getvalue()
+    assert '"scrubbed": true' in scrubbed.getvalue()
+
+    # no writer thread: the second record finds the queue full
+    full = TrafficJournal(path="unused", queue_size=1)
+    full._queue = queue.Queue(maxsize=1)
+    full.enabled = True
+    full.ws_open(1)
+    full.ws_close(1)
+    assert full.dropped == 1
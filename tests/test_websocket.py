@@ -82,3 +82,36 @@ def test_websocket_join_conversation(client, test_user_token):
         if response:
             assert response["type"] == "joined_conversation"
             assert response["conversation_id"] == conversation_id
+
+
+def _receive_close_code(websocket):
+    from starlette.websockets import WebSocketDisconnect
+
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        for _ in range(20):
+            websocket.receive_json(mode="text")
+    return exc_info.value.code
+
+
+def test_websocket_oversized_frame_is_closed(client, test_user_token):
+    """A frame over WS_MAX_FRAME_BYTES closes the socket with 1009"""
+    from app.chat.ws_limits import ws_limits
+
+    with client.websocket_connect(f"/ws/{test_user_token}") as websocket:
+        websocket.receive_json(mode="text")
+        websocket.send_text("x" * (ws_limits.max_frame_bytes + 1))
+        assert _receive_close_code(websocket) == 1009
+    assert ws_limits.stats()["rejected_frame_size"] == 1
+
+
+def test_websocket_message_flood_is_closed(client, test_user_token, monkeypatch):
+    """Exceeding the per-user message burst closes the socket with 1008"""
+    from app.chat.ws_limits import ws_limits
+
+    monkeypatch.setattr(ws_limits, "message_burst", 2)
+    with client.websocket_connect(f"/ws/{test_user_token}") as websocket:
+        websocket.receive_json(mode="text")
+        for _ in range(3):
+            websocket.send_json({"type": "typing"})
+        assert _receive_close_code(websocket) == 1008
+    assert ws_limits.stats()["rejected_message_rate"] == 1
@@ -0,0 +1,38 @@
+"""Tests for per-workload thread budgets"""
+
+import threading
+
+import anyio
+
+from app.utils.workload import WorkloadPool
+
+
+def test_saturated_pool_does_not_starve_another():
+    """A pool with every slot busy queues its own work but not other pools'"""
+    crypto = WorkloadPool("crypto", 1)
+    db_write = WorkloadPool("db_write", 1)
+    release = threading.Event()
+
+    async def scenario():
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(crypto.run, release.wait, 5)
+            tg.start_soon(crypto.run, release.wait, 5)
+            await anyio.sleep(0.05)
+            assert crypto.stats()["in_flight"] == 1
+            assert crypto.stats()["queue_depth"] == 1
+
+            assert await db_write.run(lambda: "delivered") == "delivered"
+            release.set()
+
+    anyio.run(scenario)
+    stats = crypto.stats()
+    assert stats["completed"] == 2 and stats["queue_depth"] == 0
+    assert stats["wait_seconds_max"] > 0
+
+
+def test_workload_health_endpoint(client, auth_headers, admin_headers):
+    assert client.get("/health/workloads").status_code == 401
+    assert client.get("/health/workloads", headers=auth_headers("nobody")).status_code == 403
+    response = client.get("/health/workloads", headers=admin_headers)
+    assert response.status_code == 200
+    assert {"db_read", "db_write", "crypto", "default"} <= set(response.json())